@@ -0,0 +1,152 @@
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+
+__all__ = ['get_table',
+           'table_path',
+           'table_version',
+           'table_hash',
+           'data_version',
+           'get_cache_dir',
+           'set_cache_dir',
+           'clear_cache']
+
+data_dir = os.path.dirname(os.path.abspath(__file__))
+
+_cache_dir = os.environ.get('WATERTAP3_CACHE_DIR')
+_tables = {}
+_hashes = {}
+_lock = threading.Lock()
+
+# functions called with (table name, seconds) each time a table is read from disk
+read_hooks = []
+
+
+def table_path(name):
+    '''
+    Absolute path to a WaterTAP3 data table.
+
+    :param name: Name of the table, with or without the ``.csv`` extension
+    :type name: str
+    :return: Path to the table
+    '''
+    if not name.endswith('.csv'):
+        name = name + '.csv'
+    return os.path.join(data_dir, name)
+
+
+def table_version(name):
+    '''
+    Version stamp for a data table. Changes whenever the file on disk is modified.
+
+    :param name: Name of the table
+    :type name: str
+    :return: (mtime [ns], size [bytes])
+    '''
+    stat = os.stat(table_path(name))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def table_hash(name):
+    '''
+    Content hash for a data table. Unlike ``table_version``, this is stable across machines and
+    checkouts, so it is used to key artifacts derived from the table that are stored on disk.
+
+    :param name: Name of the table
+    :type name: str
+    :return: SHA-1 hex digest of the file contents
+    '''
+    path = table_path(name)
+    version = table_version(name)
+    entry = _hashes.get(path)
+    if entry is None or entry[0] != version:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        entry = _hashes[path] = (version, digest)
+    return entry[1]
+
+
+def data_version():
+    '''
+    Content hash over every table in the data catalog. Used to key artifacts that depend on more than one
+    table (e.g. built models), so they are invalidated when any of the data changes.
+
+    :return: SHA-1 hex digest
+    '''
+    h = hashlib.sha1()
+    for name in sorted(f for f in os.listdir(data_dir) if f.endswith('.csv')):
+        h.update(name.encode())
+        h.update(table_hash(name).encode())
+    return h.hexdigest()
+
+
+def get_table(name, index_col=None, copy=False):
+    '''
+    Function to get a data table from the WaterTAP3 data catalog.
+
+    Each table is read and parsed once per process (per index column) and re-read only if the
+    file on disk changes. The returned DataFrame shares its data with the catalog, so it must be
+    treated as read-only; pass ``copy=True`` to get a private copy that can be modified.
+
+    :param name: Name of the table, with or without the ``.csv`` extension
+    :type name: str
+    :param index_col: Column to use as the index of the table
+    :type index_col: str
+    :param copy: Return a deep copy of the table instead of a view
+    :type copy: bool
+    :return: Table DataFrame
+    '''
+    path = table_path(name)
+    version = table_version(name)
+    key = (path, index_col)
+    entry = _tables.get(key)
+    if entry is None or entry[0] != version:
+        with _lock:
+            entry = _tables.get(key)
+            if entry is None or entry[0] != version:
+                start = time.perf_counter()
+                df = pd.read_csv(path, index_col=index_col)
+                entry = _tables[key] = (version, df)
+                for hook in read_hooks:
+                    hook(os.path.basename(path), time.perf_counter() - start)
+    df = entry[1]
+    if copy:
+        return df.copy()
+    return df.copy(deep=False)
+
+
+def get_cache_dir():
+    '''
+    Directory used to persist artifacts derived from the data tables (cost index tables, fitted
+    coefficients, ...). Set with ``set_cache_dir`` or the ``WATERTAP3_CACHE_DIR`` environment
+    variable; if neither is set, derived artifacts are only cached in memory.
+
+    :return: Cache directory or None
+    '''
+    if _cache_dir is None:
+        return None
+    os.makedirs(_cache_dir, exist_ok=True)
+    return _cache_dir
+
+
+def set_cache_dir(path):
+    '''
+    Set the directory used to persist derived artifacts. Pass None to disable disk caching.
+
+    :param path: Cache directory
+    :type path: str
+    '''
+    global _cache_dir
+    _cache_dir = path
+
+
+def clear_cache():
+    '''
+    Drop all tables held in the data catalog.
+    '''
+    with _lock:
+        _tables.clear()
+        _hashes.clear()
@@ -1,53 +1,95 @@
 
 from . import constituent_removal_water_recovery
 from .constituent_removal_water_recovery import *
+from . import coefficient_store
+from .coefficient_store import *
 from . import cost_curves
 from .cost_curves import *
+from . import costing_kernel
+from .costing_kernel import *
 from . import design
 from .design import *
+from . import epa_cost_eqns
+from .epa_cost_eqns import *
 from . import financials
 from .financials import *
+from . import initialization
+from .initialization import *
 from . import mixer_wt3
 from .mixer_wt3 import *
 from . import mixer_mar5
 from .mixer_mar5 import *
 from . import ml_regression
 from .ml_regression import *
+from . import model_templates
+from .model_templates import *
 from . import module_import
 from .module_import import *
 from . import optimize_setup
 from .optimize_setup import *
+from . import profiling
+from .profiling import *
 from . import post_processing
 from .post_processing import *
+from . import result_cache
+from .result_cache import *
+from . import retry
+from .retry import *
+from . import solvers
+from .solvers import *
 from . import splitter_wt3
 from .splitter_wt3 import *
+from . import sweep
+from .sweep import *
 from . import case_study_trains
 from .case_study_trains import *
 from . import generate_constituent_list
 from .generate_constituent_list import *
+from . import gradients
+from .gradients import *
+from . import uncertainty
+from .uncertainty import *
+from . import warm_start
+from .warm_start import *
 from . import water_props
 from .water_props import *
 from . import watertap
 from .watertap import *
 from . import sensitivity_runs
 from .sensitivity_runs import *
+from . import sensitivity_spec
+from .sensitivity_spec import *
 
 
 __all__ = [
            *constituent_removal_water_recovery.__all__,
+           *coefficient_store.__all__,
            *cost_curves.__all__,
+           *costing_kernel.__all__,
            *design.__all__,
+           *epa_cost_eqns.__all__,
            *financials.__all__,
+           *initialization.__all__,
            *mixer_wt3.__all__,
            *mixer_mar5.__all__,
            *ml_regression.__all__,
+           *model_templates.__all__,
            *module_import.__all__,
            *optimize_setup.__all__,
            *post_processing.__all__,
+           *profiling.__all__,
+           *result_cache.__all__,
+           *retry.__all__,
            *sensitivity_runs.__all__,
+           *sensitivity_spec.__all__,
+           *solvers.__all__,
            *splitter_wt3.__all__,
+           *sweep.__all__,
            *case_study_trains.__all__,
            *generate_constituent_list.__all__,
+           *gradients.__all__,
+           *uncertainty.__all__,
+           *warm_start.__all__,
            *water_props.__all__,
            *watertap.__all__
            ]
@@ -6,6 +6,8 @@ from pyomo.environ import Block
 from pyomo.network import Arc
 
 from watertap3.utils import Mixer, Splitter, design, financials
+from . import model_templates
+from .profiling import get_timings, profile_phase
 from .water_props import WaterParameterBlock
 
 __all__ = [
@@ -13,6 +15,7 @@ __all__ = [
            'get_pfd_dict',
            'create_arcs',
            'create_arc_dict',
+           'index_arcs',
            'check_split_mixer_need',
            'create_mixers',
            'create_splitters',
@@ -31,6 +34,16 @@ def get_case_study(m=None, new_df_units=None):
         m.fs.pfd_dict = get_pfd_dict(m.fs.df_units)
         m.fs.new_case_study = False
 
+    # if this treatment train has already been built, use a copy of it instead of adding every unit again
+    with profile_phase(m, 'get_template', count=False):
+        template = model_templates.get_template(m)
+    if template is not None:
+        print('\n=================USING PREVIOUSLY BUILT TREATMENT TRAIN=================\n')
+        timings = get_timings(m, create=False)
+        if timings is not None:
+            template.fs.timings = timings
+        return template
+
     pfd_dict = m.fs.pfd_dict
     financials.get_system_specs(m.fs)
 
@@ -45,35 +58,40 @@ def get_case_study(m=None, new_df_units=None):
         unit_process_kind = pfd_dict[unit_process_name]['Type']
 
         print(f'{unit}')
-        m = design.add_unit_process(m=m,
-                                    unit_process_name=unit_process_name,
-                                    unit_process_type=unit_process_type,
-                                    unit_process_kind=unit_process_kind)
+        with profile_phase(m, unit_process_name, category='unit', block=unit_process_name, unit_process=unit_process_type):
+            m = design.add_unit_process(m=m,
+                                        unit_process_name=unit_process_name,
+                                        unit_process_type=unit_process_type,
+                                        unit_process_kind=unit_process_kind)
 
 
     print('=======================================================================\n')
 
-    # create a dictionary with all the arcs in the network based on the pfd_dict
-    m, arc_dict, arc_i = create_arc_dict(m, pfd_dict, m.fs.flow_in_dict)
-    m.fs.arc_dict = arc_dict
+    with profile_phase(m, 'assemble_flowsheet'):
+        # create a dictionary with all the arcs in the network based on the pfd_dict
+        m, arc_dict, arc_i = create_arc_dict(m, pfd_dict, m.fs.flow_in_dict)
+        m.fs.arc_dict = arc_dict
+
+        # gets list of unit processes and ports that need either a splitter or mixer 
+        splitter_list, mixer_list = check_split_mixer_need(arc_dict)
+        m.fs.splitter_list = splitter_list
+        m.fs.mixer_list = mixer_list
+        # add the mixers if needed, and add the arcs around the mixers to the arc dictionary
+        m, arc_dict, mixer_i, arc_i = create_mixers(m, mixer_list, arc_dict, arc_i)
+        m.fs.arc_i = arc_i
 
-    # gets list of unit processes and ports that need either a splitter or mixer 
-    splitter_list, mixer_list = check_split_mixer_need(arc_dict)
-    m.fs.splitter_list = splitter_list
-    m.fs.mixer_list = mixer_list
-    # add the mixers if needed, and add the arcs around the mixers to the arc dictionary
-    m, arc_dict, mixer_i, arc_i = create_mixers(m, mixer_list, arc_dict, arc_i)
-    m.fs.arc_i = arc_i
+        # add the splitters if needed, and add the arcs around the splitters to the arc dictionary
+        m, arc_dict, splitter_i, arc_i = create_splitters(m, splitter_list, arc_dict, arc_i)
+        m.fs.splitter_i = splitter_i
+        # add the arcs to the model
+        m = create_arcs(m, arc_dict)
+        # add the waste arcs to the model
+        m, arc_i, mixer_i = add_waste_streams(m, arc_i, pfd_dict, mixer_i)
 
-    # add the splitters if needed, and add the arcs around the splitters to the arc dictionary
-    m, arc_dict, splitter_i, arc_i = create_splitters(m, splitter_list, arc_dict, arc_i)
-    m.fs.splitter_i = splitter_i
-    # add the arcs to the model
-    m = create_arcs(m, arc_dict)
-    # add the waste arcs to the model
-    m, arc_i, mixer_i = add_waste_streams(m, arc_i, pfd_dict, mixer_i)
+        m.fs.arc_dict2 = arc_dict
 
-    m.fs.arc_dict2 = arc_dict
+    with profile_phase(m, 'store_template', count=False):
+        model_templates.store_template(m)
 
     return m
 
@@ -148,50 +166,70 @@ def create_arc_dict(m, pfd_dict, flow):
     return m, arc_dict, arc_i
 
 
+def index_arcs(arc_dict):
+    '''
+    Function to index the arcs in the arc dictionary by the ports they connect, in one pass.
+
+    :param arc_dict: Arc dictionary {arc number: [source unit, source port, destination unit, destination port]}
+    :return: Dictionary of (source unit, source port) to list of arc numbers, dictionary of (destination unit,
+        destination port) to list of arc numbers. Arc numbers are in the order of the arc dictionary.
+    '''
+    by_source = {}
+    by_dest = {}
+    for key, (source, source_port, dest, dest_port) in arc_dict.items():
+        by_source.setdefault((source, source_port), []).append(key)
+        by_dest.setdefault((dest, dest_port), []).append(key)
+    return by_source, by_dest
+
+
 # check if a mixer or splitter is needed
 def check_split_mixer_need(arc_dict):
     mixer_list = []
     splitter_list = []
-    unique_name_list1 = []
-    unique_name_list2 = []
+    source_ports = set()
+    dest_ports = set()
+    splitter_ports = set()
+    mixer_ports = set()
 
-    for key in arc_dict.keys():
+    for source, source_port, dest, dest_port in arc_dict.values():
         # FOR SPLITTER
-        if [arc_dict[key][0], arc_dict[key][1]] not in unique_name_list1:
-            unique_name_list1.append([arc_dict[key][0], arc_dict[key][1]])
-        else:
-            if [arc_dict[key][0], arc_dict[key][1]] not in splitter_list:
-                splitter_list.append([arc_dict[key][0], arc_dict[key][1]])
-
-        # FOR MIXER    
-        if [arc_dict[key][2], arc_dict[key][3]] not in unique_name_list2:
-            unique_name_list2.append([arc_dict[key][2], arc_dict[key][3]])
-        else:
-            if [arc_dict[key][2], arc_dict[key][3]] not in mixer_list:
-                mixer_list.append([arc_dict[key][2], arc_dict[key][3]])
+        port = (source, source_port)
+        if port not in source_ports:
+            source_ports.add(port)
+        elif port not in splitter_ports:
+            splitter_ports.add(port)
+            splitter_list.append([source, source_port])
+
+        # FOR MIXER
+        port = (dest, dest_port)
+        if port not in dest_ports:
+            dest_ports.add(port)
+        elif port not in mixer_ports:
+            mixer_ports.add(port)
+            mixer_list.append([dest, dest_port])
     return splitter_list, mixer_list
 
 
 def create_mixers(m, mixer_list, arc_dict, arc_i):
     mixer_i = 1
     inlet_i = 1
+    _, by_dest = index_arcs(arc_dict)
     for j in mixer_list:
         inlet_list = []
         mixer_name = 'mixer%s' % mixer_i
-        for key in list(arc_dict.keys()):
-            if ((arc_dict[key][2] == j[0]) & (arc_dict[key][3] == j[1])):
+        for key in by_dest[tuple(j)]:
 
-                # inlet list for when mixer is added to model
-                inlet_name = 'inlet%s' % inlet_i
-                inlet_list.append(inlet_name)
-                inlet_i = inlet_i + 1
+            # inlet list for when mixer is added to model
+            inlet_name = 'inlet%s' % inlet_i
+            inlet_list.append(inlet_name)
+            inlet_i = inlet_i + 1
 
-                # add new arc to arc dict
-                arc_dict[arc_i] = [arc_dict[key][0], arc_dict[key][1], mixer_name, inlet_name]
-                arc_i = arc_i + 1
+            # add new arc to arc dict
+            arc_dict[arc_i] = [arc_dict[key][0], arc_dict[key][1], mixer_name, inlet_name]
+            arc_i = arc_i + 1
 
-                # delete from arc dict
-                del arc_dict[key]
+            # delete from arc dict
+            del arc_dict[key]
 
         # add mixer to model with inlet list
         setattr(m.fs, mixer_name,
@@ -205,56 +243,68 @@ def create_mixers(m, mixer_list, arc_dict, arc_i):
     return m, arc_dict, mixer_i, arc_i
 
 
+def get_split_dict(m, unit_name):
+    '''
+    Function to get the split fraction to each unit downstream of a unit's outlet from the unit parameters.
+
+    :param unit_name: Name of the unit upstream of the splitter
+    :return: Dictionary of downstream unit name to split fraction, True/False if the splitter is a decision
+        between units (all split fractions are 1) or None if the unit has no split fractions
+    '''
+    unit = m.fs.pfd_dict[unit_name]
+    split_dict = {}
+    choose = None
+    if 'split_fraction' not in unit['Parameter']:
+        return split_dict, choose
+    split_fractions = unit['Parameter']['split_fraction']
+    w = 0
+    for uname in unit['ToUnitName']:
+        if unit['FromPort'][w] == 'outlet':
+            split_dict[uname] = split_fractions[w]
+            w += 1
+            choose = all(split == 1 for split in split_fractions)
+    return split_dict, choose
+
+
 def create_splitters(m, splitter_list, arc_dict, arc_i):
     splitter_i = 1
     outlet_i = 1
     unit_options = m.fs.unit_options = {}
     if not splitter_list:
         m.fs.choose = False
+    by_source, _ = index_arcs(arc_dict)
+    # unit at the end of the last arc leaving each unit, to find the unit downstream of a mixer
+    downstream = {arc[0]: arc[2] for arc in arc_dict.values()}
     for j in splitter_list:
 
-        outlet_list = []
         outlet_list_up = m.fs.outlet_list_up = {}
-        unit_split_lu_dict = {}
         splitter_name = 'splitter%s' % splitter_i
-        for key in list(arc_dict.keys()):
-            if ((arc_dict[key][0] == j[0]) & (arc_dict[key][1] == j[1])):
-                split_dict = m.fs.split_dict = {}
-                w = 0
-                for uname in m.fs.pfd_dict[j[0]]['ToUnitName']:
-                    if m.fs.pfd_dict[j[0]]['FromPort'][w] == 'outlet':
-                        if 'split_fraction' in m.fs.pfd_dict[j[0]]['Parameter']:
-                            split_dict[uname] = m.fs.pfd_dict[j[0]]['Parameter']['split_fraction'][w]
-                            w += 1
-                            split_fractions = m.fs.pfd_dict[j[0]]['Parameter']['split_fraction']
-                            if all(split == 1 for split in split_fractions):
-                                m.fs.choose = True
-                                unit_options[splitter_i] = {j[0]: list(split_dict.keys())}
-                            else:
-                                m.fs.choose = False
-
-                            # outlet list for when splitter is added to model
-                outlet_name = 'outlet%s' % outlet_i
-                outlet_list.append(outlet_name)
-                outlet_i += 1
-
-                # add new arc to arc dict
-                arc_dict[arc_i] = [splitter_name, outlet_name, arc_dict[key][2], arc_dict[key][3]]
-                arc_i += 1
-
-                unit_hold = arc_dict[key][2]
-
-                if arc_dict[key][2] not in split_dict.keys():
-                    for l in m.fs.arc_dict.keys():
-                        if arc_dict[key][2] == m.fs.arc_dict[l][0]:
-                            unit_hold = m.fs.arc_dict[l][2]
-
-                if len(split_dict) > 0:
-                    outlet_list_up[outlet_name] = split_dict[unit_hold]
-                else:
-                    outlet_list_up[outlet_name] = "NA"
-                # delete from arc dict
-                del arc_dict[key]
+        split_dict, choose = get_split_dict(m, j[0])
+        m.fs.split_dict = split_dict
+        if choose is not None:
+            m.fs.choose = choose
+            if choose:
+                unit_options[splitter_i] = {j[0]: list(split_dict.keys())}
+
+        for key in by_source[tuple(j)]:
+            # outlet list for when splitter is added to model
+            outlet_name = 'outlet%s' % outlet_i
+            outlet_i += 1
+
+            # add new arc to arc dict
+            arc_dict[arc_i] = [splitter_name, outlet_name, arc_dict[key][2], arc_dict[key][3]]
+            arc_i += 1
+
+            unit_hold = arc_dict[key][2]
+            if unit_hold not in split_dict:
+                unit_hold = downstream.get(unit_hold, unit_hold)
+
+            if len(split_dict) > 0:
+                outlet_list_up[outlet_name] = split_dict[unit_hold]
+            else:
+                outlet_list_up[outlet_name] = "NA"
+            # delete from arc dict
+            del arc_dict[key]
 
         # add splitter to model with outlet list
 
@@ -266,6 +316,7 @@ def create_splitters(m, splitter_list, arc_dict, arc_i):
 
         # arc from mixer outlet to node
         arc_dict[arc_i] = [j[0], j[1], splitter_name, 'inlet']
+        downstream[j[0]] = splitter_name
         arc_i += 1
         splitter_i += 1
 
@@ -273,53 +324,40 @@ def create_splitters(m, splitter_list, arc_dict, arc_i):
 
 
 def add_waste_streams(m, arc_i, pfd_dict, mixer_i):
-    # get number of units going to automatic waste disposal units
-    i = 0
-    waste_inlet_list = []
-
-    unit_list = []
+    # get units going to automatic waste disposal units
+    sd_name = None
     for key in m.fs.pfd_dict.keys():
-        unit_list.append(m.fs.pfd_dict[key]['Unit'])
         if 'surface_discharge' == m.fs.pfd_dict[key]['Unit']:
             sd_name = key
 
-    if 'surface_discharge' in unit_list:
+    if sd_name is not None:
 
+        waste_units = []
         for b_unit in m.fs.component_objects(Block, descend_into=False):
             if hasattr(b_unit, 'waste'):
 
                 if len(getattr(b_unit, 'waste').arcs()) == 0:
-                    if str(b_unit)[3:] in list(pfd_dict.keys()):  #
-                        if pfd_dict[str(b_unit)[3:]]['Type'] == 'treatment':
-                            i = i + 1
-                            waste_inlet_list.append(('inlet%s' % i))
+                    if b_unit.local_name in pfd_dict:
+                        if pfd_dict[b_unit.local_name]['Type'] == 'treatment':
+                            waste_units.append(b_unit)
+        waste_inlet_list = ['inlet%s' % i for i in range(1, len(waste_units) + 1)]
 
         if len(waste_inlet_list) > 1:
-            i = 0
             waste_mixer = 'mixer%s' % mixer_i
             m.fs.water_mixer_name = waste_mixer  # used for displaying train. not used for model
             setattr(m.fs, waste_mixer,
                     Mixer(default={'property_package': m.fs.water, 'inlet_list': waste_inlet_list}))
 
-            for b_unit in m.fs.component_objects(Block, descend_into=False):
-                if hasattr(b_unit, 'waste'):
-
-                    if len(getattr(b_unit, 'waste').arcs()) == 0:
-
-                        if str(b_unit)[3:] in list(pfd_dict.keys()):
-                            if pfd_dict[str(b_unit)[3:]]['Type'] == 'treatment':
-                                i = i + 1
-                                setattr(m.fs, ('arc%s' % arc_i), Arc(source=getattr(b_unit, 'waste'),
-                                                                     destination=getattr(getattr(m.fs, waste_mixer),
-                                                                                         'inlet%s' % i)))
-                                arc_i = arc_i + 1
+            for b_unit, inlet_name in zip(waste_units, waste_inlet_list):
+                setattr(m.fs, ('arc%s' % arc_i), Arc(source=getattr(b_unit, 'waste'),
+                                                     destination=getattr(getattr(m.fs, waste_mixer), inlet_name)))
+                arc_i = arc_i + 1
 
             # add connection for waste mixer to surface discharge -->
-            if 'surface_discharge' in unit_list:
-                setattr(m.fs, ('arc%s' % arc_i), Arc(source=getattr(m.fs, waste_mixer).outlet,
-                                                     destination=getattr(m.fs, sd_name).inlet))
-                arc_i = arc_i + 1
+            setattr(m.fs, ('arc%s' % arc_i), Arc(source=getattr(m.fs, waste_mixer).outlet,
+                                                 destination=getattr(m.fs, sd_name).inlet))
+            arc_i = arc_i + 1
         return m, arc_i, mixer_i
 
     else:
-        return m, arc_i, mixer_i
\ No newline at end of file
+        return m, arc_i, mixer_i
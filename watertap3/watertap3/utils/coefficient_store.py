@@ -0,0 +1,242 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from watertap3.data import get_cache_dir
+
+__all__ = ['get_coefficients',
+           'array_hash',
+           'fit_power_law',
+           'fit_power_law_batch',
+           'fit_proportional',
+           'set_coefficient_store',
+           'save_coefficients',
+           'clear_coefficients']
+
+_settings = {
+        'max_entries': 1024,
+        'batch_size': 64
+        }
+_stores = {}
+# number of curves added to each store since it was last written to disk
+_unsaved = {}
+_lock = threading.Lock()
+
+
+def array_hash(*arrays):
+    '''
+    Content hash for the data a set of coefficients is fit to.
+
+    :param arrays: Arrays (or lists) of data
+    :return: SHA-1 hex digest
+    '''
+    h = hashlib.sha1()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr, dtype=float)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def fit_power_law(x, y):
+    '''
+    Fit y = a * x ** b with the same least squares fit the cost curves have always used.
+
+    :return: Array of coefficients [a, b]
+    '''
+    from scipy.optimize import curve_fit
+
+    def power(x, a, b):
+        return a * np.power(x, b)
+
+    pars, _ = curve_fit(power, np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    return pars
+
+
+def fit_power_law_batch(x, Y, max_iter=100, tol=1E-12):
+    '''
+    Fit y = a * x ** b to many curves that share the same x values at once.
+
+    Starts from a log-log linear fit of the positive points and refines every curve simultaneously with
+    a vectorized Levenberg-Marquardt iteration on the untransformed residuals (the same objective as
+    ``fit_power_law``), so large grids of curves can be fit without a Python loop over SciPy.
+
+    :param x: x values shared by all curves
+    :param Y: y values, with x along the last axis
+    :param max_iter: Maximum number of iterations
+    :type max_iter: int
+    :param tol: Relative step size at which all curves are considered converged
+    :type tol: float
+    :return: Arrays a, b with the shape of Y without its last axis
+    '''
+    x = np.asarray(x, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    pos = (x > 0) & np.all(Y > 0, axis=tuple(range(Y.ndim - 1)))
+    log_x = np.log(x[pos])
+    log_y = np.log(Y[..., pos])
+    log_x_dev = log_x - log_x.mean()
+    b = (log_x_dev * (log_y - log_y.mean(axis=-1, keepdims=True))).sum(axis=-1) / (log_x_dev ** 2).sum()
+    a = np.exp(log_y.mean(axis=-1) - b * log_x.mean())
+    ln_x = np.log(np.where(x > 0, x, 1))
+    lam = np.full(a.shape, 1E-3)
+
+    def sse(a, b):
+        return ((a[..., None] * x ** b[..., None] - Y) ** 2).sum(axis=-1)
+
+    err = sse(a, b)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for _ in range(max_iter):
+            xb = x ** b[..., None]
+            r = a[..., None] * xb - Y
+            ja = xb
+            jb = a[..., None] * xb * ln_x
+            g_a, g_b = (ja * r).sum(axis=-1), (jb * r).sum(axis=-1)
+            h_aa, h_ab, h_bb = (ja * ja).sum(axis=-1) * (1 + lam), (ja * jb).sum(axis=-1), (jb * jb).sum(axis=-1) * (1 + lam)
+            det = h_aa * h_bb - h_ab ** 2
+            da = -(h_bb * g_a - h_ab * g_b) / det
+            db = -(h_aa * g_b - h_ab * g_a) / det
+            err_new = sse(a + da, b + db)
+            better = err_new < err
+            a = np.where(better, a + da, a)
+            b = np.where(better, b + db, b)
+            err = np.where(better, err_new, err)
+            lam = np.where(better, lam * 0.3, lam * 10)
+            small_step = np.maximum(np.abs(da / a), np.abs(db / b)) < tol
+            if np.all(np.where(better, small_step, lam > 1E8)):
+                break
+    return a, b
+
+
+def fit_proportional(x, y):
+    '''
+    Fit y = m * x (line through the origin) by least squares.
+
+    :return: Array of coefficients [m]
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return np.array([np.dot(x, y) / np.dot(x, x)])
+
+
+def _store_path(store):
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, f'coefficients_{store}.json')
+
+
+def _load_store(store):
+    path = _store_path(store)
+    if path is None or not os.path.exists(path):
+        return OrderedDict()
+    try:
+        with open(path) as f:
+            return OrderedDict(json.load(f))
+    except (OSError, ValueError):
+        return OrderedDict()
+
+
+def _evict(entries):
+    # entries are in order of use, so the first ones are the least recently used
+    while len(entries) > _settings['max_entries']:
+        entries.popitem(last=False)
+
+
+def _save_store(store, entries):
+    _unsaved.pop(store, None)
+    path = _store_path(store)
+    if path is None:
+        return
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(entries, f, indent=1)
+    os.replace(tmp, path)
+
+
+def get_coefficients(store, key, source_hash, fit):
+    '''
+    Function to get fitted regression coefficients, fitting them only if they are not already in the
+    coefficient store.
+
+    Coefficients are stored with the hash of the data they were fit to and are refit if that data
+    changes. They are held in memory for the life of the process and, if a cache directory is set
+    (see ``watertap3.data.set_cache_dir``), persisted to disk so later processes can evaluate cost
+    curves without fitting (or importing SciPy). New curves are written to disk in batches (see
+    ``set_coefficient_store``) and when the process exits or ``save_coefficients`` is called. Each store keeps the most recently used curves, up to the
+    number set with ``set_coefficient_store``; the least recently used are dropped (and refit if needed again).
+
+    :param store: Name of the coefficient store (e.g. 'cost_curves')
+    :type store: str
+    :param key: Name of the curve within the store (e.g. 'cation_exchange|tds_in=600')
+    :type key: str
+    :param source_hash: Hash of the data the curve is fit to
+    :type source_hash: str
+    :param fit: Function with no arguments that fits the curve and returns its coefficients
+    :return: Array of coefficients
+    '''
+    entries = _stores.get(store)
+    if entries is None:
+        with _lock:
+            entries = _stores.get(store)
+            if entries is None:
+                entries = _stores[store] = _load_store(store)
+    entry = entries.get(key)
+    if entry is None or entry['hash'] != source_hash:
+        coeffs = [float(c) for c in fit()]
+        with _lock:
+            entries[key] = {'hash': source_hash, 'coeffs': coeffs}
+            entries.move_to_end(key)
+            _evict(entries)
+            _unsaved[store] = _unsaved.get(store, 0) + 1
+            if _unsaved[store] >= _settings['batch_size']:
+                _save_store(store, entries)
+        return np.array(coeffs)
+    with _lock:
+        if key in entries:
+            entries.move_to_end(key)
+    return np.array(entry['coeffs'])
+
+
+def set_coefficient_store(max_entries=1024, batch_size=64):
+    '''
+    Set the number of curves kept in each coefficient store and how often new curves are written to disk.
+    Stores held in memory are trimmed now; stores persisted to the cache directory are trimmed the next time
+    they are written.
+
+    :param max_entries: Maximum number of curves in a store
+    :type max_entries: int
+    :param batch_size: Number of new curves in a store before it is written to the cache directory
+    :type batch_size: int
+    '''
+    with _lock:
+        _settings['max_entries'] = max_entries
+        _settings['batch_size'] = batch_size
+        for entries in _stores.values():
+            _evict(entries)
+
+
+def save_coefficients():
+    '''
+    Write the coefficient stores with curves not yet persisted to the cache directory. Called when the
+    process exits; call it at the end of a run to persist the curves sooner.
+    '''
+    with _lock:
+        for store in list(_unsaved):
+            _save_store(store, _stores[store])
+
+
+atexit.register(save_coefficients)
+
+
+def clear_coefficients():
+    '''
+    Drop all coefficients held in memory, after writing the ones not yet persisted to the cache directory.
+    Coefficients persisted to the cache directory are kept.
+    '''
+    save_coefficients()
+    with _lock:
+        _stores.clear()
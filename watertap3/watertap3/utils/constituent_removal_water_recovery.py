@@ -1,35 +1,74 @@
-import pandas as pd
+from watertap3.data import get_table, table_version
 from watertap3.utils import generate_constituent_list
 
-__all__ = ['create']
+__all__ = ['create',
+           'get_unit_recovery',
+           'compile_recovery_index']
+
+_recovery_index = {}
+
+
+def compile_recovery_index():
+    '''
+    Function to compile water_recovery.csv into a lookup keyed by (case_study, scenario, unit_process),
+    with the default recovery for each unit process resolved at compile time. Recoveries are stored as
+    floats, or None if the recovery is calculated by the unit model. The index is rebuilt only when
+    water_recovery.csv changes.
+
+    :return: Dictionary of case study recoveries, dictionary of default recoveries
+    '''
+    version = table_version('water_recovery')
+    if _recovery_index.get('version') == version:
+        return _recovery_index['case'], _recovery_index['default']
+    df = get_table('water_recovery')
+    case = {}
+    default = {}
+    for case_study, scenario, unit_process, recovery in zip(df.case_study.values, df.scenario.values, df.unit_process.values, df.recovery.values):
+        recovery = None if 'calculated' in str(recovery) else float(recovery)
+        if case_study == 'default':
+            default.setdefault(unit_process, recovery)
+        else:
+            case.setdefault((case_study, scenario, unit_process), recovery)
+    _recovery_index.update(version=version, case=case, default=default)
+    return case, default
+
+
+def get_unit_recovery(case_study, scenario, unit_process):
+    '''
+    Function to get the water recovery for a unit process from the compiled recovery index.
+
+    :param case_study: Case study name
+    :type case_study: str
+    :param scenario: Scenario name
+    :type scenario: str
+    :param unit_process: Unit process type
+    :type unit_process: str
+    :return: Water recovery, or None if the recovery is calculated by the unit model
+    '''
+    case, default = compile_recovery_index()
+    key = (case_study, scenario, unit_process)
+    if key in case:
+        return case[key]
+    if unit_process not in default:
+        raise KeyError(f'No default water recovery for unit process "{unit_process}" in water_recovery.csv')
+    return default[unit_process]
 
 
 def create(m, unit_process_type, unit_process_name):
-    df = pd.read_csv('data/water_recovery.csv')
-    case_study_name = m.fs.train['case_study']
-    scenario = m.fs.train['scenario']
-
-    cases = df[df.unit_process == unit_process_type].case_study.to_list()
-    scenarios = df[df.unit_process == unit_process_type].scenario.to_list()
-    default_df = df[((df.unit_process == unit_process_type) & (df.case_study == 'default'))].recovery
-    tups = zip(cases, scenarios)
-
-    if (case_study_name, scenario) in tups:
-        case_study_df = df[((df.unit_process == unit_process_type) & (df.case_study == case_study_name) & (df.scenario == scenario))]
-        if 'calculated' not in case_study_df.recovery.max():
-            flow_recovery_factor = float(case_study_df.recovery)
-            getattr(m.fs, unit_process_name).water_recovery.fix(flow_recovery_factor)
-    else:
-        if 'calculated' not in default_df.max():
-            flow_recovery_factor = float(default_df)
-            getattr(m.fs, unit_process_name).water_recovery.fix(flow_recovery_factor)
+    unit = getattr(m.fs, unit_process_name)
+    flow_recovery_factor = get_unit_recovery(m.fs.train['case_study'], m.fs.train['scenario'], unit_process_type)
+    if flow_recovery_factor is not None:
+        unit.water_recovery.fix(flow_recovery_factor)
 
     train_constituent_removal_factors = generate_constituent_list.get_removal_factors(m, unit_process_type, unit_process_name)
 
-    for constituent_name in getattr(m.fs, unit_process_name).config.property_package.component_list:
-        if constituent_name in train_constituent_removal_factors.keys():
-            getattr(m.fs, unit_process_name).removal_fraction[:, constituent_name].fix(train_constituent_removal_factors[constituent_name])
-        else:
-            getattr(m.fs, unit_process_name).removal_fraction[:, constituent_name].fix(1E-5)
-    return m
+    for constituent_name in unit.config.property_package.component_list:
+        unit.removal_fraction[:, constituent_name].fix(train_constituent_removal_factors.get(constituent_name, 1E-5))
 
+    # removal fractions for constituents left out of the model, used to rebuild their concentrations after the solve
+    pruned_constituents = getattr(m.fs, 'pruned_constituents', [])
+    if pruned_constituents:
+        train = m.fs.train
+        unit_removal = generate_constituent_list.get_unit_removal_factors(train['reference'], train['case_study'], 'baseline', unit_process_type)
+        unit.pruned_removal = {constituent_name: unit_removal.get(constituent_name, 1E-5) for constituent_name in pruned_constituents}
+    return m
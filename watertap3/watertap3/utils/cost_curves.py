@@ -1,19 +1,18 @@
 import numpy as np
-import pandas as pd
-from scipy.optimize import curve_fit
+from watertap3.data import get_table, table_hash
+
+from .coefficient_store import fit_power_law, get_coefficients
 
 __all__ = ['cost_curve',
            'basic_unit']
 
 
 def cost_curve(unit_process, **kwargs):
-    df = pd.read_csv('data/cost_curves.csv', index_col='unit_process')
+    df = get_table('cost_curves', index_col='unit_process')
     df = df.loc[unit_process]
 
     params = ['flow_in', 'cap_total', 'electricity_intensity', 'tds_in', 'num_stage', 'radon_rem', 'ebct']
-
-    def power(x, a, b):
-        return a * x ** b
+    curve = unit_process
 
     if kwargs:
         temp = list(dict(**kwargs).items())[0]
@@ -24,33 +23,43 @@ def cost_curve(unit_process, **kwargs):
             if unit_process == 'cation_exchange':
                 if v >= 1000:
                     df = df[df.tds_in == 1000]
+                    curve = f'{unit_process}|tds_in=1000'
                 elif v < 1000 and v >= 600:
                     df = df[df.tds_in == 600]
+                    curve = f'{unit_process}|tds_in=600'
                 else:
                     df = df[df.tds_in == 200]
+                    curve = f'{unit_process}|tds_in=200'
             elif unit_process == 'anion_exchange':
                 if v >= 150:
                     df = df[df.tds_in == 150]
+                    curve = f'{unit_process}|tds_in=150'
                 elif v < 150 and v >= 100:
                     df = df[df.tds_in == 100]
+                    curve = f'{unit_process}|tds_in=100'
                 else:
                     df = df[df.tds_in == 50]
+                    curve = f'{unit_process}|tds_in=50'
 
         if k == 'radon_rem':
 
             if v >= 0.9:
                 df = df[df.radon_rem == 0.99]
+                curve = f'{unit_process}|radon_rem=0.99'
             else:
                 df = df[df.radon_rem == 0.9]
+                curve = f'{unit_process}|radon_rem=0.9'
 
         if k == 'ebct':
 
             if v > 30:
                 df = df[df.ebct == 60]
+                curve = f'{unit_process}|ebct=60'
             else:
                 df = df[df.ebct == 30]
+                curve = f'{unit_process}|ebct=30'
 
-    df.dropna(axis=1, inplace=True)
+    df = df.dropna(axis=1)
     cols = df.columns
     mats_name = [c for c in cols if c not in params]
     mats_cost = {}
@@ -60,17 +69,18 @@ def cost_curve(unit_process, **kwargs):
     y_cost = df.cap_total.to_list()
     y_elect = df.electricity_intensity.to_list()
 
-    cost, _ = curve_fit(power, x, y_cost)
-    elect, _ = curve_fit(power, x, y_elect)
+    source_hash = table_hash('cost_curves')
+    cost = get_coefficients('cost_curves', f'{curve}|cap_total', source_hash, lambda: fit_power_law(x, y_cost))
+    elect = get_coefficients('cost_curves', f'{curve}|electricity_intensity', source_hash, lambda: fit_power_law(x, y_elect))
 
     return cost, elect, mats_name, mats_cost, df
 
 
 def basic_unit(unit_process, case_specific=None):
     if case_specific == 'solaire':
-        df = pd.read_csv('data/basic_units_solaire.csv', index_col='unit_process')
+        df = get_table('basic_units_solaire', index_col='unit_process')
     else:
-        df = pd.read_csv('data/basic_unit.csv', index_col='unit_process')
+        df = get_table('basic_unit', index_col='unit_process')
     df = df.loc[unit_process]
     flow_basis = df.flow_basis
     cap_basis = df.cap_basis
@@ -0,0 +1,235 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.core.expr import numeric_expr
+from pyomo.core.expr.visitor import identify_variables
+from pyomo.environ import Constraint, Var, value
+
+from .sweep import get_component, run_sweep
+
+__all__ = ['costing_outputs',
+           'CostingKernel',
+           'feedback_parameters',
+           'evaluate_costing']
+
+_log = logging.getLogger(__name__)
+
+# LCOW and its breakdown (name: component path on the model)
+costing_outputs = {
+        'lcow': 'fs.costing.LCOW',
+        'lcow_tci': 'fs.costing.LCOW_TCI',
+        'lcow_elec': 'fs.costing.LCOW_elec',
+        'lcow_fixed_op': 'fs.costing.LCOW_fixed_op',
+        'lcow_chem': 'fs.costing.LCOW_chem',
+        'lcow_other': 'fs.costing.LCOW_other_onm',
+        'elec_lcow': 'fs.costing.elec_frac_LCOW',
+        'elec_int': 'fs.costing.electricity_intensity',
+        'capital_investment_total': 'fs.costing.capital_investment_total',
+        'operating_cost_annual': 'fs.costing.operating_cost_annual',
+        'water_recovery': 'fs.costing.system_recovery',
+        'treated_water': 'fs.costing.treated_water'
+        }
+
+
+def _sum(*args):
+    return sum(args[1:], args[0])
+
+
+# NumPy operation for each type of expression node (the first match counts, so subclasses come first)
+_node_ops = [(getattr(numeric_expr, name), op) for name, op in (
+        ('AbsExpression', np.abs),
+        ('UnaryFunctionExpression', None),
+        ('SumExpression', _sum),
+        ('MonomialTermExpression', np.multiply),
+        ('ProductExpression', np.multiply),
+        ('DivisionExpression', np.divide),
+        ('ReciprocalExpression', np.reciprocal),
+        ('PowExpression', np.power),
+        ('NegationExpression', np.negative)
+        ) if hasattr(numeric_expr, name)]
+
+# NumPy function for each unary function (by name)
+_functions = {
+        'exp': np.exp,
+        'log': np.log,
+        'log10': np.log10,
+        'sqrt': np.sqrt,
+        'sin': np.sin,
+        'cos': np.cos,
+        'tan': np.tan,
+        'tanh': np.tanh,
+        'floor': np.floor,
+        'ceil': np.ceil
+        }
+
+
+def _node_op(node):
+    for node_type, op in _node_ops:
+        if isinstance(node, node_type):
+            return _functions.get(node.getname()) if op is None else op
+    return None
+
+
+class CostingKernel:
+    '''
+    Costing expressions of a solved treatment train compiled into NumPy operations on a set of parameters.
+
+    The expressions of the outputs (LCOW and its breakdown by default) are walked once: every part that does not
+    depend on the parameters is evaluated with the values in the model (the solved flows and unit designs) and
+    kept as a number, and the rest becomes a list of NumPy operations on arrays of parameter values. Evaluating
+    the kernel for thousands of parameter vectors is then one pass over that list. The results are only the
+    results of solving the model at those parameter values if the parameters do not enter any constraint (see
+    ``feedback_parameters``).
+    '''
+
+    def __init__(self, m, parameters, outputs=None):
+        '''
+        :param m: WaterTAP3 model solved with ``run_watertap3``
+        :param parameters: Paths of the parameters (fixed Vars, e.g. 'fs.costing_param.wacc'; all indices of
+            an indexed Var take the same value)
+        :type parameters: list
+        :param outputs: Outputs ({name: component path}), ``costing_outputs`` if None
+        :type outputs: dict
+        '''
+        self.parameters = list(parameters)
+        self.outputs = dict(costing_outputs if outputs is None else outputs)
+        self._tape = []
+        self._slots = 0
+        self._memo = {}
+        for j, path in enumerate(self.parameters):
+            obj = m.find_component(path)
+            datas = obj.values() if obj.is_indexed() else [obj]
+            for v in datas:
+                self._memo[id(v)] = (True, j)
+        self._slots = len(self.parameters)
+        self._results = {name: self._compile(get_component(m, path)) for name, path in self.outputs.items()}
+        del self._memo
+
+    def _compile(self, node):
+        # (True, slot) for values that depend on the parameters, (False, number) otherwise
+        key = id(node)
+        if key in self._memo:
+            return self._memo[key]
+        if not hasattr(node, 'is_expression_type') or not node.is_expression_type():
+            compiled = (False, value(node))
+        elif node.is_named_expression_type():
+            compiled = self._compile(node.expr)
+        else:
+            args = list(node.args)
+            if not args and hasattr(node, 'linear_vars'):
+                # linear expressions without args keep their terms as lists (older Pyomo)
+                terms = [self._compile(node.constant)]
+                for coef, var in zip(node.linear_coefs, node.linear_vars):
+                    terms.append(self._op(np.multiply, [self._compile(coef), self._compile(var)]))
+                compiled = self._op(_sum, terms) if any(t[0] for t in terms) else (False, value(node))
+            else:
+                children = [self._compile(arg) for arg in args]
+                op = _node_op(node)
+                if not any(is_slot for is_slot, _ in children):
+                    compiled = (False, value(node))
+                elif op is not None:
+                    compiled = self._op(op, children)
+                else:
+                    raise NotImplementedError(f'Cannot compile {type(node).__name__} in the costing')
+        self._memo[key] = compiled
+        return compiled
+
+    def _op(self, fn, args):
+        slot = self._slots
+        self._slots += 1
+        self._tape.append((slot, fn, args))
+        return (True, slot)
+
+    def evaluate(self, values):
+        '''
+        Evaluate the outputs for many parameter vectors.
+
+        :param values: Parameter values: a table with a column for each parameter path, a dictionary of arrays,
+            or an array (vectors x parameters) in the order of ``parameters``
+        :return: Table of the outputs, one row per parameter vector
+        :rtype: DataFrame
+        '''
+        if isinstance(values, (pd.DataFrame, dict)):
+            x = np.column_stack([np.asarray(values[path], dtype=float) for path in self.parameters])
+        else:
+            x = np.asarray(values, dtype=float).reshape(-1, len(self.parameters))
+        n = x.shape[0]
+        slots = [None] * self._slots
+        for j in range(len(self.parameters)):
+            slots[j] = x[:, j]
+        with np.errstate(all='ignore'):
+            for slot, fn, args in self._tape:
+                slots[slot] = fn(*[slots[a] if is_slot else a for is_slot, a in args])
+        return pd.DataFrame({name: np.broadcast_to(slots[a] if is_slot else a, n).astype(float)
+                             for name, (is_slot, a) in self._results.items()})
+
+
+def feedback_parameters(m, parameters, objective=False):
+    '''
+    Function to find the parameters that change the solution of the model (not only the costing): those in an
+    active constraint, or all of them if the model is solved with the LCOW objective.
+
+    :param m: WaterTAP3 model
+    :param parameters: Parameter paths
+    :type parameters: list
+    :param objective: The model is solved with the LCOW objective
+    :type objective: bool
+    :return: Parameter paths that need a solve
+    :rtype: list
+    '''
+    if objective:
+        return list(parameters)
+    in_constraints = set()
+    for c in m.component_data_objects(Constraint, active=True, descend_into=True):
+        in_constraints.update(id(v) for v in identify_variables(c.body, include_fixed=True))
+    feedback = []
+    for path in parameters:
+        obj = m.find_component(path)
+        if obj is None or obj.ctype is not Var:
+            feedback.append(path)
+            continue
+        datas = obj.values() if obj.is_indexed() else [obj]
+        if any(id(v) in in_constraints or not v.fixed for v in datas):
+            feedback.append(path)
+    return feedback
+
+
+def evaluate_costing(m, values, outputs=None, solver='ipopt', processes=1):
+    '''
+    Function to get the costing outputs of a solved treatment train for many values of financial parameters
+    (e.g. WACC, plant lifetime, electricity price, plant capacity utilization, the fixed O&M percentages, the
+    reduction and uncertainty factors) without solving it again. If a parameter enters a constraint, the points
+    are solved with ``run_sweep`` instead.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param values: Parameter values, a table with a column for each parameter path
+    :type values: DataFrame
+    :param outputs: Outputs ({name: component path}), ``costing_outputs`` if None
+    :type outputs: dict
+    :param solver: Solver name, for solves
+    :type solver: str
+    :param processes: Number of processes, for solves
+    :type processes: int
+    :return: Table of the outputs, one row per row of ``values``
+    :rtype: DataFrame
+    '''
+    values = pd.DataFrame(values)
+    parameters = list(values.columns)
+    if outputs is None:
+        outputs = costing_outputs
+    feedback = feedback_parameters(m, parameters)
+    if not feedback:
+        try:
+            start = time.perf_counter()
+            df = CostingKernel(m, parameters, outputs).evaluate(values)
+            _log.debug(f'Evaluated the costing at {len(df)} points in {time.perf_counter() - start:.3f} s')
+            return df
+        except NotImplementedError as e:
+            _log.info(f'Solving instead of evaluating the costing: {e}')
+    else:
+        _log.info(f'Solving instead of evaluating the costing, parameters in constraints: {feedback}')
+    points = [{'settings': list(zip(parameters, row))} for row in values.itertuples(index=False)]
+    df = run_sweep(m, points, outputs=outputs, processes=processes, solver=solver)
+    return df[list(outputs)]
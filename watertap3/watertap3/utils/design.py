@@ -11,17 +11,17 @@ __all__ = ['add_unit_process',
 
 def add_unit_process(m=None, unit_process_name=None, unit_process_type=None, unit_process_kind=None):
 
-    up_module = module_import.get_module(unit_process_type)
+    unit_class = module_import.get_unit_class(unit_process_type)
 
     unit_params = m.fs.pfd_dict[unit_process_name]['Parameter']
 
     if unit_process_type == 'basic_unit':
-        setattr(m.fs, unit_process_name, up_module.UnitProcess(default={'property_package': m.fs.water}))
+        setattr(m.fs, unit_process_name, unit_class(default={'property_package': m.fs.water}))
         basic_unit_name = unit_params['unit_process_name']
         m = create(m, basic_unit_name, unit_process_name)
 
     else:
-        setattr(m.fs, unit_process_name, up_module.UnitProcess(default={'property_package': m.fs.water}))
+        setattr(m.fs, unit_process_name, unit_class(default={'property_package': m.fs.water}))
         m = create(m, unit_process_type, unit_process_name)
 
     unit = getattr(m.fs, unit_process_name)
@@ -39,10 +39,15 @@ def add_water_source(m=None, source_name=None, water_type=None, flow=None, link_
     setattr(m.fs, source_name, Source(default={'property_package': m.fs.water}))
     getattr(m.fs, source_name).set_source()
     getattr(m.fs, source_name).flow_vol_in.fix(flow)
+    getattr(m.fs, source_name).water_type = water_type
     temp_source_df = m.fs.source_df[m.fs.source_df.water_type == water_type].copy()
     train_constituent_list = list(getattr(m.fs, source_name).config.property_package.component_list)
+    constituent_groups = getattr(m.fs, 'constituent_groups', {})
     for constituent_name in train_constituent_list:
-        if constituent_name in temp_source_df.index:
+        if constituent_name in constituent_groups:
+            members = [c for c in constituent_groups[constituent_name] if c in temp_source_df.index]
+            getattr(m.fs, source_name).conc_mass_in[:, constituent_name].fix(temp_source_df.loc[members].value.sum())
+        elif constituent_name in temp_source_df.index:
             conc = temp_source_df.loc[constituent_name].value
             getattr(m.fs, source_name).conc_mass_in[:, constituent_name].fix(conc)
         else:
@@ -0,0 +1,136 @@
+import logging
+
+import numpy as np
+from pyomo.environ import exp, log, value
+from pyomo.core.expr.numvalue import is_constant, is_fixed, native_numeric_types
+from watertap3.data import get_table, table_version
+
+__all__ = ['get_cost_eqns',
+           'epa_cost',
+           'epa_size_range']
+
+_log = logging.getLogger(__name__)
+
+coeff_names = ['C1', 'C2', 'C3', 'C4', 'C5', 'C6', 'C7', 'C8', 'C9', 'C10']
+_registry = {}
+
+
+def get_cost_eqns(table):
+    '''
+    Function to get the compiled EPA Work Breakdown Structure (WBS) cost equations in a table
+    (e.g. 'gac_cost_eqns', 'an_ex_cost_eqns'). Each table is parsed once per version of the file.
+
+    Every equation has the form:
+
+        cost = C1 * x ** C2 + C3 * log(x) + C4 + C5 * exp(C6 * x) + C7 * x ** 3 + C8 * x ** 2 + C9 * x + C10
+
+    :param table: Name of the cost equation table
+    :type table: str
+    :return: Dictionary with the equation index (name -> row), the coefficient array (equations x 10) and the
+        min_size and max_size arrays
+    '''
+    version = table_version(table)
+    eqns = _registry.get(table)
+    if eqns is None or eqns['version'] != version:
+        df = get_table(table)
+        eqns = _registry[table] = {
+                'version': version,
+                'index': {eqn: i for i, eqn in enumerate(df.eqn.values)},
+                'coeffs': df[coeff_names].values.astype(float),
+                'min_size': df.min_size.values.astype(float),
+                'max_size': df.max_size.values.astype(float)
+                }
+    return eqns
+
+
+def epa_size_range(table, eqn):
+    '''
+    Range of sizes the EPA cost equation is valid for.
+
+    :param table: Name of the cost equation table
+    :type table: str
+    :param eqn: Name of the equation
+    :type eqn: str
+    :return: min_size, max_size
+    '''
+    eqns = get_cost_eqns(table)
+    i = _eqn_row(table, eqns, eqn)
+    return eqns['min_size'][i], eqns['max_size'][i]
+
+
+def _eqn_row(table, eqns, eqn):
+    try:
+        return eqns['index'][eqn]
+    except KeyError:
+        raise KeyError(f'No cost equation "{eqn}" in {table}.csv') from None
+
+
+def _check_size(table, eqn, size, min_size, max_size, raise_error):
+    out_of_range = (size < min_size) | (size > max_size)
+    if np.any(out_of_range):
+        msg = f'Size {size} is outside the range of cost equation "{eqn}" in {table}.csv [{min_size}, {max_size}]'
+        if raise_error:
+            raise ValueError(msg)
+        _log.warning(msg)
+
+
+def epa_cost(table, eqn, x, check_size=True):
+    '''
+    Function to evaluate an EPA WBS cost equation.
+
+    If x is a number or NumPy array the cost is evaluated directly (vectorized over arrays). Otherwise x is
+    treated as a Pyomo expression and a Pyomo expression for the cost is returned. Terms with a zero
+    coefficient are left out, so the equations can be evaluated at a size of zero.
+
+    Sizes outside min_size/max_size for the equation raise a ValueError. For Pyomo expressions that are not
+    fixed, the size is only known at solve time, so a warning is logged if the current value is outside the
+    range.
+
+    :param table: Name of the cost equation table (e.g. 'gac_cost_eqns')
+    :type table: str
+    :param eqn: Name of the equation (e.g. 'ss_pv_eq')
+    :type eqn: str
+    :param x: Size (units depend on the equation)
+    :param check_size: Check the size is within min_size/max_size for the equation
+    :type check_size: bool
+    :return: Cost [$]
+    '''
+    eqns = get_cost_eqns(table)
+    i = _eqn_row(table, eqns, eqn)
+    c1, c2, c3, c4, c5, c6, c7, c8, c9, c10 = (float(c) for c in eqns['coeffs'][i])
+
+    if type(x) in native_numeric_types or isinstance(x, (np.ndarray, np.number)):
+        x = np.asarray(x, dtype=float)
+        if check_size:
+            _check_size(table, eqn, x, eqns['min_size'][i], eqns['max_size'][i], True)
+        cost = np.full(x.shape, c4 + c10)
+        with np.errstate(divide='ignore'):
+            if c1:
+                cost = cost + c1 * x ** c2
+            if c3:
+                cost = cost + c3 * np.log(x)
+            if c5:
+                cost = cost + c5 * np.exp(c6 * x)
+        cost = cost + ((c7 * x + c8) * x + c9) * x
+        if cost.ndim == 0:
+            return float(cost)
+        return cost
+
+    if check_size:
+        size = value(x, exception=False)
+        if size is not None:
+            _check_size(table, eqn, size, eqns['min_size'][i], eqns['max_size'][i], is_constant(x) or is_fixed(x))
+    cost = c4 + c10
+    if c1:
+        cost = cost + c1 * x ** c2
+    if c3:
+        cost = cost + c3 * log(x)
+    if c5:
+        cost = cost + c5 * exp(c6 * x)
+    if c7:
+        cost = cost + c7 * x ** 3
+    if c8:
+        cost = cost + c8 * x ** 2
+    if c9:
+        cost = cost + c9 * x
+    return cost
@@ -7,22 +7,29 @@
 # University Research Corporation, et al. All rights reserved.
 ##############################################################################
 
+import os
+
+import numpy as np
 import pandas as pd
 from pyomo.environ import (Block, Expression, Param, Var, NonNegativeReals, units as pyunits)
+from watertap3.data import get_cache_dir, get_table, table_hash
 
-from .ml_regression import get_linear_regression
-
-__all__ = ['SystemSpecs', 'get_complete_costing', 'get_ind_table', 'get_system_specs',
+__all__ = ['SystemSpecs', 'get_complete_costing', 'get_ind_table', 'get_ind_factors', 'get_system_specs',
            'get_system_costing', 'global_costing_parameters']
 
 last_year_for_cost_indicies = 2050
 
+ind_variables = ['Capital', 'CatChem', 'Labor', 'CPI']
+
+_ind_tables = {}
+_ind_factors = {}
+
 
 class SystemSpecs():
 
     def __init__(self, train=None):
-        basis_data = pd.read_csv('data/case_study_basis.csv', index_col='case_study')
-        elec_cost = pd.read_csv('data/electricity_costs.csv', index_col='location')
+        basis_data = get_table('case_study_basis', index_col='case_study')
+        elec_cost = get_table('electricity_costs', index_col='location')
         elec_cost.index = elec_cost.index.str.lower()
         case_study = train['case_study']
         scenario = train['scenario']
@@ -190,11 +197,8 @@ def get_complete_costing(costing):
 
 
     ## COSTING INDICES
-    df = get_ind_table(sys_specs.analysis_yr_cost_indices)
-    costing.cap_replacement_parts = df.loc[basis_year].Capital_Factor
-    costing.catalysts_chemicals = df.loc[basis_year].CatChem_Factor
-    costing.labor_and_other_fixed = df.loc[basis_year].Labor_Factor
-    costing.consumer_price_index = df.loc[basis_year].CPI_Factor
+    (costing.cap_replacement_parts, costing.catalysts_chemicals,
+     costing.labor_and_other_fixed, costing.consumer_price_index) = get_ind_factors(sys_specs.analysis_yr_cost_indices, basis_year)
 
     costing.fixed_cap_inv = ((costing.fixed_cap_inv_unadjusted * costing.cap_replacement_parts) * (1 - costing.fci_reduction[t])) * costing.fci_uncertainty[t]
     costing.land_cost = costing.fixed_cap_inv * sys_specs.land_cost_percent_FCI
@@ -208,7 +212,7 @@ def get_complete_costing(costing):
     costing.lab = costing.fixed_cap_inv * sys_specs.lab_fees_percent_FCI
     costing.insurance_taxes = costing.fixed_cap_inv * sys_specs.insurance_taxes_percent_FCI
 
-    cat_chem_df = pd.read_csv('data/catalyst_chemicals.csv', index_col='Material')
+    cat_chem_df = get_table('catalyst_chemicals', index_col='Material')
     chem_cost_sum = 0
     for key in chem_dict.keys():
         if key == 'unit_cost':
@@ -240,26 +244,68 @@ def get_ind_table(analysis_yr_cost_indices):
     '''
     Function to get costing indicies for WaterTAP3 model.
 
+    Indices are extrapolated linearly out to ``last_year_for_cost_indicies``. The table is computed
+    once per analysis year (and version of plant_cost_indices.csv) and cached in memory, and on
+    disk if a WaterTAP3 cache directory is set. The returned DataFrame is shared and must not be
+    modified.
+
     :param analysis_yr_cost_indices: Year to get costing indices for.
     :type analysis_yr_cost_indices: int
     :return: Indicies DataFrame
     '''
-    df = pd.read_csv('data/plant_cost_indices.csv')
-
-    df1 = pd.DataFrame()
-    for name in df.columns[1:]:
-        a, b = get_linear_regression(list(df.Year), list(df[('%s' % name)]), name)
-        new_list = []
-        yr_list = []
-        for yr in range(df.Year.max() + 1, last_year_for_cost_indicies + 1):
-            new_list.append(a * yr + b)
-            yr_list.append(yr)
-        df1[name] = new_list
+    key = (analysis_yr_cost_indices, table_hash('plant_cost_indices'))
+    df = _ind_tables.get(key)
+    if df is None:
+        df = _ind_tables[key] = _load_ind_table(*key)
+    return df
+
+
+def get_ind_factors(analysis_yr_cost_indices, basis_year):
+    '''
+    Function to get the cost index factors to adjust costs from a unit basis year to the analysis year.
+
+    :param analysis_yr_cost_indices: Year to get costing indices for.
+    :type analysis_yr_cost_indices: int
+    :param basis_year: Basis year of the unit cost calculations.
+    :type basis_year: int
+    :return: Capital, catalysts/chemicals, labor and CPI factors
+    '''
+    key = (analysis_yr_cost_indices, table_hash('plant_cost_indices'))
+    factors = _ind_factors.get(key)
+    if factors is None:
+        df = get_ind_table(analysis_yr_cost_indices)
+        fac_cols = [df['%s_Factor' % variable].values.tolist() for variable in ind_variables]
+        factors = _ind_factors[key] = dict(zip(df.index.tolist(), zip(*fac_cols)))
+    return factors[basis_year]
+
+
+def _load_ind_table(analysis_yr_cost_indices, data_hash):
+    cache_dir = get_cache_dir()
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, 'cost_indices_%s_%s.pkl' % (analysis_yr_cost_indices, data_hash[:12]))
+        if os.path.exists(cache_file):
+            return pd.read_pickle(cache_file)
+    df = _build_ind_table(analysis_yr_cost_indices)
+    if cache_dir is not None:
+        df.to_pickle(cache_file)
+    return df
+
+
+def _build_ind_table(analysis_yr_cost_indices):
+    df = get_table('plant_cost_indices')
+    ind_names = list(df.columns[1:])
+    # closed-form least squares fit of every index against year, all at once
+    x = df.Year.values.astype(float)
+    y = df[ind_names].values.astype(float)
+    x_dev = x - x.mean()
+    a = x_dev @ (y - y.mean(axis=0)) / (x_dev @ x_dev)
+    b = y.mean(axis=0) - a * x.mean()
+    yr_list = np.arange(df.Year.max() + 1, last_year_for_cost_indicies + 1)
+    df1 = pd.DataFrame(np.outer(yr_list, a) + b, columns=ind_names)
     df1['Year'] = yr_list
     df = pd.concat([df, df1], axis=0)
 
-    new_cost_variables = ['Capital', 'CatChem', 'Labor', 'CPI']
-    for variable in new_cost_variables:
+    for variable in ind_variables:
         ind_name = '%s_Index' % variable
         fac_name = '%s_Factor' % variable
         df[fac_name] = (df[df.Year == analysis_yr_cost_indices][ind_name].max() / df[ind_name])
@@ -1,13 +1,27 @@
-import pandas as pd
+from types import MappingProxyType
+
 import numpy as np
+from pyomo.environ import Block, value
+from pyomo.network import Arc, Port
+from watertap3.data import get_table, table_version
 
 __all__ = ['run',
-           'get_removal_factors']
+           'get_removal_factors',
+           'get_unit_removal_factors',
+           'get_removal_matrix',
+           'compile_removal_index',
+           'prune_constituents',
+           'reconstruct_constituents']
+
+_removal_index = {}
+
+# constituents that unit models use by name in costs or constraints
+cost_constituents = ['tds', 'toc', 'tss']
+default_removal = 1E-5
 
 
 def get_source_constituents(reference, water_type, case_study, scenario):
-    input_file = 'data/case_study_water_sources.csv'
-    source_df = pd.read_csv(input_file, index_col='variable')
+    source_df = get_table('case_study_water_sources', index_col='variable')
     source_df = source_df[((source_df.case_study == case_study) & (source_df.water_type == water_type) & (source_df.reference == reference) & (source_df.scenario == scenario))]
     source_df.set_index(source_df.index, inplace=True)
     return source_df
@@ -17,35 +31,250 @@ def run(m_fs):
     # source_water = m_fs.source_water
 
     # getting the list of consituents with removal factors that are bigger than 0
-    df = pd.read_csv('data/constituent_removal.csv')
-    df.case_study = np.where(df.case_study == 'default', train['case_study'], df.case_study)
+    df = get_table('constituent_removal')
     df = df[df.reference == train['reference']]
-    df = df[df.case_study == train['case_study']]
+    df = df[(df.case_study == train['case_study']) | (df.case_study == 'default')]
     df = df[df.scenario == 'baseline']
     list1 = df[df.value >= 0].constituent.unique()
     list2 = m_fs.source_df.index.unique().to_list()
 
     m_fs.source_constituents = source_constituents = [x for x in list1 if x in list2]
 
-    return source_constituents
+    if not getattr(m_fs, 'prune_constituents', False):
+        m_fs.constituent_groups = {}
+        m_fs.pruned_constituents = []
+        return source_constituents
+
+    return prune_constituents(m_fs, source_constituents)
+
+
+def _train_unit_types(m_fs):
+    unit_types = []
+    for unit_process_name, unit in m_fs.pfd_dict.items():
+        unit_process_type = unit['Unit']
+        if unit_process_type == 'basic_unit':
+            unit_process_type = unit['Parameter']['unit_process_name']
+        unit_types.append(unit_process_type)
+    return unit_types
+
+
+def prune_constituents(m_fs, constituents):
+    '''
+    Function to reduce the constituents in the property package to the ones the model needs.
+
+    Constituents used by name in unit costs or constraints (``cost_constituents``, the ion exchange
+    constituents (SBA and SAC) if the train has ion exchange and any listed in ``m_fs.keep_constituents``) are kept.
+    Constituents that are zero in every source water are dropped. The rest are lumped into one
+    constituent per group of constituents that have the same removal fraction in every unit of the
+    train, with a source concentration equal to the sum of its members. Because every member of a
+    group moves through the train the same way, the lumped constituent carries exactly the total mass
+    of the group, so units that cost on the total constituent mass are unchanged. Concentrations of
+    the dropped and lumped constituents are rebuilt after the solve with ``reconstruct_constituents``.
+
+    Sets ``m_fs.constituent_groups`` (lumped constituent name -> members) and
+    ``m_fs.pruned_constituents`` (constituents not in the model).
+
+    :param m_fs: Flowsheet with the treatment train (pfd_dict) and source water (source_df)
+    :param constituents: Constituents in the train
+    :type constituents: list
+    :return: List of constituents for the property package
+    '''
+    train = m_fs.train
+    unit_types = _train_unit_types(m_fs)
+    keep = set(cost_constituents).union(getattr(m_fs, 'keep_constituents', None) or [])
+    if 'ion_exchange' in unit_types:
+        for ix_table in ('ix_sba', 'ix_sac'):
+            keep.update(get_table(ix_table, index_col='constituent').index)
+
+    source_df = m_fs.source_df
+    source_conc = source_df.value.abs().groupby(level=0).max().to_dict()
+    unit_removals = [get_unit_removal_factors(train['reference'], train['case_study'], 'baseline', unit_process_type) for unit_process_type in unit_types]
+
+    kept = []
+    groups = {}
+    pruned = []
+    for constituent in constituents:
+        if constituent in keep:
+            kept.append(constituent)
+            continue
+        pruned.append(constituent)
+        if not source_conc.get(constituent, 0):
+            continue
+        signature = tuple(unit_removal.get(constituent, default_removal) for unit_removal in unit_removals)
+        groups.setdefault(signature, []).append(constituent)
+
+    constituent_groups = {}
+    for members in groups.values():
+        if len(members) == 1:
+            # nothing to lump, keep the constituent as it is
+            kept.append(members[0])
+            pruned.remove(members[0])
+        else:
+            constituent_groups[f'lumped_{len(constituent_groups) + 1}'] = members
+
+    m_fs.constituent_groups = constituent_groups
+    m_fs.pruned_constituents = pruned
+    return kept + list(constituent_groups)
+
+
+def compile_removal_index():
+    '''
+    Function to compile constituent_removal.csv into a lookup keyed by
+    (reference, case_study, scenario, unit_process).
+
+    Case study specific removal fractions are merged over the defaults for the same reference, scenario
+    and unit process when the index is compiled, so the lookup does no fallback at build time. If a
+    constituent appears more than once, the first row in the table is used. The index is rebuilt only
+    when constituent_removal.csv changes.
+
+    :return: Dictionary of resolved removal fractions, dictionary of default removal fractions
+    '''
+    version = table_version('constituent_removal')
+    if _removal_index.get('version') == version:
+        return _removal_index['resolved'], _removal_index['default']
+    df = get_table('constituent_removal')
+    case_dicts = {}
+    for reference, case_study, scenario, unit_process, constituent, rf in zip(df.reference.values, df.case_study.values, df.scenario.values,
+                                                                               df.unit_process.values, df.constituent.values, df.value.values):
+        case_dicts.setdefault((reference, case_study, scenario, unit_process), {}).setdefault(constituent, float(rf))
+    default = {}
+    resolved = {}
+    for (reference, case_study, scenario, unit_process), case_dict in case_dicts.items():
+        if case_study == 'default':
+            default[(reference, scenario, unit_process)] = MappingProxyType(case_dict)
+    for (reference, case_study, scenario, unit_process), case_dict in case_dicts.items():
+        if case_study == 'default':
+            continue
+        merged = dict(default.get((reference, scenario, unit_process), {}))
+        merged.update(case_dict)
+        resolved[(reference, case_study, scenario, unit_process)] = MappingProxyType(merged)
+    _removal_index.update(version=version, resolved=resolved, default=default)
+    return resolved, default
+
+
+def get_unit_removal_factors(reference, case_study, scenario, unit_process):
+    '''
+    Function to get removal fractions for a unit process from the compiled removal index.
+
+    :param reference: Train reference (e.g. 'nawi')
+    :type reference: str
+    :param case_study: Case study name
+    :type case_study: str
+    :param scenario: Scenario name
+    :type scenario: str
+    :param unit_process: Unit process type
+    :type unit_process: str
+    :return: Read-only mapping of constituent to removal fraction
+    '''
+    resolved, default = compile_removal_index()
+    removal = resolved.get((reference, case_study, scenario, unit_process))
+    if removal is None:
+        removal = default.get((reference, scenario, unit_process), MappingProxyType({}))
+    return removal
 
 
 def get_removal_factors(m, unit_process_type, unit_process_name):
 
     train = m.fs.train
-    df = pd.read_csv('data/constituent_removal.csv')
-    const_df = df[((df.unit_process == unit_process_type) & (df.scenario == 'baseline') & (df.reference == train['reference']))].copy()
-    const_df = const_df[(const_df.case_study == train['case_study']) | (const_df.case_study == 'default')].copy()
+    unit_removal = get_unit_removal_factors(train['reference'], train['case_study'], 'baseline', unit_process_type)
     constituent_list = getattr(m.fs, unit_process_name).config.property_package.component_list
+    constituent_groups = getattr(m.fs, 'constituent_groups', {})
     removal_dict = {}
     for constituent in constituent_list:
-        if constituent not in const_df.constituent.unique():
-            continue
-        if const_df[((const_df.case_study == train['case_study']) & (const_df.constituent == constituent))].empty:
-            rf = const_df[((const_df.case_study == 'default') & (const_df.constituent == constituent))].value.iloc[0]
-            removal_dict[constituent] = rf
-        else:
-            rf = const_df[((const_df.case_study == train['case_study']) & (const_df.constituent == constituent))].value.iloc[0]
-            removal_dict[constituent] = rf
+        if constituent in constituent_groups:
+            # every member of a lumped constituent has the same removal fraction
+            removal_dict[constituent] = unit_removal.get(constituent_groups[constituent][0], default_removal)
+        elif constituent in unit_removal:
+            removal_dict[constituent] = unit_removal[constituent]
+
+    return removal_dict
+
+
+def get_removal_matrix(m, fill_value=1E-5):
+    '''
+    Function to get removal fractions for every unit in the treatment train as a dense array.
+
+    :param m: WaterTAP3 model with the treatment train (pfd_dict) and property package built
+    :param fill_value: Removal fraction for constituents without removal data (same as the model default)
+    :type fill_value: float
+    :return: List of unit names (rows), list of constituents (columns), removal fraction array
+    '''
+    train = m.fs.train
+    unit_names = list(m.fs.pfd_dict.keys())
+    constituents = list(m.fs.water.component_list)
+    constituent_groups = getattr(m.fs, 'constituent_groups', {})
+    matrix = np.full((len(unit_names), len(constituents)), fill_value)
+    for i, unit_process_type in enumerate(_train_unit_types(m.fs)):
+        unit_removal = get_unit_removal_factors(train['reference'], train['case_study'], 'baseline', unit_process_type)
+        for j, constituent in enumerate(constituents):
+            constituent = constituent_groups.get(constituent, [constituent])[0]
+            if constituent in unit_removal:
+                matrix[i, j] = unit_removal[constituent]
+    return unit_names, constituents, matrix
+
+
+def _port_flow(port, t):
+    return value(port.vars['flow_vol'][t])
+
+
+def reconstruct_constituents(m):
+    '''
+    Function to rebuild the concentrations of constituents left out of the model by
+    ``prune_constituents`` from the solved model.
+
+    With the flows solved, the mass balance of a constituent that is not used in costs or constraints is
+    linear: each unit sends (1 - removal fraction) of its inlet mass to the outlet and the rest to waste,
+    mixers add their inlet masses and splitters split mass in proportion to flow. The masses are propagated
+    from the sources along the arcs of the flowsheet (repeating the pass until it settles if the train has
+    recycles) and divided by the solved flows.
+
+    :param m: Solved WaterTAP3 model built with pruned constituents
+    :return: Dictionary of (block name, port name) to a dictionary of constituent to concentration [kg/m3]
+    '''
+    pruned = list(getattr(m.fs, 'pruned_constituents', []))
+    if not pruned:
+        return {}
+    t = m.fs.config.time.first()
+    n = len(pruned)
+
+    inflows = {}
+    for arc in m.fs.component_objects(Arc, descend_into=False):
+        inflows.setdefault(arc.destination.parent_block().local_name, {}).setdefault(arc.destination.local_name, []).append(arc.source)
+
+    source_df = m.fs.source_df
+    blocks = [b for b in m.fs.component_objects(Block, descend_into=False) if hasattr(b, 'inlet') or hasattr(b, 'outlet')]
+    mass = {}
+    for _ in range(max(len(blocks), 1) * 2):
+        previous = {k: v.copy() for k, v in mass.items()}
+        for b in blocks:
+            name = b.local_name
+            if hasattr(b, 'water_type'):  # source
+                source = source_df[source_df.water_type == b.water_type].value
+                conc = np.array([source.get(j, 0) for j in pruned], dtype=float)
+                mass[(name, 'outlet')] = conc * _port_flow(b.outlet, t)
+                continue
+            ports = inflows.get(name, {})
+            in_mass = {p: sum((mass.get((s.parent_block().local_name, s.local_name), np.zeros(n)) for s in sources), np.zeros(n))
+                       for p, sources in ports.items()}
+            for p, mass_p in in_mass.items():
+                mass[(name, p)] = mass_p
+            total_in = sum(in_mass.values(), np.zeros(n))
+            if hasattr(b, 'pruned_removal'):  # unit process
+                removal = np.array([b.pruned_removal.get(j, default_removal) for j in pruned])
+                mass[(name, 'inlet')] = total_in
+                mass[(name, 'outlet')] = total_in * (1 - removal)
+                mass[(name, 'waste')] = total_in * removal
+            else:  # mixer or splitter
+                out_ports = [p for p in b.component_map(Port) if p not in ports]
+                out_flow = sum(_port_flow(getattr(b, p), t) for p in out_ports)
+                for p in out_ports:
+                    share = _port_flow(getattr(b, p), t) / out_flow if out_flow else 0
+                    mass[(name, p)] = total_in * share
+        if previous.keys() == mass.keys() and all(np.allclose(previous[k], v, rtol=1E-12, atol=0) for k, v in mass.items()):
+            break
 
-    return removal_dict
\ No newline at end of file
+    conc = {}
+    for (name, p), mass_p in mass.items():
+        flow = _port_flow(getattr(getattr(m.fs, name), p), t)
+        conc[(name, p)] = dict(zip(pruned, (mass_p / flow if flow else np.zeros(n)).tolist()))
+    return conc
@@ -0,0 +1,188 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from pyomo.core.expr.calculus.derivatives import differentiate
+from pyomo.environ import Constraint, Var, value
+
+from .sweep import get_component
+
+__all__ = ['lcow_outputs',
+           'gradient_parameters',
+           'lcow_gradients',
+           'tornado_report']
+
+_log = logging.getLogger(__name__)
+
+
+def _partials(expr):
+    # derivative of an expression with respect to each variable in it, in one reverse pass
+    der = differentiate(expr, mode=differentiate.Modes.reverse_numeric)
+    return {id(v): (v, d) for v, d in der.items() if getattr(v, 'is_variable_type', lambda: False)()}
+
+
+def lcow_outputs(m):
+    '''
+    LCOW outputs of a treatment train: the system LCOW, its breakdown by cost category and the LCOW of each unit.
+
+    :param m: WaterTAP3 model with the costing built
+    :return: Outputs ({name: component path})
+    :rtype: dict
+    '''
+    outputs = {'lcow': 'fs.costing.LCOW',
+               'lcow_tci': 'fs.costing.LCOW_TCI',
+               'lcow_elec': 'fs.costing.LCOW_elec',
+               'lcow_fixed_op': 'fs.costing.LCOW_fixed_op',
+               'lcow_chem': 'fs.costing.LCOW_chem',
+               'lcow_other': 'fs.costing.LCOW_other_onm'}
+    for unit_name in m.fs.pfd_dict:
+        if hasattr(getattr(m.fs, unit_name, None), 'LCOW'):
+            outputs[f'{unit_name}_lcow'] = f'fs.{unit_name}.LCOW'
+    return outputs
+
+
+def gradient_parameters(m):
+    '''
+    Function to get the parameters of a treatment train to differentiate the LCOW with respect to: the fixed
+    variables of the costing parameters, the source water (flow and constituent concentrations) and the units
+    (design and costing parameters). Variables fixed at zero are left out.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :return: Paths of the parameters
+    :rtype: list
+    '''
+    blocks = [m.fs.costing_param, *(getattr(m.fs, key) for key in m.fs.flow_in_dict),
+              *(getattr(m.fs, unit_name) for unit_name in m.fs.pfd_dict if hasattr(m.fs, unit_name))]
+    parameters = []
+    for b in blocks:
+        for v in b.component_data_objects(Var, descend_into=True):
+            if v.fixed and v.value:
+                parameters.append(v.name)
+    return list(dict.fromkeys(parameters))
+
+
+def lcow_gradients(m, parameters=None, outputs=None):
+    '''
+    Function to get the derivatives of the LCOW of a solved treatment train with respect to its parameters and
+    the local elasticities (% change of the output for a 1% change of the parameter).
+
+    The derivatives are exact at the solved point with the design fixed (the model solved without the LCOW
+    objective): each output is differentiated in reverse mode, and the change of the solution (flows, unit
+    designs) with the parameters is accounted for with one linear solve per output on the Jacobian of the
+    active equality constraints (the adjoint). All parameters are done at once, so the cost does not grow with
+    the number of parameters. If the constraints are not a square, nonsingular system, only the direct
+    derivatives (with the solution held fixed) are returned.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param parameters: Paths of the parameters (fixed variables), ``gradient_parameters(m)`` if None
+    :type parameters: list
+    :param outputs: Outputs ({name: component path}), ``lcow_outputs(m)`` if None
+    :type outputs: dict
+    :return: Table indexed by parameter with its value and, for each output, '<output>_gradient' and
+        '<output>_elasticity'
+    :rtype: DataFrame
+    '''
+    # SciPy is only imported when gradients are computed, not with watertap3.utils
+    from scipy.sparse import csc_matrix
+    from scipy.sparse.linalg import splu
+
+    if parameters is None:
+        parameters = gradient_parameters(m)
+    if outputs is None:
+        outputs = lcow_outputs(m)
+    params = []
+    for path in parameters:
+        obj = m.find_component(path)
+        params.extend(obj.values() if obj.is_indexed() else [obj])
+    p_col = {id(v): j for j, v in enumerate(params)}
+
+    output_partials = {name: _partials(get_component(m, path)) for name, path in outputs.items()}
+    constraints = [c for c in m.component_data_objects(Constraint, active=True, descend_into=True) if c.equality]
+    rows = [_partials(c.body) for c in constraints]
+    x_col = {}
+    for row in rows:
+        for key, (v, _) in row.items():
+            if not v.fixed and key not in x_col:
+                x_col[key] = len(x_col)
+
+    grad = np.zeros((len(params), len(outputs)))
+    for k, partials in enumerate(output_partials.values()):
+        for key, (_, d) in partials.items():
+            if key in p_col:
+                grad[p_col[key], k] = d
+
+    if len(x_col) != len(constraints):
+        _log.warning(f'{len(constraints)} equality constraints and {len(x_col)} free variables: '
+                     f'LCOW gradients with the solution held fixed')
+    else:
+        jx, jp = ([], [], []), ([], [], [])
+        for i, row in enumerate(rows):
+            for key, (_, d) in row.items():
+                for cols, (data, r, c) in ((x_col, jx), (p_col, jp)):
+                    if key in cols:
+                        data.append(d)
+                        r.append(i)
+                        c.append(cols[key])
+        n = len(constraints)
+        dl_dx = np.zeros((n, len(outputs)))
+        for k, partials in enumerate(output_partials.values()):
+            for key, (_, d) in partials.items():
+                if key in x_col:
+                    dl_dx[x_col[key], k] = d
+        try:
+            # adjoint: Jx^T lam = dL/dx, dL/dp = dL/dp (direct) - Jp^T lam
+            lam = splu(csc_matrix((jx[0], (jx[2], jx[1])), shape=(n, n))).solve(dl_dx)
+            grad -= csc_matrix((jp[0], (jp[2], jp[1])), shape=(len(params), n)) @ lam
+        except RuntimeError as e:
+            _log.warning(f'Singular constraint Jacobian ({e}): LCOW gradients with the solution held fixed')
+
+    df = pd.DataFrame(index=pd.Index([v.name for v in params], name='parameter'))
+    df['value'] = [value(v) for v in params]
+    for k, (name, path) in enumerate(outputs.items()):
+        out = value(get_component(m, path))
+        df[f'{name}_gradient'] = grad[:, k]
+        with np.errstate(all='ignore'):
+            df[f'{name}_elasticity'] = grad[:, k] * df['value'].values / out
+    return df
+
+
+def tornado_report(m, output='lcow', change=0.1, top=20, parameters=None, gradients=None, save_results=False):
+    '''
+    Function to print a tornado table of an LCOW output from its gradients: the parameters ranked by the
+    change of the output for a +/- ``change`` fraction change of each one, to first order. Use it to screen
+    which parameters are worth a full sweep with ``run_sensitivity`` or ``run_spec``.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param output: Output name (see ``lcow_outputs``)
+    :type output: str
+    :param change: Fractional change of each parameter
+    :type change: float
+    :param top: Number of parameters to print (all if None)
+    :type top: int
+    :param parameters: Paths of the parameters, ``gradient_parameters(m)`` if None
+    :type parameters: list
+    :param gradients: Table from ``lcow_gradients``, computed if None
+    :type gradients: DataFrame
+    :param save_results: Save the table to results/case_studies/<case study>_<scenario>_tornado.csv
+    :type save_results: bool
+    :return: Table with the elasticity, the output at -/+ ``change`` and the swing of each parameter, largest
+        swing first
+    :rtype: DataFrame
+    '''
+    if gradients is None:
+        gradients = lcow_gradients(m, parameters=parameters)
+    base = value(get_component(m, lcow_outputs(m)[output]))
+    step = gradients[f'{output}_gradient'] * gradients['value'] * change
+    df = pd.DataFrame({'value': gradients['value'],
+                       'elasticity': gradients[f'{output}_elasticity'],
+                       'low': base - step,
+                       'high': base + step,
+                       'swing': 2 * step.abs()})
+    df = df[df.swing > 0].sort_values('swing', ascending=False)
+    print(f'\n{output} = {base:.4f}, +/- {change:.0%} change of each parameter:')
+    print(df.head(top).to_string() if top is not None else df.to_string())
+    if save_results:
+        case_study = m.fs.train['case_study']
+        scenario = m.fs.train['scenario']
+        df.to_csv(f'results/case_studies/{case_study}_{scenario}_tornado.csv')
+    return df
@@ -0,0 +1,155 @@
+import logging
+
+from pyomo.environ import value
+from pyomo.network import Port, SequentialDecomposition
+
+__all__ = ['initialize_flowsheet',
+           'seed_value']
+
+_log = logging.getLogger(__name__)
+
+
+def seed_value(var, val):
+    '''
+    Set the value of a variable that is not fixed, clipped to its bounds. Fixed variables, expressions
+    and missing values are left as they are.
+
+    :param var: Pyomo variable (or expression) data object
+    :param val: Value to seed
+    :type val: float
+    '''
+    if val is None or not var.is_variable_type() or var.fixed:
+        return
+    if var.lb is not None and val < var.lb:
+        val = var.lb
+    if var.ub is not None and val > var.ub:
+        val = var.ub
+    var.set_value(val)
+
+
+def _pass_values(arc, t):
+    src, dest = arc.source, arc.destination
+    for name, src_member in src.vars.items():
+        dest_member = dest.vars.get(name)
+        if dest_member is None:
+            continue
+        for idx in dest_member:
+            if idx == t or (isinstance(idx, tuple) and idx[0] == t):
+                seed_value(dest_member[idx], value(src_member[idx]))
+
+
+def _initialize_unit(b, t):
+    flow_in = value(b.flow_vol_in[t])
+    recovery = min(max(value(b.water_recovery[t]), 1E-8), 1)
+    flow_out = recovery * flow_in
+    flow_waste = flow_in - flow_out
+    seed_value(b.flow_vol_out[t], flow_out)
+    seed_value(b.flow_vol_waste[t], flow_waste)
+    for j in b.config.property_package.component_list:
+        conc_in = value(b.conc_mass_in[t, j])
+        removal = value(b.removal_fraction[t, j])
+        seed_value(b.conc_mass_out[t, j], conc_in * (1 - removal) / recovery)
+        if flow_waste > 1E-10 * flow_in:
+            seed_value(b.conc_mass_waste[t, j], conc_in * removal * flow_in / flow_waste)
+        else:
+            seed_value(b.conc_mass_waste[t, j], conc_in)
+    seed_value(b.pressure_out[t], value(b.pressure_in[t]) + value(b.deltaP_outlet[t]))
+    seed_value(b.pressure_waste[t], value(b.pressure_in[t]) + value(b.deltaP_waste[t]))
+    if hasattr(b, 'estimate_state'):
+        b.estimate_state(t)
+
+
+def _initialize_splitter(b, t):
+    flow_in = value(b.flow_vol_in[t])
+    for p in b.outlet_list:
+        split = value(getattr(b, 'split_fraction_%s' % p)[t])
+        if b.decision:
+            split *= value(getattr(b, 'decision_var_%s' % p)[t])
+        seed_value(getattr(b, 'flow_vol_%s' % p)[t], split * flow_in)
+        for j in b.config.property_package.component_list:
+            seed_value(getattr(b, 'conc_mass_%s' % p)[t, j], value(b.conc_mass_in[t, j]))
+        seed_value(getattr(b, 'pressure_%s' % p)[t], value(b.pressure_in[t]))
+        seed_value(getattr(b, 'temperature_%s' % p)[t], value(b.temperature_in[t]))
+
+
+def _initialize_mixer(b, t):
+    inlets = [p for p in b.component_map(Port) if p != 'outlet']
+    flows = [value(getattr(b, 'flow_vol_%s' % p)[t]) for p in inlets]
+    flow_out = sum(flows)
+    seed_value(b.flow_vol_out[t], flow_out)
+    for j in b.config.property_package.component_list:
+        mass = sum(flow * value(getattr(b, 'conc_mass_%s' % p)[t, j]) for p, flow in zip(inlets, flows))
+        seed_value(b.conc_mass_out[t, j], mass / flow_out if flow_out else 0)
+    # the mixer constraints average pressure and temperature over the inlets
+    seed_value(b.pressure_out[t], sum(value(getattr(b, 'pressure_%s' % p)[t]) for p in inlets) / len(inlets))
+    seed_value(b.temperature_out[t], sum(value(getattr(b, 'temperature_%s' % p)[t]) for p in inlets) / len(inlets))
+
+
+def _initialize_source(b, t):
+    seed_value(b.flow_vol_out[t], value(b.flow_vol_in[t]))
+    for j in b.config.property_package.component_list:
+        seed_value(b.conc_mass_out[t, j], value(b.conc_mass_in[t, j]))
+    seed_value(b.pressure_out[t], value(b.pressure_in[t]))
+    seed_value(b.temperature_out[t], value(b.temperature_in[t]))
+
+
+def _initialize_block(b, t):
+    if hasattr(b, 'removal_fraction'):
+        _initialize_unit(b, t)
+    elif hasattr(b, 'outlet_list'):
+        _initialize_splitter(b, t)
+    elif hasattr(b, 'flow_vol_in'):
+        _initialize_source(b, t)
+    else:
+        _initialize_mixer(b, t)
+
+
+def initialize_flowsheet(m, G=None, max_passes=5, tol=1E-6):
+    '''
+    Function to initialize the treatment train before the full solve, sequential-modular style.
+
+    Units are visited in topological order of the flowsheet graph. Each unit gets its inlet values from
+    the units upstream and sets its outlet and waste flows and concentrations from its water recovery
+    and removal fractions (mixers and splitters mix and split the same way the model does). Units with
+    an ``estimate_state`` method (e.g. reverse osmosis, ion exchange) then seed their own variables from
+    analytic estimates. If the train has recycles, the recycle (tear) streams are passed again until the
+    values settle. Only variables that are not fixed are changed, so this never changes the problem,
+    only the point ipopt starts from.
+
+    :param m: WaterTAP3 model after ``network.expand_arcs``
+    :param G: Flowsheet graph from ``SequentialDecomposition.create_graph`` (built if None)
+    :param max_passes: Maximum passes over the flowsheet when it has recycles
+    :type max_passes: int
+    :param tol: Relative change in the tear stream flows at which the passes stop
+    :type tol: float
+    :return: Number of passes made
+    '''
+    seq = SequentialDecomposition(select_tear_method='heuristic')
+    if G is None:
+        G = seq.create_graph(m)
+    t = m.fs.config.time.first()
+    tears = set(seq.tear_set_arcs(G, method='heuristic'))
+    order = seq.calculation_order(G)
+    in_arcs = {}
+    for _, dest, arc in G.edges(data='arc'):
+        in_arcs.setdefault(dest, []).append(arc)
+
+    for n_pass in range(1, max_passes + 1):
+        tear_flows = [value(arc.destination.vars['flow_vol'][t]) for arc in tears]
+        for stage in order:
+            for b in stage:
+                for arc in in_arcs.get(b, []):
+                    # tear streams keep their initial guess on the first pass
+                    if n_pass > 1 or arc not in tears:
+                        _pass_values(arc, t)
+                _initialize_block(b, t)
+        if not tears:
+            break
+        for arc in tears:
+            _pass_values(arc, t)
+        change = max(abs(value(arc.destination.vars['flow_vol'][t]) - flow) / max(abs(flow), 1E-10)
+                     for arc, flow in zip(tears, tear_flows))
+        if change < tol:
+            break
+    _log.debug(f'Initialized flowsheet in {n_pass} pass(es) with {len(tears)} tear stream(s)')
+    return n_pass
@@ -1,8 +1,8 @@
 import numpy as np
 import pandas as pd
-from scipy.optimize import curve_fit
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
+from watertap3.data import get_table
+
+from .coefficient_store import array_hash, fit_power_law, get_coefficients
 
 __all__ = ['make_df_for_ml',
            'make_simple_poly',
@@ -11,6 +11,7 @@ __all__ = ['make_df_for_ml',
 
 
 def make_df_for_ml(df1):
+    from sklearn.preprocessing import PolynomialFeatures
     poly2 = PolynomialFeatures(3, include_bias=False)
     df1 = df1.copy(deep=True)
     df1 = df1.T
@@ -30,6 +31,8 @@ def make_df_for_ml(df1):
 
 
 def make_simple_poly(df, y_value):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import PolynomialFeatures
     df['y'] = df[y_value]
     del df[y_value]
 
@@ -93,6 +96,7 @@ def make_simple_poly(df, y_value):
 
 
 def get_linear_regression(x_values, y_values, variable=None):
+    from sklearn.linear_model import LinearRegression
 
     X = np.array(x_values).reshape(-1, 1)
     y = np.array(y_values).reshape(-1, 1)
@@ -111,7 +115,8 @@ def power_law(x, a, b):
 def get_cost_curve_coefs(flow_in=None, data_id=None, xs=None, ys=None):
     if data_id == None:
 
-        pars, cov = curve_fit(f=power_law, xdata=xs, ydata=ys)
+        data_hash = array_hash(xs, ys)
+        pars = get_coefficients('power_law', data_hash, data_hash, lambda: fit_power_law(xs, ys))
 
         ys_new = pars[0] * xs ** pars[1]
 
@@ -119,7 +124,7 @@ def get_cost_curve_coefs(flow_in=None, data_id=None, xs=None, ys=None):
 
     else:
 
-        df = pd.read_csv('data/chlorine_dose_cost_twb.csv')
+        df = get_table('chlorine_dose_cost_twb')
 
         xs = df[((df.Flow_mgd == flow_in) & (df.VariableID == 2))].Value.values
 
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+from collections import OrderedDict
+
+from watertap3.data import data_version
+
+__all__ = ['template_key',
+           'get_template',
+           'store_template',
+           'set_template_cache',
+           'clear_templates']
+
+_log = logging.getLogger(__name__)
+
+_templates = OrderedDict()
+_settings = {
+        'enabled': True,
+        'max_templates': 8
+        }
+
+
+def template_key(m):
+    '''
+    Key for the treatment train built on a model: the case study, scenario and reference of the train and
+    its source water, the unit table the train is built from, the version of the WaterTAP3 data and the
+    constituent pruning options.
+
+    :param m: Model after ``watertap_setup`` (and ``m.fs.df_units`` set for the train to build)
+    :return: Template key
+    '''
+    train = m.fs.train
+    source = m.fs.source_water
+    df_units_hash = hashlib.sha1(m.fs.df_units.to_csv().encode()).hexdigest()
+    return (train['case_study'], train['scenario'], train['reference'],
+            source['case_study'], source['scenario'], source['reference'],
+            m.fs.config.dynamic, m.fs.new_case_study, df_units_hash, data_version(),
+            getattr(m.fs, 'prune_constituents', False), tuple(getattr(m.fs, 'keep_constituents', None) or ()))
+
+
+def get_template(m):
+    '''
+    Function to get a copy of a treatment train that has already been built.
+
+    :param m: Model after ``watertap_setup``
+    :return: Clone of the pristine model with the treatment train, or None if the train has not been built
+    '''
+    if not _settings['enabled']:
+        return None
+    key = template_key(m)
+    template = _templates.get(key)
+    if template is None:
+        return None
+    _templates.move_to_end(key)
+    return template.clone()
+
+
+def store_template(m):
+    '''
+    Store a pristine copy of a model with its treatment train built (before any costing or solve), so later
+    builds of the same train can be cloned instead of constructing every unit again.
+
+    :param m: Model returned by ``get_case_study``
+    '''
+    if not _settings['enabled']:
+        return
+    try:
+        template = m.clone()
+    except Exception as e:
+        _log.warning(f'Could not store template for {m.fs.train}: {e}')
+        return
+    _templates[template_key(m)] = template
+    while len(_templates) > _settings['max_templates']:
+        _templates.popitem(last=False)
+
+
+def set_template_cache(enabled=True, max_templates=8):
+    '''
+    Turn the model template cache on or off and set how many treatment trains it holds (least recently used
+    trains are dropped first).
+
+    :param enabled: Use the template cache
+    :type enabled: bool
+    :param max_templates: Maximum number of treatment trains to hold
+    :type max_templates: int
+    '''
+    _settings['enabled'] = enabled
+    _settings['max_templates'] = max_templates
+    if not enabled:
+        clear_templates()
+
+
+def clear_templates():
+    '''
+    Drop all stored treatment train templates.
+    '''
+    _templates.clear()
@@ -1,195 +1,142 @@
+import importlib
+import logging
+import sys
+import time
+
+__all__ = ['get_module',
+           'get_unit_class',
+           'register_unit',
+           'unit_names',
+           'get_import_times']
+
+_log = logging.getLogger(__name__)
+
+entry_point_group = 'watertap3.units'
+
+# unit process names used in treatment_train_setup.csv, each is a module in watertap3.wt_units with a UnitProcess class
+wt_unit_names = ['ion_exchange', 'chlorination', 'coag_and_floc', 'water_pumping_station', 'media_filtration', 'lime_softening',
+                 'treated_storage', 'sedimentation', 'sulfuric_acid_addition', 'sodium_bisulfite_addition', 'co2_addition',
+                 'ammonia_addition', 'municipal_drinking', 'sw_onshore_intake', 'holding_tank', 'tri_media_filtration',
+                 'cartridge_filtration', 'backwash_solids_handling', 'surface_discharge', 'landfill', 'coagulant_addition',
+                 'ferric_chloride_addition', 'caustic_soda_addition', 'static_mixer', 'uv_aop', 'anti_scalant_addition',
+                 'iron_and_manganese_removal', 'well_field', 'hydrochloric_acid_addition', 'deep_well_injection', 'anion_exchange',
+                 'cation_exchange', 'electrodialysis_reversal', 'irwin_brine_management', 'fixed_bed_pressure_vessel',
+                 'fixed_bed_gravity_basin', 'fluidized_bed', 'multi_stage_bubble_aeration', 'packed_tower_aeration',
+                 'gac_pressure_vessel', 'gac_gravity', 'ozone_aop', 'microfiltration', 'reverse_osmosis', 'basic_unit', 'cooling_tower',
+                 'evaporation_pond', 'heap_leaching', 'agglom_stacking', 'solution_distribution_and_recovery_plant', 'lime_addition',
+                 'brine_concentrator', 'crystallizer', 'chemical_addition', 'gac', 'anion_exchange_epa', 'landfill_zld', 'passthrough',
+                 'filter_press', 'alum_addition']
+
+_registry = {name: f'watertap3.wt_units.{name}' for name in wt_unit_names}
+_modules = {}
+_classes = {}
+_import_times = {}
+_entry_points_loaded = []
+
+
+def _load_entry_points():
+    '''
+    Register unit processes that other packages declare under the 'watertap3.units' entry point group. The
+    entry point name is the unit process name and its value is either a module with a UnitProcess class or
+    the UnitProcess class itself, e.g. in setup.py:
+
+        entry_points={'watertap3.units': ['my_unit = my_package.my_unit']}
+    '''
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded.append(True)
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        try:
+            from pkg_resources import iter_entry_points
+        except ImportError:
+            return
+        eps = list(iter_entry_points(entry_point_group))
+    else:
+        eps = entry_points()
+        if hasattr(eps, 'select'):
+            eps = eps.select(group=entry_point_group)
+        else:
+            eps = eps.get(entry_point_group, [])
+    for ep in eps:
+        _registry.setdefault(ep.name, ep)
+
+
+def register_unit(unit_process_name, target):
+    '''
+    Function to register a unit process so it can be used in a treatment train.
+
+    :param unit_process_name: Unit process name used in the treatment train setup
+    :type unit_process_name: str
+    :param target: Import path of a module with a UnitProcess class (e.g. 'my_package.my_unit'), or the module or
+        UnitProcess class itself
+    '''
+    _registry[unit_process_name] = target
+    _modules.pop(unit_process_name, None)
+    _classes.pop(unit_process_name, None)
+
+
+def unit_names():
+    '''
+    :return: Sorted list of registered unit process names
+    '''
+    _load_entry_points()
+    return sorted(_registry)
 
-__all__ = ['get_module']
 
 def get_module(module_name):
-    if module_name == 'ion_exchange':
-        import wt_units.ion_exchange as up
-
-    if module_name == 'chlorination':
-        import wt_units.chlorination as up
-    
-    if module_name == 'coag_and_floc':
-        import wt_units.coag_and_floc as up
-
-    if module_name == 'water_pumping_station':
-        import wt_units.water_pumping_station as up
-        
-    if module_name == 'media_filtration':
-        import wt_units.media_filtration as up
-     
-    if module_name == 'lime_softening':
-        import wt_units.lime_softening as up
-     
-    if module_name == 'ro_deep':
-        import wt_units.ro_deep as up
-    
-    if module_name == 'ro_deep_scnd_pass':
-        import wt_units.ro_deep_scnd_pass as up
-        
-    if module_name == 'treated_storage':
-        import wt_units.treated_storage as up
-    
-    if module_name == 'sedimentation':
-        import wt_units.sedimentation as up
-        
-    if module_name == 'water_pumping_station':
-        import wt_units.water_pumping_station as up
-        
-    if module_name == 'sulfuric_acid_addition':
-        import wt_units.sulfuric_acid_addition as up
-        
-    if module_name == 'sodium_bisulfite_addition':
-        import wt_units.sodium_bisulfite_addition as up
-    
-    if module_name == 'co2_addition':
-        import wt_units.co2_addition as up
-    
-    if module_name == 'ammonia_addition':
-        import wt_units.ammonia_addition as up
-    
-    if module_name == 'municipal_drinking':
-        import wt_units.municipal_drinking as up
-        
-    if module_name == 'sw_onshore_intake':
-        import wt_units.sw_onshore_intake as up
-        
-    if module_name == 'holding_tank':
-        import wt_units.holding_tank as up
-        
-    if module_name == 'tri_media_filtration':
-        import wt_units.tri_media_filtration as up
-        
-    if module_name == 'cartridge_filtration':
-        import wt_units.cartridge_filtration as up
-        
-    if module_name == 'backwash_solids_handling':
-        import wt_units.backwash_solids_handling as up
-
-    if module_name == 'surface_discharge':
-        import wt_units.surface_discharge as up
-
-    if module_name == 'landfill':
-        import wt_units.landfill as up
-
-    if module_name == 'coagulant_addition':
-        import wt_units.coagulant_addition as up
-
-    if module_name == 'ferric_chloride_addition':
-        import wt_units.ferric_chloride_addition as up
-
-    if module_name == 'caustic_soda_addition':
-        import wt_units.caustic_soda_addition as up
-
-    if module_name == 'static_mixer':
-        import wt_units.static_mixer as up
-
-    if module_name == 'uv_aop':
-        import wt_units.uv_aop as up
-
-    if module_name == 'anti_scalant_addition':
-        import wt_units.anti_scalant_addition as up
-
-    if module_name == 'iron_and_manganese_removal':
-        import wt_units.iron_and_manganese_removal as up
-
-    if module_name == 'well_field':
-        import wt_units.well_field as up
-
-    if module_name == 'hydrochloric_acid_addition':
-        import wt_units.hydrochloric_acid_addition as up
-
-    if module_name == 'deep_well_injection':
-        import wt_units.deep_well_injection as up
-
-    if module_name == 'anion_exchange':
-        import wt_units.anion_exchange as up
-
-    if module_name == 'cation_exchange':
-        import wt_units.cation_exchange as up
-
-    if module_name == 'electrodialysis_reversal':
-        import wt_units.electrodialysis_reversal as up
-
-    if module_name == 'irwin_brine_management':
-        import wt_units.irwin_brine_management as up
-
-    if module_name == 'fixed_bed_pressure_vessel':
-        import wt_units.fixed_bed_pressure_vessel as up
-
-    if module_name == 'fixed_bed_gravity_basin':
-        import wt_units.fixed_bed_gravity_basin as up
-
-    if module_name == 'fluidized_bed':
-        import wt_units.fluidized_bed as up
-
-    if module_name == 'multi_stage_bubble_aeration':
-        import wt_units.multi_stage_bubble_aeration as up
-
-    if module_name == 'packed_tower_aeration':
-        import wt_units.packed_tower_aeration as up
-
-    if module_name == 'gac_pressure_vessel':
-        import wt_units.gac_pressure_vessel as up
-
-    if module_name == 'gac_gravity':
-        import wt_units.gac_gravity as up
-
-    if module_name == 'ozone_aop':
-        import wt_units.ozone_aop as up
-
-    if module_name == 'microfiltration':
-        import wt_units.microfiltration as up
-    
-    if module_name == 'reverse_osmosis':
-        import wt_units.reverse_osmosis as up
-
-    if module_name == 'basic_unit':
-        import wt_units.basic_unit as up
-    
-    if module_name == 'cooling_tower':
-        import wt_units.cooling_tower as up
-
-    if module_name == 'evaporation_pond':
-        import wt_units.evaporation_pond as up
-
-    if module_name == 'basic_mass_based':
-        import wt_units.basic_mass_based as up
-
-    if module_name == 'heap_leaching':
-        import wt_units.heap_leaching as up
-
-    if module_name == 'agglom_stacking':
-        import wt_units.agglom_stacking as up
-
-    if module_name == 'solution_distribution_and_recovery_plant':
-        import wt_units.solution_distribution_and_recovery_plant as up
-
-    if module_name == 'lime_addition':
-        import wt_units.lime_addition as up
-
-    if module_name == 'brine_concentrator':
-        import wt_units.brine_concentrator as up
-
-    if module_name == 'crystallizer':
-        import wt_units.crystallizer as up
-
-    if module_name == 'chemical_addition':
-        import wt_units.chemical_addition as up
-
-    if module_name == 'gac':
-        import wt_units.gac as up
+    '''
+    Function to get the module for a unit process. The module is imported the first time the unit process is
+    used and cached after that.
+
+    :param module_name: Unit process name
+    :type module_name: str
+    :return: Module with the UnitProcess class for the unit process
+    '''
+    up = _modules.get(module_name)
+    if up is not None:
+        return up
+    _load_entry_points()
+    try:
+        target = _registry[module_name]
+    except KeyError:
+        raise KeyError(f'Unknown unit process "{module_name}". Registered unit processes are: {", ".join(unit_names())}') from None
+    start = time.perf_counter()
+    if isinstance(target, str):
+        up = importlib.import_module(target)
+    elif hasattr(target, 'load'):  # entry point
+        up = target.load()
+    else:
+        up = target
+    if isinstance(up, type):
+        _classes[module_name] = up
+        up = sys.modules[up.__module__]
+    _import_times[module_name] = time.perf_counter() - start
+    _log.debug(f'Imported unit process {module_name} from {up.__name__} in {_import_times[module_name]:.3f} s')
+    _modules[module_name] = up
+    return up
 
-    if module_name == 'anion_exchange_epa':
-        import wt_units.anion_exchange_epa as up
 
-    if module_name == 'landfill_zld':
-        import wt_units.landfill_zld as up
+def get_unit_class(module_name):
+    '''
+    Function to get the UnitProcess class for a unit process.
 
-    if module_name == 'passthrough':
-        import wt_units.passthrough as up
+    :param module_name: Unit process name
+    :type module_name: str
+    :return: UnitProcess class
+    '''
+    up = get_module(module_name)
+    if module_name in _classes:
+        return _classes[module_name]
+    return up.UnitProcess
 
-    if module_name == 'filter_press':
-        import wt_units.filter_press as up
 
-    return up
+def get_import_times():
+    '''
+    Time spent importing each unit process module so far. The first unit imported also includes the time to
+    import the libraries all units depend on (Pyomo, IDAES).
 
+    :return: Dictionary of unit process name to import time [s], slowest first
+    '''
+    return dict(sorted(_import_times.items(), key=lambda item: item[1], reverse=True))
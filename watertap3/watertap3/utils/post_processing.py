@@ -2,6 +2,7 @@ import os
 import pandas as pd
 from pylab import *
 from pyomo.environ import Block, Expression, units as pyunits, value
+from watertap3.data import get_table
 from watertap3.utils import generate_constituent_list
 
 __all__ = ['get_results_table', 'combine_case_study_results', 'compare_with_excel']
@@ -148,7 +149,7 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
     flow_ins_ro = []
     flow_outs_ro = []
 
-    name_lup = pd.read_csv('data/excel_to_python_names.csv', index_col='Python_variable')
+    name_lup = get_table('excel_to_python_names', index_col='Python_variable')
 
     value_list.append(value(m.fs.costing.LCOW))
     python_var.append('system')
@@ -506,6 +507,14 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
     unit_list.append('%')
     unit_kinds.append('System')
 
+    if incl_constituent_results:
+        # constituents left out of the model by pruning are reported from their rebuilt concentrations
+        report_constituents = generate_constituent_list.run(m.fs)
+        pruned_conc = {}
+        if getattr(m.fs, 'pruned_constituents', []):
+            report_constituents = list(m.fs.source_constituents)
+            pruned_conc = generate_constituent_list.reconstruct_constituents(m)
+
     for unit in m.fs.component_objects(Block, descend_into=False):
         unit_str = unit_name = str(unit)[3:]
         up_nice_name = get_unit_nice_name(unit_str)
@@ -753,11 +762,19 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
 
             if incl_constituent_results:
 
-                for conc in generate_constituent_list.run(m.fs):
+                for conc in report_constituents:
                     constituent, units = get_constituent_nice_name(conc)
+                    if conc in pruned_conc.get((unit_str, 'inlet'), {}):
+                        conc_in = pruned_conc[(unit_str, 'inlet')][conc]
+                        conc_out = pruned_conc[(unit_str, 'outlet')][conc]
+                        conc_waste = pruned_conc[(unit_str, 'waste')][conc]
+                    else:
+                        conc_in = value(unit.conc_mass_in[0, conc])
+                        conc_out = value(unit.conc_mass_out[0, conc])
+                        conc_waste = value(unit.conc_mass_waste[0, conc])
 
                     ### MASS IN KG PER M3
-                    value_list.append(value(unit.conc_mass_in[0, conc]))
+                    value_list.append(conc_in)
                     python_var.append(unit_str)
                     up_nice_name_list.append(up_nice_name)
                     category.append('Inlet Concentration')
@@ -766,7 +783,7 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
                     unit_list.append(units)
                     unit_kinds.append(unit.unit_kind)
 
-                    value_list.append(value(unit.conc_mass_out[0, conc]))
+                    value_list.append(conc_out)
                     python_var.append(unit_str)
                     up_nice_name_list.append(up_nice_name)
                     category.append('Outlet Concentration')
@@ -775,7 +792,7 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
                     unit_list.append(units)
                     unit_kinds.append(unit.unit_kind)
 
-                    value_list.append(value(unit.conc_mass_waste[0, conc]))
+                    value_list.append(conc_waste)
                     python_var.append(unit_str)
                     up_nice_name_list.append(up_nice_name)
                     category.append('Waste Concentration')
@@ -785,7 +802,7 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
                     unit_kinds.append(unit.unit_kind)
 
                     ### MASS IN KG --> MULTIPLIED BY FLOW
-                    value_list.append(value(unit.conc_mass_in[0, conc]) * value(unit.flow_vol_in[0]))
+                    value_list.append(conc_in * value(unit.flow_vol_in[0]))
                     python_var.append(unit_str)
                     up_nice_name_list.append(up_nice_name)
                     category.append('Inlet Mass Flow')
@@ -794,7 +811,7 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
                     unit_list.append('kg/s')
                     unit_kinds.append(unit.unit_kind)
 
-                    value_list.append(value(unit.conc_mass_out[0, conc]) * value(unit.flow_vol_out[0]))
+                    value_list.append(conc_out * value(unit.flow_vol_out[0]))
                     python_var.append(unit_str)
                     up_nice_name_list.append(up_nice_name)
                     category.append('Outlet Mass Flow')
@@ -803,7 +820,7 @@ def get_results_table(m=None, scenario=None, case_study=None, save=True, incl_co
                     unit_list.append('kg/s')
                     unit_kinds.append(unit.unit_kind)
 
-                    value_list.append(value(unit.conc_mass_waste[0, conc]) * value(unit.flow_vol_waste[0]))
+                    value_list.append(conc_waste * value(unit.flow_vol_waste[0]))
                     python_var.append(unit_str)
                     up_nice_name_list.append(up_nice_name)
                     category.append('Waste Mass Flow')
@@ -0,0 +1,301 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+from pyomo.environ import Constraint, Expression, Var
+from watertap3 import data
+
+__all__ = ['Timings',
+           'enable_profiling',
+           'disable_profiling',
+           'profiling_enabled',
+           'get_timings',
+           'profile_phase',
+           'record_solver_time']
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_settings = {
+        'enabled': os.environ.get('WATERTAP3_PROFILE', '') not in ('', '0'),
+        'memory': True,
+        'cprofile': ()
+        }
+_active = []
+
+
+def enable_profiling(memory=True, cprofile=None):
+    '''
+    Turn on build and solve profiling. Models built after this record wall time, Pyomo component counts and
+    memory for each pipeline phase and each unit build in ``m.fs.timings``. Profiling can also be turned on
+    with the WATERTAP3_PROFILE environment variable.
+
+    :param memory: Memory to record for each phase. True records the peak resident memory of the process at the
+        end of the phase (no overhead). 'tracemalloc' records the peak memory allocated by Python during the
+        phase, which is exact but slows the run down. False records no memory.
+    :param cprofile: Names of phases (e.g. ['solve', 'get_case_study']) or unit names to run under cProfile, or
+        '*' for every phase. Profiles are kept in ``m.fs.timings.profiles``.
+    '''
+    _settings['enabled'] = True
+    _settings['memory'] = memory
+    if isinstance(cprofile, str):
+        cprofile = [cprofile]
+    _settings['cprofile'] = tuple(cprofile or ())
+
+
+def disable_profiling():
+    '''
+    Turn off build and solve profiling.
+    '''
+    _settings['enabled'] = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def profiling_enabled():
+    return _settings['enabled']
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _count_components(block):
+    return {
+            'vars': sum(1 for _ in block.component_data_objects(Var, descend_into=True)),
+            'constraints': sum(1 for _ in block.component_data_objects(Constraint, descend_into=True)),
+            'expressions': sum(1 for _ in block.component_data_objects(Expression, descend_into=True))
+            }
+
+
+class Timings:
+    '''
+    Build and solve profile for a WaterTAP3 model, stored as ``m.fs.timings``.
+
+    Each record is a dictionary with the phase name, category ('phase', 'unit' or 'data'), start time and
+    duration [s] (relative to when the model was set up), the number of Pyomo variables, constraints and
+    expressions (in the unit block for unit builds and in the whole model for pipeline phases) at the end of the
+    phase, and memory [bytes]. Clones of a model start with an empty profile.
+    '''
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.records = []
+        self.profiles = {}
+        self._stack = []
+
+    def __deepcopy__(self, memo):
+        return Timings()
+
+    @contextmanager
+    def phase(self, name, category='phase', model=None, block=None, **extra):
+        '''
+        Context manager that records a phase of the build or solve.
+
+        :param name: Name of the phase
+        :type name: str
+        :param category: 'phase', 'unit' or 'data'
+        :type category: str
+        :param model: Model to count components in at the end of the phase
+        :param block: Name of the block under ``model.fs`` to count components in instead (e.g. the unit name)
+        :return: Record for the phase, extra values can be added to it inside the phase
+        '''
+        memory = _settings['memory']
+        if memory == 'tracemalloc':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if self._stack:
+                self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], tracemalloc.get_traced_memory()[1])
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        record = {'name': name, 'category': category, **extra, '_peak': 0}
+        profiler = None
+        if '*' in _settings['cprofile'] or name in _settings['cprofile']:
+            profiler = cProfile.Profile()
+        self._stack.append(record)
+        _active.append(self)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        completed = False
+        try:
+            yield record
+            completed = True
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            end = time.perf_counter()
+            _active.pop()
+            self._stack.pop()
+            record['start'] = start - self.origin
+            record['duration'] = end - start
+            # components are only counted for a phase that completed, so a failed unit build is not masked
+            # by its block being missing
+            counted = None
+            if model is not None and completed:
+                counted = getattr(model.fs, block, None) if block is not None else model
+            if counted is not None:
+                record.update(_count_components(counted))
+            peak = record.pop('_peak')
+            if memory == 'tracemalloc':
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                record['peak_memory'] = peak
+                if self._stack:
+                    self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+            elif memory:
+                record['peak_memory'] = _peak_rss()
+            if profiler is not None:
+                if name in self.profiles:
+                    self.profiles[name].add(profiler)
+                else:
+                    self.profiles[name] = pstats.Stats(profiler)
+            self.records.append(record)
+
+    def to_dataframe(self):
+        '''
+        :return: DataFrame with one row per record, in the order the phases started
+        '''
+        return pd.DataFrame(self.records).sort_values('start').reset_index(drop=True)
+
+    def to_json(self, path=None):
+        '''
+        Export the records as JSON.
+
+        :param path: File to write to. If None, the JSON string is returned.
+        :type path: str
+        '''
+        out = json.dumps(sorted(self.records, key=lambda r: r['start']), indent=1, default=str)
+        if path is None:
+            return out
+        with open(path, 'w') as f:
+            f.write(out)
+
+    def to_chrome_trace(self, path=None):
+        '''
+        Export the records in Chrome trace event format, which can be opened in chrome://tracing or Perfetto.
+
+        :param path: File to write to. If None, the trace is returned as a dictionary.
+        :type path: str
+        '''
+        events = []
+        for record in self.records:
+            args = {k: v for k, v in record.items() if k not in ('name', 'category', 'start', 'duration')}
+            events.append({
+                    'name': record['name'],
+                    'cat': record['category'],
+                    'ph': 'X',
+                    'ts': record['start'] * 1E6,
+                    'dur': record['duration'] * 1E6,
+                    'pid': os.getpid(),
+                    'tid': 0,
+                    'args': args
+                    })
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path is None:
+            return trace
+        with open(path, 'w') as f:
+            json.dump(trace, f, default=str)
+
+    def print_profile(self, name, sort='cumulative', limit=30):
+        '''
+        Print the cProfile statistics for a phase.
+
+        :param name: Name of the phase
+        :type name: str
+        :param sort: Sort key for the statistics
+        :param limit: Number of functions to print
+        :type limit: int
+        '''
+        stream = io.StringIO()
+        stats = self.profiles[name]
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        print(stream.getvalue())
+
+
+def _record_table_read(name, seconds):
+    if _active:
+        timings = _active[-1]
+        now = time.perf_counter()
+        timings.records.append({'name': f'read {name}', 'category': 'data', 'start': now - seconds - timings.origin, 'duration': seconds})
+
+
+data.read_hooks.append(_record_table_read)
+
+
+def get_timings(m, create=True):
+    '''
+    Function to get the profile for a model.
+
+    :param m: WaterTAP3 model
+    :param create: Add an empty profile to the model if it does not have one
+    :type create: bool
+    :return: ``m.fs.timings``, or None if profiling is off
+    '''
+    if not _settings['enabled']:
+        return None
+    timings = getattr(m.fs, 'timings', None)
+    if timings is None and create:
+        timings = m.fs.timings = Timings()
+    return timings
+
+
+@contextmanager
+def profile_phase(m, name, category='phase', block=None, count=True, **extra):
+    '''
+    Context manager that records a phase of the build or solve in ``m.fs.timings`` if profiling is on, and does
+    nothing otherwise.
+
+    :param m: WaterTAP3 model
+    :param name: Name of the phase
+    :type name: str
+    :param category: 'phase' or 'unit'
+    :type category: str
+    :param block: Name of the block under ``m.fs`` to count components in (e.g. the unit name)
+    :param count: Count the Pyomo components at the end of the phase
+    :type count: bool
+    :return: Record for the phase (a dictionary) or None
+    '''
+    timings = get_timings(m) if m is not None else None
+    if timings is None:
+        yield None
+        return
+    with timings.phase(name, category=category, model=m if count else None, block=block, **extra) as record:
+        yield record
+
+
+def record_solver_time(record, results):
+    '''
+    Add the time the solver reports to a 'solve' phase record, so time spent writing the model and reading the
+    solution (the rest of the phase) can be told apart from time spent in the solver.
+
+    :param record: Record returned by ``profile_phase`` (may be None)
+    :param results: Pyomo solver results
+    '''
+    if record is None:
+        return
+    solver_time = None
+    for attr in ('wallclock_time', 'time'):
+        try:
+            solver_time = float(getattr(results.solver, attr))
+            break
+        except (AttributeError, TypeError, ValueError):
+            continue
+    if solver_time is not None:
+        record['solver_time'] = solver_time
+        record['interface_time'] = max(record['duration'] - solver_time, 0)
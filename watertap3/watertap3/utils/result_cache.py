@@ -0,0 +1,258 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Constraint, Objective, Var
+from pyomo.opt import SolverResults, SolverStatus, TerminationCondition
+from pyomo.version import version as pyomo_version
+from watertap3.data import data_version, get_cache_dir
+
+__all__ = ['result_key',
+           'get_cached_result',
+           'store_result',
+           'load_cached_solution',
+           'set_result_cache',
+           'clear_results']
+
+_log = logging.getLogger(__name__)
+
+_settings = {
+        'enabled': True,
+        'max_bytes': 256 * 2 ** 20,
+        'max_results': 16
+        }
+_results = OrderedDict()
+_code_version = {}
+
+
+def _package_version():
+    # results change with the model code as well as the data, so the key uses a hash of the package source
+    if 'hash' not in _code_version:
+        h = hashlib.sha1()
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for root, dirs, files in os.walk(package_dir):
+            dirs.sort()
+            for fname in sorted(files):
+                if fname.endswith('.py'):
+                    h.update(fname.encode())
+                    with open(os.path.join(root, fname), 'rb') as f:
+                        h.update(f.read())
+        _code_version['hash'] = h.hexdigest()
+    return _code_version['hash']
+
+
+def _fixed_fingerprint(m):
+    # parameters fixed by the user before run_watertap3 change the results as much as the data tables
+    h = hashlib.sha1()
+    for v in m.component_data_objects(Var, descend_into=True):
+        if v.fixed:
+            h.update(f'{v.name}={v.value!r};'.encode())
+    return h.hexdigest()
+
+
+def result_key(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', solver_options=None):
+    '''
+    Key for the results of ``run_watertap3``: a hash of the treatment train rows, the source water, the
+    contents of the data tables, the values of the fixed variables, the solver and its options, the
+    ``run_watertap3`` arguments and the version of the WaterTAP3 code and Pyomo.
+
+    :param m: Model after ``watertap_setup``, built the same way as the model passed to ``run_watertap3`` (with
+        the treatment train built and any parameters fixed)
+    :param solver: Solver name
+    :type solver: str
+    :param desired_recovery: Desired system recovery passed to ``run_watertap3``
+    :param ro_bounds: RO bounds passed to ``run_watertap3``
+    :param solver_options: Solver options
+    :type solver_options: dict
+    :return: Key (hex string)
+    '''
+    train = m.fs.train
+    source = m.fs.source_water
+    parts = (train['case_study'], train['scenario'], train['reference'],
+             source['case_study'], source['scenario'], source['reference'],
+             m.fs.config.dynamic, m.fs.df_units.to_csv(), data_version(),
+             getattr(m.fs, 'prune_constituents', False), tuple(getattr(m.fs, 'keep_constituents', None) or ()),
+             _fixed_fingerprint(m), solver, tuple(sorted((solver_options or {}).items())), float(desired_recovery),
+             ro_bounds, _package_version(), pyomo_version)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+
+def _result_dir():
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, 'results')
+
+
+def _evict(result_dir):
+    entries = []
+    for fname in os.listdir(result_dir):
+        if fname.endswith('.pkl'):
+            path = os.path.join(result_dir, fname)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    # hits touch the file, so the oldest modification time is the least recently used result
+    for _, size, path in sorted(entries):
+        if total <= _settings['max_bytes']:
+            break
+        os.remove(path)
+        total -= size
+        _log.debug(f'Evicted cached result {path}')
+
+
+def store_result(key, m, df):
+    '''
+    Store the results of a ``run_watertap3`` run: the results table, the values of all variables and the state
+    of the solved model (which variables are fixed, which constraints and objectives are active and the solver
+    termination condition).
+    Results are held in memory and, if a cache directory is set (see ``watertap3.data.set_cache_dir``),
+    saved to ``results/<key>.pkl`` in it. The directory is kept under the size set with
+    ``set_result_cache`` by dropping the least recently used results.
+
+    :param key: Key from ``result_key``
+    :type key: str
+    :param m: Solved WaterTAP3 model
+    :param df: Results table
+    :type df: DataFrame
+    '''
+    if not _settings['enabled']:
+        return
+    var_names, var_values, var_fixed = [], [], []
+    for v in m.component_data_objects(Var, descend_into=True):
+        if v.value is not None:
+            var_names.append(v.name)
+            var_values.append(v.value)
+            var_fixed.append(v.fixed)
+    result = {
+            'df': df.copy(),
+            'var_names': np.array(var_names),
+            'var_values': np.array(var_values, dtype=float),
+            'var_fixed': np.array(var_fixed, dtype=bool),
+            'constraints': set(c.name for c in m.component_data_objects(Constraint, active=True, descend_into=True)),
+            'objectives': {o.name: o.active for o in m.component_objects(Objective, descend_into=True)},
+            'termination': str(m.fs.results.solver.termination_condition)
+            }
+    _results[key] = result
+    _results.move_to_end(key)
+    while len(_results) > _settings['max_results']:
+        _results.popitem(last=False)
+    result_dir = _result_dir()
+    if result_dir is None:
+        return
+    os.makedirs(result_dir, exist_ok=True)
+    path = os.path.join(result_dir, f'{key}.pkl')
+    tmp = f'{path}.{os.getpid()}.tmp'
+    pd.to_pickle(result, tmp)
+    os.replace(tmp, path)
+    _evict(result_dir)
+
+
+def get_cached_result(key):
+    '''
+    Function to get stored ``run_watertap3`` results.
+
+    :param key: Key from ``result_key``
+    :type key: str
+    :return: Dictionary with the results table ('df'), the variable names, values and fixed flags
+        ('var_names', 'var_values', 'var_fixed'), the active constraints ('constraints'), the objectives and
+        whether they are active ('objectives') and the termination condition ('termination'), or None if there
+        are no results for the key
+    '''
+    if not _settings['enabled']:
+        return None
+    result = _results.get(key)
+    if result is not None:
+        _results.move_to_end(key)
+        return result
+    result_dir = _result_dir()
+    if result_dir is None:
+        return None
+    path = os.path.join(result_dir, f'{key}.pkl')
+    if not os.path.exists(path):
+        return None
+    try:
+        result = pd.read_pickle(path)
+    except Exception as e:
+        _log.warning(f'Could not read cached result {path}: {e}')
+        return None
+    os.utime(path)
+    _results[key] = result
+    while len(_results) > _settings['max_results']:
+        _results.popitem(last=False)
+    return result
+
+
+def load_cached_solution(m, result):
+    '''
+    Load stored results into a model of the same treatment train: the variable values, which variables are
+    fixed and which constraints and objectives are active are set as they were in the solved model, and
+    ``m.fs.results`` is set to solver results with the stored termination condition. The model needs the
+    components of the solved model (the system costing, the expanded arcs, the case study constraints and
+    the objective), see ``run_watertap3``.
+
+    :param m: WaterTAP3 model with the treatment train built
+    :param result: Result from ``get_cached_result``
+    :return: Number of variables set
+    '''
+    names = result['var_names'].tolist()
+    values = dict(zip(names, result['var_values'].tolist()))
+    fixed = dict(zip(names, result['var_fixed'].tolist()))
+    loaded = 0
+    for v in m.component_data_objects(Var, descend_into=True):
+        val = values.get(v.name)
+        if val is None:
+            continue
+        if fixed[v.name]:
+            v.fix(val)
+        else:
+            v.set_value(val)
+            v.unfix()
+        loaded += 1
+    if loaded < len(values):
+        _log.warning(f'{len(values) - loaded} variables of the cached result are not in the model')
+    for c in m.component_data_objects(Constraint, descend_into=True):
+        c.activate() if c.name in result['constraints'] else c.deactivate()
+    for o in m.component_objects(Objective, descend_into=True):
+        o.activate() if result['objectives'].get(o.name, False) else o.deactivate()
+    m.fs.results = results = SolverResults()
+    results.solver.status = SolverStatus.ok
+    results.solver.termination_condition = getattr(TerminationCondition, result['termination'])
+    return loaded
+
+
+def set_result_cache(enabled=True, max_bytes=256 * 2 ** 20, max_results=16):
+    '''
+    Turn the result cache on or off and set its size.
+
+    :param enabled: Use the result cache
+    :type enabled: bool
+    :param max_bytes: Maximum size of the results saved in the cache directory [bytes]
+    :type max_bytes: int
+    :param max_results: Maximum number of results held in memory
+    :type max_results: int
+    '''
+    _settings['enabled'] = enabled
+    _settings['max_bytes'] = max_bytes
+    _settings['max_results'] = max_results
+    result_dir = _result_dir()
+    if result_dir is not None and os.path.isdir(result_dir):
+        _evict(result_dir)
+
+
+def clear_results(disk=False):
+    '''
+    Drop all results held in memory.
+
+    :param disk: Also delete the results saved in the cache directory
+    :type disk: bool
+    '''
+    _results.clear()
+    result_dir = _result_dir()
+    if disk and result_dir is not None and os.path.isdir(result_dir):
+        for fname in os.listdir(result_dir):
+            if fname.endswith('.pkl'):
+                os.remove(os.path.join(result_dir, fname))
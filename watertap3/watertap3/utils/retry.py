@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from pyomo.environ import Var
+from watertap3.data import get_cache_dir
+
+from .initialization import initialize_flowsheet
+from .warm_start import warm_start_options
+
+__all__ = ['retry_strategies',
+           'retry_order',
+           'RetryPolicy',
+           'learned_strategy',
+           'clear_learned_strategies']
+
+_log = logging.getLogger(__name__)
+
+# Strategies for solves that end infeasible, at the iteration limit or unbounded.
+# reset: start again from the values the variables had before the first attempt (the warm start or initialization)
+# reinitialize: also pass through the flowsheet sequential-modular style before solving
+# options: ipopt options for the attempt
+retry_strategies = OrderedDict([
+        ('reset_start', {
+                'reset': True,
+                'options': {}
+                }),
+        ('mu_adaptive', {
+                'reset': True,
+                'options': {'mu_strategy': 'adaptive'}
+                }),
+        ('reinitialize', {
+                'reset': True,
+                'reinitialize': True,
+                'options': {'mu_strategy': 'adaptive'}
+                }),
+        ('bound_push', {
+                'reset': True,
+                'options': {'bound_push': 1E-1, 'bound_frac': 1E-1, 'bound_relax_factor': 1E-6}
+                }),
+        ('scale', {
+                'reset': True,
+                'options': {'nlp_scaling_method': 'gradient-based', 'nlp_scaling_max_gradient': 10,
+                            'mu_strategy': 'adaptive'}
+                })
+        ])
+
+# order the strategies are tried in (one per attempt, up to max_attempts)
+retry_order = ['reset_start', 'mu_adaptive', 'reinitialize', 'bound_push', 'scale']
+
+_learned = {}
+_learned_loaded = [False]
+
+
+def _learned_path():
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, 'retry_strategies.json')
+
+
+def _load_learned():
+    if _learned_loaded[0]:
+        return
+    _learned_loaded[0] = True
+    path = _learned_path()
+    if path is None or not os.path.exists(path):
+        return
+    try:
+        with open(path) as f:
+            _learned.update(json.load(f))
+    except (OSError, ValueError) as e:
+        _log.warning(f'Could not read learned retry strategies {path}: {e}')
+
+
+def _save_learned():
+    path = _learned_path()
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(_learned, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _train_key(m):
+    train = getattr(m.fs, 'train', None) or {}
+    return '/'.join(str(train.get(k)) for k in ('case_study', 'reference', 'scenario'))
+
+
+def learned_strategy(m):
+    '''
+    Function to get the retry strategy that last got a treatment train to solve.
+
+    :param m: WaterTAP3 model
+    :return: Strategy name, or None if the train has always solved on the first attempt
+    '''
+    _load_learned()
+    strategy = _learned.get(_train_key(m))
+    return strategy if strategy in retry_strategies else None
+
+
+def clear_learned_strategies(disk=False):
+    '''
+    Forget the strategies learned for all trains.
+
+    :param disk: Also delete the strategies saved in the cache directory
+    :type disk: bool
+    '''
+    _learned.clear()
+    _learned_loaded[0] = not disk
+    path = _learned_path()
+    if disk and path is not None and os.path.exists(path):
+        os.remove(path)
+
+
+class RetryPolicy:
+    '''
+    Retry policy for one ``run_model`` call. Instead of solving again from the point the failed attempt
+    stopped at, each retry uses the next strategy in ``retry_order``: the variables are reset to the start
+    of the first attempt and the strategy's ipopt options are applied (and for 'reinitialize', the
+    flowsheet is initialized again). The strategy that got a train to solve is saved for the train (in
+    memory and, if a cache directory is set, in ``retry_strategies.json`` in it) and applied to the first
+    attempt of later runs of the same train.
+    '''
+
+    def __init__(self, m, solver_name='ipopt', G=None):
+        '''
+        :param m: WaterTAP3 model, ready to solve
+        :param solver_name: Solver name; strategy options are only applied to ipopt
+        :type solver_name: str
+        :param G: Flowsheet graph, for re-initialization
+        '''
+        self.m = m
+        self.G = G
+        self.use_options = solver_name.startswith('ipopt')
+        self.learned = learned_strategy(m)
+        self.strategy = None
+        self._applied = ()
+        self._start = [(v, v.value) for v in m.component_data_objects(Var, descend_into=True) if not v.fixed]
+        self._queue = [name for name in retry_order if name != self.learned]
+
+    def _apply_options(self, solver, name):
+        for option in self._applied:
+            solver.options.pop(option, None)
+        options = retry_strategies[name]['options'] if self.use_options else {}
+        solver.options.update(options)
+        self._applied = tuple(options)
+
+    def start(self, solver):
+        '''
+        Apply the strategy learned for the train to the first attempt.
+
+        :param solver: Solver object
+        '''
+        if self.learned is not None:
+            self.strategy = self.learned
+            self._apply_options(solver, self.learned)
+
+    def has_next(self):
+        return bool(self._queue)
+
+    def next_attempt(self, solver):
+        '''
+        Set up the model and solver for the next retry.
+
+        :param solver: Solver object
+        :return: Name of the strategy for the attempt
+        '''
+        name = self.strategy = self._queue.pop(0)
+        strategy = retry_strategies[name]
+        for option in warm_start_options:
+            solver.options.pop(option, None)
+        if strategy.get('reset'):
+            for v, val in self._start:
+                v.set_value(val)
+        if strategy.get('reinitialize'):
+            initialize_flowsheet(self.m, self.G)
+        self._apply_options(solver, name)
+        _log.debug(f'Retrying {_train_key(self.m)} with strategy {name}')
+        return name
+
+    def finish(self, solver, results):
+        '''
+        Remove the strategy options from the solver and save the strategy for the train if it got the train
+        to solve.
+
+        :param solver: Solver object
+        :param results: Pyomo solver results of the last attempt
+        '''
+        for option in self._applied:
+            solver.options.pop(option, None)
+        self._applied = ()
+        if results.solver.termination_condition != 'optimal' or self.strategy is None:
+            return
+        key = _train_key(self.m)
+        if _learned.get(key) != self.strategy:
+            _learned[key] = self.strategy
+            _save_learned()
@@ -0,0 +1,509 @@
+import copy
+import hashlib
+import json
+import logging
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Var, value
+
+from .costing_kernel import CostingKernel, feedback_parameters
+from .sweep import default_outputs, run_sweep
+
+try:
+    import yaml
+except ImportError:  # specs can still be given as dictionaries or JSON
+    yaml = None
+
+__all__ = ['load_spec',
+           'spec_points',
+           'run_spec',
+           'sensitivity_points',
+           'power_sensitivity_spec',
+           'clear_spec_cache']
+
+_log = logging.getLogger(__name__)
+
+# point keys that are not labels in the results table
+_point_keys = ('settings', 'outputs', 'objective', 'bounds')
+
+# sweep results of each model, kept while the model's fixed variables are unchanged
+_cache = weakref.WeakKeyDictionary()
+
+
+def load_spec(spec):
+    '''
+    Function to load a sensitivity specification.
+
+    A specification is a dictionary (or a YAML or JSON file with one) with a list of sweeps::
+
+        steps: 20                       # steps in each range (default for all sweeps)
+        outputs: {lcow: fs.costing.LCOW}  # outputs recorded at every point, sweep.default_outputs if missing
+        sweeps:
+          - name: wacc                  # 'sens_var' in the results
+            label: WACC 5-10%           # 'scenario_name' in the results
+            set: fs.costing_param.wacc  # component path(s) set at each point
+            mode: offset                # the sweep values are the component values ('value'), multiply the
+                                        # value before the sweep ('factor') or are added to it ('offset')
+            range: [-0.03, 0.02]        # or values: [...], or distribution: {type: normal, mean: .., sd: ..,
+                                        # samples: .., seed: ..} (also uniform, triangular and lognormal)
+          - name: wacc_elect_price
+            grid:                       # every combination of the values of two or more dimensions
+              - {name: wacc, set: fs.costing_param.wacc, range: [0.05, 0.1], steps: 5}
+              - {name: elect_price, set: fs.costing_param.electricity_price, mode: factor, range: [0.7, 1.3]}
+
+    Paths can use ``{source}``, for every source in the flowsheet (set together, paths the source does not have
+    are skipped), and ``{unit}``, for every unit of ``unit_type`` (optionally only ``units``), each unit a sweep
+    of its own. Sweeps (or the whole specification) can also have: ``steps``, ``endpoint`` (include the upper
+    end of ranges, default True), ``scale`` (factor for the reported values), ``norm`` ('ratio' or
+    'difference' to the value before the sweep), ``outputs`` (extra outputs), ``labels`` (extra label
+    columns), ``only`` and ``skip`` (lists of 'case_study', 'scenario', or 'units' that must be in the train),
+    ``setup`` (path: value set at every point of the sweep, None to unfix a variable, True or False to activate
+    or deactivate a constraint), ``bounds`` (name: [lhs path, '<=', rhs path], see ``sweep.add_bounds``,
+    set with the path ``bounds.<name>``) and ``objective`` (solve with the LCOW objective).
+
+    :param spec: Specification or path to a YAML or JSON file
+    :type spec: dict or str
+    :return: Specification
+    :rtype: dict
+    '''
+    if isinstance(spec, dict):
+        return copy.deepcopy(spec)
+    with open(spec) as f:
+        if spec.endswith(('.yml', '.yaml')):
+            if yaml is None:
+                raise ImportError('Loading a YAML sensitivity specification needs PyYAML')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _sweep_values(dim, steps, endpoint):
+    if 'values' in dim:
+        return np.asarray(dim['values'], dtype=float)
+    if 'distribution' in dim:
+        dist = dict(dim['distribution'])
+        rng = np.random.default_rng(dist.pop('seed', None))
+        kind = dist.pop('type', 'uniform')
+        n = dist.pop('samples', steps)
+        if kind == 'normal':
+            samples = rng.normal(dist['mean'], dist['sd'], n)
+        elif kind == 'lognormal':
+            samples = rng.lognormal(dist['mean'], dist['sigma'], n)
+        elif kind == 'triangular':
+            samples = rng.triangular(dist['low'], dist['mode'], dist['high'], n)
+        else:
+            samples = rng.uniform(dist['low'], dist['high'], n)
+        # sorted, so each solve starts from the solution of a nearby point
+        return np.sort(samples)
+    lb, ub = dim['range']
+    steps = dim.get('steps', steps)
+    if dim.get('endpoint', endpoint):
+        return np.linspace(lb, ub, steps + 1)
+    return np.linspace(lb, ub, steps, endpoint=False)
+
+
+def _bound_path(path):
+    return 'fs.sweep_bounds.' + path[len('bounds.'):] if path.startswith('bounds.') else None
+
+
+def _resolve(m, paths, fmt):
+    # component paths (and their values before the sweep) for one unit or all sources
+    if isinstance(paths, str):
+        paths = [paths]
+    resolved = []
+    for path in paths:
+        if '{source}' in path:
+            candidates = [path.format(source=source, **fmt) for source in m.fs.flow_in_dict]
+        else:
+            candidates = [path.format(**fmt)]
+        for candidate in candidates:
+            bound = _bound_path(candidate)
+            if bound is not None:
+                resolved.append((bound, None))
+                continue
+            obj = m.find_component(candidate)
+            if obj is None:
+                continue
+            data = next(iter(obj.values())) if obj.is_indexed() else obj
+            resolved.append((obj.name, value(data)))
+    return resolved
+
+
+def _dimension(m, dim, fmt, steps, endpoint, scale, norm):
+    # (settings, reported value, value before the sweep, normalized value) for every value of the dimension
+    targets = _resolve(m, dim['set'], fmt)
+    if not targets:
+        return []
+    mode = dim.get('mode', 'value')
+    scale = dim.get('scale', scale)
+    norm = dim.get('norm', norm)
+    baseline = sum(base for _, base in targets if base is not None)
+    values = []
+    for x in _sweep_values(dim, steps, endpoint):
+        settings = []
+        for path, base in targets:
+            if mode == 'factor' and base is not None:
+                settings.append((path, base * x))
+            elif mode == 'offset' and base is not None:
+                settings.append((path, base + x))
+            else:
+                settings.append((path, x))
+        if mode == 'value':
+            reported = x
+        else:
+            reported = sum(val for (path, val), (_, base) in zip(settings, targets) if base is not None)
+        normalized = reported - baseline if norm == 'difference' else reported / baseline if baseline else np.nan
+        values.append((settings, reported * scale, baseline, normalized))
+    return values
+
+
+def _serpentine(dims):
+    # grid order where consecutive points differ in one dimension only
+    if len(dims) == 1:
+        return [(v,) for v in dims[0]]
+    rows = []
+    for i, v in enumerate(dims[0]):
+        rest = _serpentine(dims[1:])
+        rows.extend((v, *r) for r in (rest if i % 2 == 0 else rest[::-1]))
+    return rows
+
+
+def _applies(m, sweep, context):
+    only = sweep.get('only', {})
+    skip = sweep.get('skip', {})
+    for key in ('case_study', 'scenario'):
+        if key in only and context[key] not in only[key]:
+            return False
+        if key in skip and context[key] in skip[key]:
+            return False
+    if any(unit not in m.fs.pfd_dict for unit in only.get('units', ())):
+        return False
+    return True
+
+
+def _unit_formats(m, sweep):
+    if 'unit_type' not in sweep:
+        return [{}]
+    names = sweep.get('units')
+    return [{'unit': key} for key in m.fs.pfd_dict
+            if m.fs.pfd_dict[key]['Unit'] == sweep['unit_type'] and (names is None or key in names)]
+
+
+def spec_points(m, spec, scenario=None):
+    '''
+    Function to get the sweep points of a sensitivity specification for a solved treatment train.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param spec: Specification, see ``load_spec``
+    :param scenario: Scenario name used for 'only' and 'skip' (the train's scenario if None)
+    :type scenario: str
+    :return: Sweep points for ``run_sweep``, labelled with 'sens_var', 'scenario_name', 'scenario_value',
+        'baseline_sens_value' and 'sens_var_norm' (and, for grids, the value of each dimension)
+    '''
+    spec = load_spec(spec)
+    context = {'case_study': m.fs.train['case_study'],
+               'scenario': scenario if scenario is not None else m.fs.train['scenario']}
+    points = []
+    for sweep in spec['sweeps']:
+        if not _applies(m, sweep, context):
+            continue
+        steps = sweep.get('steps', spec.get('steps', 20))
+        endpoint = sweep.get('endpoint', spec.get('endpoint', True))
+        scale = sweep.get('scale', 1)
+        norm = sweep.get('norm', 'ratio')
+        objective = sweep.get('objective', spec.get('objective', False))
+        bounds = {**spec.get('bounds', {}), **sweep.get('bounds', {})}
+        for fmt in _unit_formats(m, sweep):
+            setup = [(path.format(**fmt), val) for path, val in {**spec.get('setup', {}),
+                                                                  **sweep.get('setup', {})}.items()]
+            setup += [(f'fs.sweep_bounds.{name}_constr', True) for name in bounds]
+            outputs = {name: path.format(**fmt) for name, path in sweep.get('outputs', {}).items()}
+            dims = sweep.get('grid', [sweep])
+            dim_values = [_dimension(m, dim, fmt, dim.get('steps', steps), endpoint, scale, norm) for dim in dims]
+            if any(not values for values in dim_values):
+                _log.info(f"Skipping sensitivity sweep {sweep['name']}: no components to set")
+                continue
+            name = sweep['name'].format(**fmt)
+            label = sweep.get('label', sweep['name']).format(**fmt)
+            for combo in _serpentine(dim_values):
+                settings = list(setup)
+                for dim_settings, _, _, _ in combo:
+                    settings.extend(dim_settings)
+                point = {'sens_var': name, 'scenario_name': label}
+                if len(combo) == 1:
+                    _, point['scenario_value'], point['baseline_sens_value'], point['sens_var_norm'] = combo[0]
+                else:
+                    point['scenario_value'] = tuple(c[1] for c in combo)
+                    point['baseline_sens_value'] = tuple(c[2] for c in combo)
+                    point['sens_var_norm'] = tuple(c[3] for c in combo)
+                    for dim, c in zip(dims, combo):
+                        point[dim['name']] = c[1]
+                point.update(sweep.get('labels', {}))
+                point.update({'settings': settings, 'outputs': outputs, 'objective': objective, 'bounds': bounds})
+                points.append(point)
+    return points
+
+
+def _fingerprint(m):
+    # results are only reused while the values of the fixed variables are the same
+    h = hashlib.sha1()
+    for v in m.component_data_objects(Var, descend_into=True):
+        if v.fixed:
+            h.update(f'{v.name}={v.value};'.encode())
+    return h.hexdigest()
+
+
+def _point_key(point, outputs, solver):
+    return repr((solver, point['objective'], tuple(point['settings']), sorted({**outputs, **point['outputs']}.items()),
+                 sorted((k, tuple(b)) for k, b in point['bounds'].items())))
+
+
+def _evaluate_points(m, points, keys, outputs, results):
+    # points that only set financial parameters get the costing evaluated on the solved model (see
+    # costing_kernel), grouped by the parameters they set
+    groups = {}
+    for key, point in zip(keys, points):
+        settings = point['settings']
+        if key in results or point['objective'] or point['bounds']:
+            continue
+        if any(val is None or isinstance(val, bool) for _, val in settings):
+            continue
+        group_key = (tuple(path for path, _ in settings), tuple(sorted(point['outputs'].items())))
+        groups.setdefault(group_key, {})[key] = point
+    if not groups:
+        return {}
+    feedback = set(feedback_parameters(m, sorted(set(path for paths, _ in groups for path in paths))))
+    evaluated = {}
+    for (paths, extra), group in groups.items():
+        if feedback.intersection(paths):
+            continue
+        try:
+            kernel = CostingKernel(m, paths, {**outputs, **dict(extra)})
+        except NotImplementedError as e:
+            _log.info(f'Solving instead of evaluating the costing: {e}')
+            continue
+        start = time.perf_counter()
+        df = kernel.evaluate([[val for _, val in point['settings']] for point in group.values()])
+        elapsed = (time.perf_counter() - start) / len(group)
+        for key, row in zip(group, df.to_dict('records')):
+            evaluated[key] = {'termination': 'optimal', 'solve_time': elapsed, **row, 'evaluated': True}
+    return evaluated
+
+
+def run_spec(m, spec, scenario=None, processes=1, solver='ipopt', use_cache=True, evaluate_costing=True):
+    '''
+    Function to run a sensitivity specification on a solved treatment train.
+
+    All points of all sweeps are solved in one batch with ``run_sweep`` (one batch per objective setting), in
+    the order of the specification so each solve starts from a nearby point. Points that set the same values
+    are solved once, and with ``use_cache`` the results of points solved optimally are kept for the model and
+    reused while its fixed variables have the same values. With ``evaluate_costing``, points without the
+    objective that only set parameters outside the constraints (WACC, plant lifetime, electricity price, ...)
+    are not solved: their costing is evaluated on the solved model with a ``CostingKernel``.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param spec: Specification, see ``load_spec``
+    :param scenario: Scenario name used for 'only' and 'skip' (the train's scenario if None)
+    :type scenario: str
+    :param processes: Number of processes (1 solves the points on ``m``)
+    :type processes: int
+    :param solver: Solver name
+    :type solver: str
+    :param use_cache: Reuse the results of points solved before
+    :type use_cache: bool
+    :param evaluate_costing: Evaluate the costing instead of solving points that only set financial parameters
+    :type evaluate_costing: bool
+    :return: Results table, one row per point, with the point labels, 'termination', 'solve_time', the outputs,
+        'evaluated' and 'cached'
+    :rtype: DataFrame
+    '''
+    spec = load_spec(spec)
+    outputs = spec.get('outputs', default_outputs)
+    points = spec_points(m, spec, scenario=scenario)
+
+    cache = _cache.setdefault(m, {})
+    fingerprint = _fingerprint(m)
+    if cache.get('fingerprint') != fingerprint:
+        cache.clear()
+        cache['fingerprint'] = fingerprint
+        cache['results'] = {}
+    stored = cache['results'] if use_cache else {}
+
+    keys = [_point_key(point, outputs, solver) for point in points]
+    results = {key: stored[key] for key in set(keys) if key in stored}
+    cached = set(results)
+    if evaluate_costing:
+        evaluated = _evaluate_points(m, points, keys, outputs, results)
+        results.update(evaluated)
+        if use_cache:
+            stored.update(evaluated)
+    for objective in (False, True):
+        batch = {}
+        bounds = {}
+        for key, point in zip(keys, points):
+            if point['objective'] == objective and key not in results and key not in batch:
+                batch[key] = {'settings': point['settings'], 'outputs': point['outputs']}
+                bounds.update(point['bounds'])
+        if not batch:
+            continue
+        df = run_sweep(m, list(batch.values()), outputs=outputs, processes=processes, solver=solver,
+                       objective=objective, bounds=bounds)
+        for key, row in zip(batch, df.to_dict('records')):
+            results[key] = {name: val for name, val in row.items() if name not in ('settings', 'outputs')}
+            results[key]['evaluated'] = False
+            if use_cache and row['termination'] == 'optimal':
+                stored[key] = results[key]
+
+    if not points:
+        return pd.DataFrame(columns=['sens_var', 'scenario_name', 'scenario_value', 'baseline_sens_value',
+                                     'sens_var_norm', 'termination', 'solve_time', *outputs, 'evaluated',
+                                     'cached'])
+    rows = []
+    for key, point in zip(keys, points):
+        row = {name: val for name, val in point.items() if name not in _point_keys}
+        row.update(results[key])
+        row['cached'] = key in cached
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def clear_spec_cache(m=None):
+    '''
+    Drop the sweep results kept by ``run_spec``.
+
+    :param m: Only drop the results of this model
+    '''
+    if m is None:
+        _cache.clear()
+    else:
+        _cache.pop(m, None)
+
+
+def default_sensitivity_spec(runs_per_scenario=20, ro_list=None, tds_only=False):
+    '''
+    Specification of the sensitivity analysis of ``run_sensitivity``.
+
+    :param runs_per_scenario: Number of steps in each sweep
+    :type runs_per_scenario: int
+    :param ro_list: Names of the RO units to sweep
+    :type ro_list: list
+    :param tds_only: Only the inlet TDS sweep, recording the costing totals
+    :type tds_only: bool
+    :return: Specification
+    :rtype: dict
+    '''
+    if ro_list is None:
+        ro_list = ['reverse_osmosis', 'ro_first_pass', 'ro_a1', 'ro_b1', 'ro_active', 'ro_restore', 'ro_first_stage']
+    tds_in = {
+            'name': 'tds_in',
+            'label': 'Inlet TDS +-25%',
+            'set': 'fs.{source}.conc_mass_in[0,tds]',
+            'mode': 'factor',
+            'range': [0.75, 1.25]
+            }
+    if tds_only:
+        return {
+                'steps': runs_per_scenario,
+                'outputs': {
+                        'lcow': 'fs.costing.LCOW',
+                        'tci_total': 'fs.costing.capital_investment_total',
+                        'op_total': 'fs.costing.operating_cost_total',
+                        'op_annual': 'fs.costing.operating_cost_annual',
+                        'fixed_op_annual': 'fs.costing.fixed_op_cost_annual',
+                        'other_annual': 'fs.costing.other_var_cost_annual',
+                        'elect_cost_annual': 'fs.costing.electricity_cost_annual',
+                        'elect_intens': 'fs.costing.electricity_intensity',
+                        'catchem_annual': 'fs.costing.cat_and_chem_cost_annual'
+                        },
+                'sweeps': [tds_in]
+                }
+    ro_outputs = {
+            'ro_pressure': 'fs.{unit}.feed.pressure[0]',
+            'ro_area': 'fs.{unit}.membrane_area[0]',
+            'mem_replacement': 'fs.{unit}.factor_membrane_replacement[0]'
+            }
+    ro_skip = {'scenario': ['edr_ph_ro', 'ro_and_mf'], 'case_study': ['cherokee', 'gila_river', 'upw']}
+    return {
+            'steps': runs_per_scenario,
+            'sweeps': [
+                    {'name': 'plant_cap', 'label': 'Plant Capacity Utilization 70-100%',
+                     'set': 'fs.costing_param.plant_cap_utilization', 'range': [0.7, 1], 'scale': 100},
+                    {'name': 'wacc', 'label': 'Weighted Average Cost of Capital 5-10%',
+                     'set': 'fs.costing_param.wacc', 'mode': 'offset', 'range': [-0.03, 0.02], 'scale': 100},
+                    tds_in,
+                    {'name': 'flow_in', 'label': 'Inlet Flow +-25%',
+                     'set': 'fs.{source}.flow_vol_in[0]', 'mode': 'factor', 'range': [0.75, 1.25],
+                     'skip': {'scenario': ['edr_ph_ro', 'ro_and_mf'], 'case_study': ['cherokee', 'gila_river']}},
+                    {'name': 'plant_life', 'label': 'Plant Lifetime 15-45 yrs',
+                     'set': 'fs.costing_param.plant_lifetime_yrs', 'range': [15, 45], 'norm': 'difference'},
+                    {'name': 'elect_price', 'label': 'Electricity Price +- 30%',
+                     'set': 'fs.costing_param.electricity_price', 'mode': 'factor', 'range': [0.7, 1.3]},
+                    {'name': 'dwi_inj_pressure', 'label': 'Injection Pressure LH 100-2000 ft',
+                     'unit_type': 'deep_well_injection', 'set': 'fs.{unit}.lift_height', 'range': [100, 3500]},
+                    {'name': '{unit}_membrane_area', 'unit_type': 'reverse_osmosis', 'units': ro_list,
+                     'set': 'fs.{unit}.membrane_area', 'mode': 'factor', 'range': [0.8, 1.2], 'skip': ro_skip,
+                     'outputs': ro_outputs, 'labels': {'ro_scenario': 'membrane_area'}},
+                    {'name': '{unit}_pressure', 'unit_type': 'reverse_osmosis', 'units': ro_list,
+                     'set': 'fs.{unit}.feed.pressure', 'mode': 'factor', 'range': [0.85, 1.15], 'skip': ro_skip,
+                     'outputs': ro_outputs, 'labels': {'ro_scenario': 'pressure'}},
+                    {'name': '{unit}_factor_membrane_replacement', 'unit_type': 'reverse_osmosis', 'units': ro_list,
+                     'set': 'fs.{unit}.factor_membrane_replacement', 'mode': 'offset', 'range': [-0.1, 0.3],
+                     'skip': ro_skip, 'outputs': ro_outputs, 'labels': {'ro_scenario': 'factor_membrane_replacement'}},
+                    {'name': 'component_replacement', 'label': 'Component Replacement Costs -75%',
+                     'set': 'fs.costing_param.maintenance_costs_percent_FCI', 'mode': 'factor', 'range': [0.1, 1]},
+                    {'name': 'alum_dose', 'label': 'Alum Dose 0.5-20 mg/L', 'only': {'case_study': ['monterey_one']},
+                     'set': 'fs.coag_and_floc.alum_dose', 'range': [0.0005, 0.020]}
+                    ]
+            }
+
+
+def sensitivity_points(m, runs_per_scenario=20, scenario=None, ro_list=None):
+    '''
+    Sweep points of the sensitivity analysis of ``run_sensitivity`` (see ``default_sensitivity_spec``).
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param runs_per_scenario: Number of steps in each sweep
+    :type runs_per_scenario: int
+    :param scenario: Scenario name of the train
+    :type scenario: str
+    :param ro_list: Names of the RO units to sweep
+    :type ro_list: list
+    :return: Sweep points for ``run_sweep``
+    '''
+    return spec_points(m, default_sensitivity_spec(runs_per_scenario, ro_list), scenario=scenario)
+
+
+def power_sensitivity_spec():
+    '''
+    Specification of the evaporation pond area sweeps of ``run_sensitivity_power``: the RO recovery is bounded
+    at each point and the train is solved with the LCOW objective, with the evaporation pond area and RO
+    pressure and membrane area free.
+
+    :return: Specification
+    :rtype: dict
+    '''
+    outputs = {**default_outputs, 'area': 'fs.evaporation_pond.area[0]'}
+    return {
+            'outputs': outputs,
+            'objective': True,
+            'sweeps': [
+                    {'name': 'evap_pond_area', 'label': 'Area',
+                     'only': {'case_study': ['cherokee'], 'scenario': ['zld_ct'], 'units': ['reverse_osmosis_a']},
+                     'setup': {'fs.evaporation_pond.water_recovery': 0.9, 'fs.evaporation_pond.area': None,
+                               'fs.reverse_osmosis_a.feed.pressure': None,
+                               'fs.reverse_osmosis_a.membrane_area': None},
+                     'bounds': {'ro_recovery': ['fs.reverse_osmosis_a.flow_vol_out[0]', '<=',
+                                                'fs.reverse_osmosis_a.flow_vol_in[0]']},
+                     'set': 'bounds.ro_recovery', 'range': [0.45, 0.96], 'steps': 50, 'endpoint': False},
+                    {'name': 'evap_pond_area', 'label': 'Area',
+                     'only': {'case_study': ['gila_river'], 'scenario': ['baseline'], 'units': ['reverse_osmosis']},
+                     'setup': {'fs.evaporation_pond.water_recovery': 0.9, 'fs.evaporation_pond.area': None,
+                               'fs.reverse_osmosis.feed.pressure': None, 'fs.reverse_osmosis.membrane_area': None},
+                     'bounds': {'ro_recovery': ['fs.reverse_osmosis.flow_vol_out[0]', '<=',
+                                                'fs.reverse_osmosis.flow_vol_in[0]']},
+                     'set': ['bounds.ro_recovery', 'fs.brine_concentrator.water_recovery'],
+                     'range': [0.45, 0.90], 'steps': 50, 'endpoint': False}
+                    ]
+            }
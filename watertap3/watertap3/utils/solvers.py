@@ -0,0 +1,246 @@
+import logging
+import time
+import weakref
+
+from pyomo.environ import Objective, SolverFactory, Suffix
+from pyomo.network import Arc
+from pyomo.opt import SolverResults, SolverStatus, TerminationCondition
+
+try:
+    from pyomo.contrib.appsi.base import LegacySolverInterface
+except ImportError:  # Pyomo without APPSI
+    LegacySolverInterface = None
+
+__all__ = ['persistent_solvers',
+           'get_solver',
+           'is_persistent',
+           'solve_model',
+           'persistent_state',
+           'release_solver',
+           'reset_degrees_of_freedom',
+           'has_active_arcs',
+           'InProcessIpopt']
+
+_log = logging.getLogger(__name__)
+
+# persistent interface used for each solver with persistent=True
+persistent_solvers = {
+        'ipopt': 'appsi_ipopt'
+        }
+
+_persistent = weakref.WeakKeyDictionary()
+
+
+def persistent_state(m):
+    '''
+    State kept between persistent solves of a model: the solver, the flowsheet graph and the degrees of
+    freedom. Dropped when the model is garbage collected or ``release_solver`` is called.
+
+    :param m: WaterTAP3 model
+    :return: Dictionary
+    '''
+    state = _persistent.get(m)
+    if state is None:
+        state = _persistent[m] = {}
+    return state
+
+
+def release_solver(m):
+    '''
+    Drop the persistent solver and cached state for a model, so the next persistent solve starts over.
+
+    :param m: WaterTAP3 model
+    '''
+    _persistent.pop(m, None)
+
+
+def reset_degrees_of_freedom(m):
+    '''
+    Drop the degrees of freedom kept for persistent solves of a model, so they are counted again on the next
+    solve. Call after fixing or unfixing variables or (de)activating constraints between persistent solves.
+
+    :param m: WaterTAP3 model
+    '''
+    state = _persistent.get(m)
+    if state is not None:
+        state.pop('dof', None)
+
+
+def is_persistent(solver):
+    '''
+    :param solver: Solver object
+    :return: True if the solver keeps the model between solves (an APPSI solver)
+    '''
+    return LegacySolverInterface is not None and isinstance(solver, LegacySolverInterface)
+
+
+def _persistent_solver(solver_name):
+    name = persistent_solvers.get(solver_name)
+    if name is None:
+        return None
+    try:
+        solver = SolverFactory(name)
+        if is_persistent(solver) and solver.available(exception_flag=False):
+            return solver
+    except Exception as e:
+        _log.debug(f'{name} not usable: {e}')
+    return None
+
+
+def get_solver(m, solver='ipopt', persistent=False):
+    '''
+    Function to get the solver for a model.
+
+    With ``persistent=True`` the same solver object is used for every solve of the model. For solvers with
+    a persistent interface in ``persistent_solvers`` (APPSI), the model is compiled once and only changed
+    fixed values, bounds and components are pushed to the solver on the next solve, so a sweep does not write
+    the whole problem again for every point. If the interface is not available (e.g. Pyomo without APPSI or
+    without its compiled extensions), the regular solver is used and reused.
+
+    :param m: WaterTAP3 model
+    :param solver: Solver name
+    :type solver: str
+    :param persistent: Reuse the solver between solves of this model
+    :type persistent: bool
+    :return: Solver object
+    '''
+    if not persistent:
+        return SolverFactory(solver)
+    state = persistent_state(m)
+    if state.get('solver_name') != solver:
+        opt = _persistent_solver(solver)
+        if opt is None:
+            _log.info(f'No persistent interface for {solver}, reusing the regular solver')
+            opt = SolverFactory(solver)
+        state['solver_name'] = solver
+        state['solver'] = opt
+    return state['solver']
+
+
+def solve_model(m, solver, tee=False):
+    '''
+    Solve a model and load the solution. APPSI solvers only load feasible solutions, so results that are not
+    optimal are returned without changing the model.
+
+    :param m: WaterTAP3 model
+    :param solver: Solver object from ``get_solver``
+    :param tee: Print the solver output
+    :type tee: bool
+    :return: Pyomo solver results
+    '''
+    if not is_persistent(solver):
+        return solver.solve(m, tee=tee)
+    results = solver.solve(m, tee=tee, load_solutions=False)
+    if results.solver.termination_condition == 'optimal':
+        solver.load_vars()
+    return results
+
+
+def has_active_arcs(m):
+    '''
+    :param m: WaterTAP3 model
+    :return: True if the model has arcs that ``network.expand_arcs`` has not expanded yet
+    '''
+    for _ in m.component_data_objects(Arc, active=True, descend_into=True):
+        return True
+    return False
+
+
+# ipopt ApplicationReturnStatus -> Pyomo termination condition
+_ipopt_status = {
+        0: TerminationCondition.optimal,
+        1: TerminationCondition.optimal,
+        2: TerminationCondition.infeasible,
+        4: TerminationCondition.unbounded,
+        5: TerminationCondition.userInterrupt,
+        6: TerminationCondition.feasible,
+        -1: TerminationCondition.maxIterations,
+        -4: TerminationCondition.maxTimeLimit,
+        -10: TerminationCondition.invalidProblem
+        }
+
+
+@SolverFactory.register('ipopt_inproc', doc='ipopt run in the Python process through PyNumero (ASL) and cyipopt')
+class InProcessIpopt:
+    '''
+    ipopt run in the Python process. The model is compiled with PyNumero's ASL interface and solved with
+    cyipopt, so there is no ipopt process to start and no .sol file to read back. Solving returns the same
+    results structure as ``SolverFactory('ipopt')`` and loads the final point (and, if the model has the
+    suffixes, constraint duals and bound multipliers) into the model. Select it with
+    ``run_model(solver='ipopt_inproc')``; needs the PyNumero extensions and cyipopt.
+    '''
+
+    def __init__(self, **kwds):
+        self.options = dict(kwds.pop('options', {}))
+
+    def available(self, exception_flag=False):
+        '''
+        :param exception_flag: Raise an error if the solver is not available
+        :type exception_flag: bool
+        :return: True if PyNumero's ASL interface and cyipopt can be loaded
+        '''
+        try:
+            from pyomo.contrib.pynumero.asl import AmplInterface
+            from pyomo.contrib.pynumero.interfaces import cyipopt_interface
+            ok = AmplInterface.available() and getattr(cyipopt_interface, 'cyipopt_available', True)
+        except ImportError:
+            ok = False
+        if not ok and exception_flag:
+            raise RuntimeError('ipopt_inproc needs the PyNumero ASL extensions and cyipopt')
+        return ok
+
+    def solve(self, m, tee=False, **kwds):
+        '''
+        :param m: WaterTAP3 model
+        :param tee: Print the ipopt output
+        :type tee: bool
+        :return: Pyomo solver results
+        '''
+        from pyomo.contrib.pynumero.algorithms.solvers.cyipopt_solver import CyIpoptSolver
+        from pyomo.contrib.pynumero.interfaces.cyipopt_interface import CyIpoptNLP
+        from pyomo.contrib.pynumero.interfaces.pyomo_nlp import PyomoNLP
+
+        start = time.perf_counter()
+        # PyNumero needs an objective, sweeps solve the square problem without one
+        objective = next(m.component_data_objects(Objective, active=True, descend_into=True), None)
+        if objective is None:
+            m._inproc_objective = Objective(expr=0.0)
+        try:
+            nlp = PyomoNLP(m)
+        finally:
+            if objective is None:
+                m.del_component(m._inproc_objective)
+        problem = CyIpoptNLP(nlp)
+        options = dict(self.options)
+        options.update(kwds.get('options') or {})
+        interface_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        x, info = CyIpoptSolver(problem, options=options).solve(tee=tee)
+        solver_time = time.perf_counter() - start
+
+        variables = nlp.get_pyomo_variables()
+        for v, val in zip(variables, x):
+            v.set_value(float(val))
+        suffixes = {s.local_name: s for s in m.component_objects(Suffix, descend_into=False) if s.import_enabled()}
+        if 'dual' in suffixes:
+            suffixes['dual'].update(zip(nlp.get_pyomo_constraints(), info['mult_g'].tolist()))
+        if 'ipopt_zL_out' in suffixes:
+            suffixes['ipopt_zL_out'].update(zip(variables, info['mult_x_L'].tolist()))
+        if 'ipopt_zU_out' in suffixes:
+            suffixes['ipopt_zU_out'].update(zip(variables, info['mult_x_U'].tolist()))
+
+        results = SolverResults()
+        results.problem.name = m.name
+        results.problem.number_of_constraints = nlp.n_constraints()
+        results.problem.number_of_variables = nlp.n_primals()
+        results.solver.name = 'ipopt_inproc'
+        results.solver.return_code = info['status']
+        message = info['status_msg']
+        results.solver.message = message.decode() if isinstance(message, bytes) else message
+        results.solver.termination_condition = _ipopt_status.get(info['status'], TerminationCondition.error)
+        results.solver.status = (SolverStatus.ok if results.solver.termination_condition == TerminationCondition.optimal
+                                 else SolverStatus.warning)
+        results.solver.wallclock_time = solver_time
+        _log.debug(f'ipopt_inproc: {interface_time:.3f} s to compile the model, {solver_time:.3f} s in ipopt')
+        return results
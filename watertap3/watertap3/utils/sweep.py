@@ -0,0 +1,323 @@
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Block, Constraint, Param, Var, value
+
+from .coefficient_store import save_coefficients
+from .solvers import reset_degrees_of_freedom
+
+__all__ = ['default_outputs',
+           'run_sweep',
+           'build_args',
+           'add_bounds',
+           'remove_bounds',
+           'get_component']
+
+_log = logging.getLogger(__name__)
+
+# outputs recorded for every sweep point (name: component path on the model)
+default_outputs = {
+        'lcow': 'fs.costing.LCOW',
+        'water_recovery': 'fs.costing.system_recovery',
+        'treated_water': 'fs.costing.treated_water',
+        'elec_lcow': 'fs.costing.elec_frac_LCOW',
+        'elec_int': 'fs.costing.electricity_intensity'
+        }
+
+# model for the sweep points solved in this process
+_worker = {}
+
+
+def build_args(m):
+    '''
+    Arguments to build and solve the treatment train of a model again in another process: the
+    ``watertap_setup`` arguments, the unit table (for trains that are not in the treatment train table)
+    and the ``run_watertap3`` arguments the model was solved with.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :return: Dictionary
+    '''
+    train = m.fs.train
+    source = m.fs.source_water
+    return {
+            'setup': {
+                    'case_study': train['case_study'],
+                    'reference': train['reference'],
+                    'scenario': train['scenario'],
+                    'source_case_study': source['case_study'],
+                    'source_reference': source['reference'],
+                    'source_scenario': source['scenario'],
+                    'prune_constituents': getattr(m.fs, 'prune_constituents', False),
+                    'keep_constituents': getattr(m.fs, 'keep_constituents', None)
+                    },
+            'df_units': m.fs.df_units.copy() if getattr(m.fs, 'new_case_study', False) else None,
+            'run': dict(getattr(m.fs, 'run_args', {}))
+            }
+
+
+def _build_model(args):
+    from .case_study_trains import get_case_study
+    from .watertap import run_watertap3, watertap_setup
+    m = watertap_setup(**args['setup'])
+    m = get_case_study(m=m, new_df_units=args['df_units'])
+    return run_watertap3(m, **args['run'])
+
+
+def _init_worker(args, solver, outputs, objective=False, bounds=None):
+    # with fork the model is already in _worker; otherwise each process builds and solves the train once
+    if args is not None:
+        _worker['model'] = _build_model(args)
+        add_bounds(_worker['model'], bounds)
+    _worker['solver'] = solver
+    _worker['outputs'] = outputs
+    _worker['objective'] = objective
+    _worker['stash'] = {}
+    # pool processes exit without running atexit, so curves fit building the train are written now
+    save_coefficients()
+
+
+def get_component(m, path):
+    '''
+    Function to get a model component, or an expression the costing keeps as a plain attribute (e.g.
+    'fs.costing.treated_water'), from its path.
+
+    :param m: WaterTAP3 model
+    :param path: Component path
+    :type path: str
+    :return: Component or expression
+    '''
+    obj = m.find_component(path)
+    if obj is None:
+        obj = m
+        for name in path.split('.'):
+            obj = getattr(obj, name)
+    return obj
+
+
+def add_bounds(m, bounds):
+    '''
+    Add sweep bounds to a model: for each bound (name: (lhs path, sense, rhs path)), a fixed variable
+    ``fs.sweep_bounds.<name>`` and a deactivated constraint ``fs.sweep_bounds.<name>_constr``,
+    lhs <= (or >=, ==) <name> * rhs. Sweep points set the variable and activate the constraint.
+
+    :param m: WaterTAP3 model
+    :param bounds: Bounds
+    :type bounds: dict
+    '''
+    if not bounds:
+        return
+    m.fs.sweep_bounds = b = Block()
+    for name, (lhs, sense, rhs) in bounds.items():
+        lhs = get_component(m, lhs)
+        rhs = get_component(m, rhs)
+        setattr(b, name, Var(initialize=1))
+        ratio = getattr(b, name)
+        ratio.fix()
+        if sense == '<=':
+            c = Constraint(expr=lhs <= ratio * rhs)
+        elif sense == '>=':
+            c = Constraint(expr=lhs >= ratio * rhs)
+        else:
+            c = Constraint(expr=lhs == ratio * rhs)
+        setattr(b, name + '_constr', c)
+        c.deactivate()
+
+
+def remove_bounds(m):
+    '''
+    Remove the bounds added with ``add_bounds``.
+
+    :param m: WaterTAP3 model
+    '''
+    if hasattr(m.fs, 'sweep_bounds'):
+        m.fs.del_component(m.fs.sweep_bounds)
+
+
+def _datas(obj):
+    return list(obj.values()) if obj.is_indexed() else [obj]
+
+
+def _snapshot(obj):
+    # state to put a component back to: value and fixed for variables, value for parameters, active for constraints
+    if obj.ctype is Constraint:
+        return [(c, c.active) for c in _datas(obj)]
+    if obj.ctype is Param:
+        return [(p, p.value) for p in _datas(obj)]
+    return [(v, (v.value, v.fixed)) for v in _datas(obj)]
+
+
+def _set(obj, val):
+    # variables are fixed at the value (or unfixed if None), parameters set, constraints (de)activated
+    if obj.ctype is Constraint:
+        obj.activate() if val else obj.deactivate()
+    elif obj.ctype is Param:
+        obj.set_value(val) if not obj.is_indexed() else [p.set_value(val) for p in obj.values()]
+    elif val is None:
+        obj.unfix()
+    else:
+        obj.fix(val)
+
+
+def _status(obj):
+    # fixed variables and active constraints, which set the degrees of freedom
+    if obj.ctype is Constraint:
+        return [c.active for c in _datas(obj)]
+    if obj.ctype is Param:
+        return []
+    return [v.fixed for v in _datas(obj)]
+
+
+def _restore(m, stash, keep=()):
+    for path in list(stash):
+        if path in keep:
+            continue
+        for data, state in stash.pop(path):
+            if data.ctype is Constraint:
+                data.activate() if state else data.deactivate()
+            elif data.ctype is Param:
+                data.set_value(state)
+            else:
+                data.set_value(state[0])
+                data.fix() if state[1] else data.unfix()
+
+
+def _solve_points(chunk):
+    from .watertap import run_model_no_print
+    m = _worker['model']
+    stash = _worker['stash']
+    rows = []
+    for row, point in chunk:
+        settings = point['settings']
+        paths = set(path for path, _ in settings).union(stash)
+        before = {path: _status(m.find_component(path)) for path in paths}
+        # components set by earlier points and not by this one go back to their values before the sweep
+        _restore(m, stash, keep=set(path for path, _ in settings))
+        for path, val in settings:
+            obj = m.find_component(path)
+            if path not in stash:
+                stash[path] = _snapshot(obj)
+            _set(obj, val)
+        if any(_status(m.find_component(path)) != status for path, status in before.items()):
+            reset_degrees_of_freedom(m)
+        start = time.perf_counter()
+        run_model_no_print(m=m, solver=_worker['solver'], objective=_worker['objective'], persistent=True)
+        outputs = {'termination': str(m.fs.results.solver.termination_condition),
+                   'solve_time': time.perf_counter() - start}
+        for name, path in {**_worker['outputs'], **point.get('outputs', {})}.items():
+            outputs[name] = value(get_component(m, path))
+        rows.append((row, outputs))
+    save_coefficients()
+    return rows
+
+
+def _chunks(points, size):
+    indexed = list(enumerate(points))
+    return [indexed[i:i + size] for i in range(0, len(indexed), size)]
+
+
+def run_sweep(m, points, outputs=None, processes=None, solver='ipopt', chunk_size=None, start_method=None,
+              callback=None, objective=False, bounds=None):
+    '''
+    Function to solve a treatment train at many sweep points, in parallel.
+
+    Each point sets model components to new values and is solved with the rest of the model as it is: variables
+    are fixed at the value (or unfixed for None), mutable parameters are set and constraints are activated
+    (True) or deactivated (False). Components a point does not set are as they were before the sweep. The points are split, in order, into
+    chunks that are handed to a pool of processes. Each process has its own copy of the solved model (inherited
+    when processes are forked, otherwise the train is built and solved once per process, see ``build_args``)
+    and solves its chunks point after point, so every solve starts from the solution of a nearby point. Results
+    are written into a table allocated up front as the chunks come back.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param points: Sweep points. Each point is a dictionary with 'settings', a list of (component path, value)
+        pairs (e.g. ('fs.costing_param.wacc', 0.06)); optionally 'outputs', extra outputs for the point
+        ({name: component path}); any other keys are labels copied to the results table.
+    :type points: list
+    :param outputs: Outputs to record for every point ({name: component path}), ``default_outputs`` if None
+    :type outputs: dict
+    :param processes: Number of processes (all cores if None). With 1, points are solved in this process on
+        ``m`` itself and ``m`` is put back to its values before the sweep (but not re-solved) at the end.
+    :type processes: int
+    :param solver: Solver name
+    :type solver: str
+    :param chunk_size: Points per chunk (a quarter of the points per process if None)
+    :type chunk_size: int
+    :param start_method: Multiprocessing start method ('fork' where available if None)
+    :type start_method: str
+    :param callback: Function called with (row, outputs) as each point's results come back
+    :param objective: Solve each point with the LCOW objective (for points that free design variables)
+    :type objective: bool
+    :param bounds: Bounds to add to the model(s) for the sweep, see ``add_bounds``
+    :type bounds: dict
+    :return: Results table, one row per point
+    :rtype: DataFrame
+    '''
+    if outputs is None:
+        outputs = default_outputs
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(points)))
+    if chunk_size is None:
+        chunk_size = max(1, int(np.ceil(len(points) / (processes * 4))))
+
+    labels = []
+    for point in points:
+        for key in point:
+            if key not in ('settings', 'outputs') and key not in labels:
+                labels.append(key)
+    output_names = ['termination', 'solve_time', *outputs]
+    for point in points:
+        for name in point.get('outputs', {}):
+            if name not in output_names:
+                output_names.append(name)
+    df = pd.DataFrame({key: [point.get(key) for point in points] for key in labels}, index=range(len(points)))
+    for name in output_names:
+        df[name] = None if name == 'termination' else np.nan
+
+    def collect(rows):
+        for row, result in rows:
+            for name, val in result.items():
+                df.at[row, name] = val
+            if callback is not None:
+                callback(row, result)
+
+    chunks = _chunks(points, chunk_size)
+    if processes == 1:
+        _worker['model'] = m
+        _init_worker(None, solver, outputs, objective)
+        add_bounds(m, bounds)
+        try:
+            for chunk in chunks:
+                collect(_solve_points(chunk))
+        finally:
+            _restore(m, _worker['stash'])
+            reset_degrees_of_freedom(m)
+            remove_bounds(m)
+            _worker.clear()
+        return df
+
+    if start_method is None:
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    ctx = multiprocessing.get_context(start_method)
+    # written once here rather than by every forked process
+    save_coefficients()
+    if start_method == 'fork':
+        _worker['model'] = m
+        add_bounds(m, bounds)
+        args = None
+    else:
+        args = build_args(m)
+    try:
+        with ctx.Pool(processes, initializer=_init_worker, initargs=(args, solver, outputs, objective, bounds)) as pool:
+            for rows in pool.imap_unordered(_solve_points, chunks):
+                collect(rows)
+    finally:
+        if args is None:
+            remove_bounds(m)
+        _worker.clear()
+    return df
+
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from pyomo.environ import Block, ConcreteModel, Constraint, Expr_if, Expression, Var, exp, value
+
+from watertap3.utils.costing_kernel import CostingKernel, evaluate_costing, feedback_parameters
+from watertap3.utils.sweep import get_component
+
+parameters = ['fs.costing_param.wacc', 'fs.costing_param.plant_lifetime_yrs', 'fs.costing_param.electricity_price',
+              'fs.costing_param.plant_cap_utilization', 'fs.unit.costing.fci_uncertainty']
+
+
+def build_model():
+    # a solved unit (flows and design fixed at the solution) with costing expressions shaped like financials
+    m = ConcreteModel()
+    m.fs = fs = Block()
+    fs.costing_param = p = Block()
+    for name, val in (('wacc', 0.08), ('plant_lifetime_yrs', 30), ('electricity_price', 0.07),
+                      ('plant_cap_utilization', 1)):
+        setattr(p, name, Var(initialize=val))
+    fs.unit = u = Block()
+    u.flow_vol_in = Var([0], initialize=1.2)
+    u.flow_vol_out = Var([0], initialize=1.0)
+    u.water_recovery = Var([0], initialize=0.8)
+    u.recovery_constr = Constraint(expr=u.flow_vol_out[0] == u.water_recovery[0] * u.flow_vol_in[0])
+    u.costing = c = Block()
+    c.fci_uncertainty = Var([0], initialize=1)
+    for v in m.component_data_objects(Var):
+        v.fix()
+    u.flow_vol_out.unfix()
+    u.flow_vol_out[0].value = 0.96
+
+    fs.costing = b = Block()
+    c.fixed_cap_inv = 5 * u.flow_vol_in[0] ** 0.7 * c.fci_uncertainty[0]
+    c.electricity_cost = 3600 * 24 * 365 * u.flow_vol_in[0] * 0.5 * p.electricity_price * 1E-6
+    b.capital_recovery_factor = (p.wacc * (1 + p.wacc) ** p.plant_lifetime_yrs) / (
+            ((1 + p.wacc) ** p.plant_lifetime_yrs) - 1)
+    b.treated_water = u.flow_vol_out[0]
+    annual = b.treated_water * 3600 * 24 * 365 * p.plant_cap_utilization
+    b.LCOW_TCI = Expression(expr=1E6 * c.fixed_cap_inv * 1.1 * b.capital_recovery_factor / annual)
+    b.LCOW_elec = Expression(expr=1E6 * c.electricity_cost * exp(0 * p.wacc) / annual)
+    b.LCOW = Expression(expr=b.LCOW_TCI + b.LCOW_elec + 0.01 * c.fixed_cap_inv / (1 + p.wacc))
+    return m
+
+
+outputs = {'lcow': 'fs.costing.LCOW', 'lcow_tci': 'fs.costing.LCOW_TCI', 'lcow_elec': 'fs.costing.LCOW_elec',
+           'treated_water': 'fs.costing.treated_water'}
+
+
+def random_values(n=50, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(0.03, 0.12, n), rng.integers(10, 50, n), rng.uniform(0.03, 0.2, n),
+                            rng.uniform(0.6, 1, n), rng.uniform(0.65, 1.65, n)])
+
+
+def set_parameters(m, row):
+    for path, val in zip(parameters, row):
+        m.find_component(path).fix(val)
+
+
+def test_evaluate_matches_the_model():
+    m = build_model()
+    kernel = CostingKernel(m, parameters, outputs)
+    x = random_values()
+    df = kernel.evaluate(x)
+    assert list(df.columns) == list(outputs)
+    assert len(df) == len(x)
+    for row, (_, result) in zip(x, df.iterrows()):
+        set_parameters(m, row)
+        for name, path in outputs.items():
+            assert result[name] == pytest.approx(value(get_component(m, path)), rel=1E-12)
+
+
+def test_evaluate_tables_and_dictionaries():
+    m = build_model()
+    kernel = CostingKernel(m, parameters, outputs)
+    x = random_values(5)
+    table = {path: x[:, j] for j, path in enumerate(parameters)}
+    expected = kernel.evaluate(x)
+    assert np.allclose(kernel.evaluate(table).values, expected.values)
+    assert np.allclose(evaluate_costing(m, table, outputs).values, expected.values)
+
+
+def test_feedback_parameters():
+    m = build_model()
+    assert feedback_parameters(m, parameters) == []
+    assert feedback_parameters(m, parameters, objective=True) == parameters
+    assert feedback_parameters(m, ['fs.unit.water_recovery', 'fs.unit.flow_vol_out', 'fs.unit.missing']) == [
+            'fs.unit.water_recovery', 'fs.unit.flow_vol_out', 'fs.unit.missing']
+
+
+def test_relational_expressions_are_not_compiled():
+    m = build_model()
+    m.fs.costing.LCOW_if = Expression(expr=Expr_if(m.fs.costing_param.wacc <= 0.1, m.fs.costing.LCOW, 0))
+    with pytest.raises(NotImplementedError):
+        CostingKernel(m, parameters, {'lcow': 'fs.costing.LCOW_if'})
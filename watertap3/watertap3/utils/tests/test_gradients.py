@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from pyomo.environ import Block, ConcreteModel, Constraint, Expression, Var, value
+
+from watertap3.utils.gradients import lcow_gradients
+
+parameters = ['fs.p', 'fs.a', 'fs.c']
+outputs = {'lcow': 'fs.costing.LCOW'}
+
+
+def build_model():
+    # y = a * p at the solution, LCOW = c * y ** 2 + p: dLCOW/dp = 2 c y a + 1, dLCOW/da = 2 c y p,
+    # dLCOW/dc = y ** 2
+    m = ConcreteModel()
+    m.fs = fs = Block()
+    fs.p = Var(initialize=3)
+    fs.a = Var(initialize=2)
+    fs.c = Var(initialize=0.5)
+    for v in (fs.p, fs.a, fs.c):
+        v.fix()
+    fs.y = Var(initialize=6)
+    fs.y_constr = Constraint(expr=fs.y == fs.a * fs.p)
+    fs.costing = Block()
+    fs.costing.LCOW = Expression(expr=fs.c * fs.y ** 2 + fs.p)
+    return m
+
+
+def test_total_derivatives():
+    m = build_model()
+    df = lcow_gradients(m, parameters=parameters, outputs=outputs)
+    p, a, c, y = 3, 2, 0.5, 6
+    lcow = c * y ** 2 + p
+    assert list(df.index) == parameters
+    assert df['value'].tolist() == [p, a, c]
+    assert df['lcow_gradient'].tolist() == pytest.approx([2 * c * y * a + 1, 2 * c * y * p, y ** 2])
+    assert df['lcow_elasticity'].tolist() == pytest.approx(
+            [(2 * c * y * a + 1) * p / lcow, 2 * c * y * p * a / lcow, y ** 2 * c / lcow])
+
+
+def test_matches_finite_differences():
+    m = build_model()
+    df = lcow_gradients(m, parameters=parameters, outputs=outputs)
+    for path in parameters:
+        v = m.find_component(path)
+        x = v.value
+        lcow = []
+        for h in (1E-6, -1E-6):
+            v.fix(x + h)
+            m.fs.y.value = value(m.fs.a * m.fs.p)
+            lcow.append(value(m.fs.costing.LCOW))
+        v.fix(x)
+        m.fs.y.value = value(m.fs.a * m.fs.p)
+        assert df.loc[path, 'lcow_gradient'] == pytest.approx((lcow[0] - lcow[1]) / 2E-6, rel=1E-6)
+
+
+def test_not_square_gives_direct_derivatives():
+    m = build_model()
+    m.fs.z = Var(initialize=1)
+    m.fs.z_constr = Constraint(expr=m.fs.z + m.fs.y >= 0)
+    m.fs.y_constr.set_value(m.fs.y + m.fs.z == m.fs.a * m.fs.p + 1)
+    df = lcow_gradients(m, parameters=parameters, outputs=outputs)
+    assert df['lcow_gradient'].tolist() == pytest.approx([1, 0, 36])
+    assert np.isfinite(df['lcow_elasticity']).all()
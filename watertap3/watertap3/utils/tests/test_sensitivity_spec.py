@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from pyomo.environ import Block, ConcreteModel, Set, Var
+
+from watertap3.utils.sensitivity_spec import default_sensitivity_spec, spec_points
+
+runs = 20
+
+
+def build_model(case_study='test_case'):
+    # the parts of a solved treatment train the sensitivity sweeps read
+    m = ConcreteModel()
+    m.fs = fs = Block()
+    fs.train = {'case_study': case_study, 'scenario': 'baseline', 'reference': 'nawi'}
+    fs.flow_in_dict = {'well_a': 1, 'well_b': 1}
+    fs.pfd_dict = {'reverse_osmosis': {'Unit': 'reverse_osmosis'}}
+    fs.costing_param = Block()
+    for name, val in (('plant_cap_utilization', 1), ('wacc', 0.08), ('plant_lifetime_yrs', 30),
+                      ('electricity_price', 0.07), ('maintenance_costs_percent_FCI', 0.008)):
+        setattr(fs.costing_param, name, Var(initialize=val))
+    for name, tds, flow in (('well_a', 30, 0.5), ('well_b', 10, 1.5)):
+        source = Block()
+        setattr(fs, name, source)
+        source.comp = Set(initialize=['tds', 'toc'])
+        source.conc_mass_in = Var([0], source.comp, initialize={(0, 'tds'): tds, (0, 'toc'): 0.01})
+        source.flow_vol_in = Var([0], initialize=flow)
+    fs.reverse_osmosis = ro = Block()
+    ro.membrane_area = Var([0], initialize=1000)
+    ro.factor_membrane_replacement = Var([0], initialize=0.2)
+    ro.feed = Block()
+    ro.feed.pressure = Var([0], initialize=50)
+    for v in m.component_data_objects(Var):
+        v.fix()
+    return m
+
+
+def baseline_values(lb, ub):
+    # values the original sensitivity loops stepped through: np.arange(lb, ub + step, step)
+    step = (ub - lb) / runs
+    return lb + step * np.arange(runs + 1)
+
+
+def sweep(points, name):
+    points = [p for p in points if p['sens_var'] == name]
+    assert len(points) == runs + 1
+    return points
+
+
+@pytest.fixture(scope='module')
+def points():
+    m = build_model()
+    return spec_points(m, default_sensitivity_spec(runs))
+
+
+def test_plant_cap(points):
+    i = baseline_values(0.7, 1)
+    plant_cap = sweep(points, 'plant_cap')
+    assert [p['settings'] for p in plant_cap] == [[('fs.costing_param.plant_cap_utilization', pytest.approx(x))]
+                                                  for x in i]
+    assert [p['scenario_value'] for p in plant_cap] == pytest.approx(i * 100)
+    assert all(p['baseline_sens_value'] == 1 for p in plant_cap)
+    assert [p['sens_var_norm'] for p in plant_cap] == pytest.approx(i / 1)
+    assert plant_cap[0]['scenario_name'] == 'Plant Capacity Utilization 70-100%'
+
+
+def test_wacc(points):
+    i = baseline_values(0.08 - 0.03, 0.08 + 0.02)
+    wacc = sweep(points, 'wacc')
+    assert [p['settings'][0][1] for p in wacc] == pytest.approx(i)
+    assert [p['scenario_value'] for p in wacc] == pytest.approx(i * 100)
+    assert all(p['baseline_sens_value'] == pytest.approx(0.08) for p in wacc)
+    assert [p['sens_var_norm'] for p in wacc] == pytest.approx(i / 0.08)
+
+
+def test_tds_in_sets_every_source(points):
+    i = baseline_values(0.75, 1.25)
+    tds_in = sweep(points, 'tds_in')
+    for p, x in zip(tds_in, i):
+        assert dict(p['settings']) == {'fs.well_a.conc_mass_in[0,tds]': pytest.approx(30 * x),
+                                       'fs.well_b.conc_mass_in[0,tds]': pytest.approx(10 * x)}
+    assert [p['scenario_value'] for p in tds_in] == pytest.approx(40 * i)
+    assert all(p['baseline_sens_value'] == pytest.approx(40) for p in tds_in)
+    assert [p['sens_var_norm'] for p in tds_in] == pytest.approx(i)
+
+
+def test_flow_in(points):
+    i = baseline_values(0.75, 1.25)
+    flow_in = sweep(points, 'flow_in')
+    assert [p['scenario_value'] for p in flow_in] == pytest.approx(2 * i)
+    assert [p['sens_var_norm'] for p in flow_in] == pytest.approx(i)
+
+
+def test_plant_life_difference(points):
+    i = baseline_values(15, 45)
+    plant_life = sweep(points, 'plant_life')
+    assert [p['scenario_value'] for p in plant_life] == pytest.approx(i)
+    assert [p['sens_var_norm'] for p in plant_life] == pytest.approx(i - 30)
+
+
+def test_elect_price(points):
+    i = baseline_values(0.07 * 0.7, 0.07 * 1.3)
+    elect_price = sweep(points, 'elect_price')
+    assert [p['settings'][0][1] for p in elect_price] == pytest.approx(i)
+    assert [p['sens_var_norm'] for p in elect_price] == pytest.approx(i / 0.07)
+
+
+def test_ro_sweeps(points):
+    area = sweep(points, 'reverse_osmosis_membrane_area')
+    i = baseline_values(1000 * 0.8, 1000 * 1.2)
+    assert [p['scenario_value'] for p in area] == pytest.approx(i)
+    assert [p['sens_var_norm'] for p in area] == pytest.approx(i / 1000)
+    assert area[0]['ro_scenario'] == 'membrane_area'
+    assert area[0]['outputs']['ro_area'] == 'fs.reverse_osmosis.membrane_area[0]'
+
+    replacement = sweep(points, 'reverse_osmosis_factor_membrane_replacement')
+    i = baseline_values(0.2 - 0.1, 0.2 + 0.3)
+    assert [p['scenario_value'] for p in replacement] == pytest.approx(i)
+    assert [p['sens_var_norm'] for p in replacement] == pytest.approx(i / 0.2)
+
+
+def test_sweeps_for_missing_units_and_skipped_case_studies():
+    m = build_model(case_study='cherokee')
+    names = set(p['sens_var'] for p in spec_points(m, default_sensitivity_spec(runs)))
+    assert 'flow_in' not in names
+    assert 'reverse_osmosis_membrane_area' not in names
+    assert 'dwi_inj_pressure' not in names
+    assert 'alum_dose' not in names
+    assert {'plant_cap', 'wacc', 'tds_in', 'plant_life', 'elect_price', 'component_replacement'} <= names
+
+
+def test_points_do_not_change_the_model():
+    m = build_model()
+    spec_points(m, default_sensitivity_spec(runs))
+    assert m.fs.costing_param.wacc.value == 0.08
+    assert m.fs.well_a.conc_mass_in[0, 'tds'].value == 30
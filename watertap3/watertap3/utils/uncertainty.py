@@ -0,0 +1,254 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from .costing_kernel import CostingKernel, feedback_parameters
+from .sweep import default_outputs, run_sweep
+
+__all__ = ['aace_classes',
+           'uncertainty_kinds',
+           'nested_kinds',
+           'class_bounds',
+           'uncertainty_factors',
+           'latin_hypercube',
+           'uncertainty_points',
+           'run_uncertainty',
+           'uncertainty_summary']
+
+_log = logging.getLogger(__name__)
+
+# AACE cost estimate classes: (low, high) range of the actual cost as a factor of the estimate, the middle of
+# the expected accuracy ranges (e.g. class 5 is -20% to -50% low and +30% to +100% high)
+aace_classes = {
+        1: (0.935, 1.09),
+        2: (0.9, 1.125),
+        3: (0.85, 1.2),
+        4: (0.775, 1.35),
+        5: (0.65, 1.65)
+        }
+
+# <kind>_class columns of the treatment train table and the unit costing Vars (<kind>_uncertainty) they apply to
+uncertainty_kinds = ['fci', 'tci', 'fixed_op', 'total_op', 'annual_op', 'elect_intens', 'catchem', 'other']
+
+# kinds whose cost includes the cost of other kinds (e.g. the TCI includes the FCI): a unit gets no factor for
+# these if it has a factor for a kind inside them, so the same uncertainty is not applied twice
+nested_kinds = {
+        'tci': ['fci'],
+        'annual_op': ['fixed_op', 'elect_intens', 'catchem', 'other'],
+        'total_op': ['fixed_op', 'elect_intens', 'catchem', 'other']
+        }
+
+
+def class_bounds(estimate_class):
+    '''
+    Range of the uncertainty factor for an AACE class. Half classes (e.g. 3.5) are between the two classes.
+
+    :param estimate_class: AACE class (1-5)
+    :type estimate_class: float
+    :return: (low, high) factors
+    '''
+    estimate_class = min(max(float(estimate_class), 1), 5)
+    lower, upper = int(np.floor(estimate_class)), int(np.ceil(estimate_class))
+    w = estimate_class - lower
+    return tuple((1 - w) * a + w * b for a, b in zip(aace_classes[lower], aace_classes[upper]))
+
+
+def uncertainty_factors(m):
+    '''
+    Function to get the uncertain cost factors of a treatment train: the ``<kind>_uncertainty`` Var of each unit
+    with a ``<kind>_class`` in the treatment train table. ``wr_const_class`` has no uncertainty Var and is not
+    used.
+
+    The factors multiply nested costs: ``total_cap_investment`` is the ``fixed_cap_inv`` (already multiplied by
+    ``fci_uncertainty``) times ``tci_uncertainty``. Sampling both would apply the capital uncertainty twice, so
+    each unit gets one capital factor: ``fci_uncertainty`` in the range of the FCI class, which carries through
+    to the TCI and the FCI-based fixed O&M, or ``tci_uncertainty`` if the unit only has a TCI class. The same
+    holds for the operating cost kinds (see ``nested_kinds``).
+
+    :param m: WaterTAP3 model with the treatment train built
+    :return: Table with the unit, kind, class, Var path and factor range of each factor
+    :rtype: DataFrame
+    '''
+    rows = []
+    for unit_name, unit_dict in m.fs.pfd_dict.items():
+        costing = getattr(getattr(m.fs, unit_name, None), 'costing', None)
+        unit_rows = {}
+        for kind in uncertainty_kinds:
+            estimate_class = unit_dict.get(f'{kind}_class')
+            if estimate_class is None or pd.isna(estimate_class):
+                continue
+            var = getattr(costing, f'{kind}_uncertainty', None)
+            if var is None:
+                _log.debug(f'{unit_name} has a {kind} class but no {kind}_uncertainty')
+                continue
+            low, high = class_bounds(estimate_class)
+            unit_rows[kind] = {'unit': unit_name, 'kind': kind, 'class': float(estimate_class), 'path': var.name,
+                               'low': low, 'high': high}
+        for kind, inner in nested_kinds.items():
+            if kind in unit_rows and any(k in unit_rows for k in inner):
+                _log.debug(f'{unit_name}: {kind} uncertainty is covered by {[k for k in inner if k in unit_rows]}')
+                del unit_rows[kind]
+        rows.extend(unit_rows.values())
+    return pd.DataFrame(rows, columns=['unit', 'kind', 'class', 'path', 'low', 'high'])
+
+
+def latin_hypercube(samples, dimensions, seed=None):
+    '''
+    Latin hypercube sample of the unit hypercube: each dimension has one sample in each of ``samples`` equal
+    intervals.
+
+    :param samples: Number of samples
+    :type samples: int
+    :param dimensions: Number of dimensions
+    :type dimensions: int
+    :param seed: Random seed
+    :type seed: int
+    :return: Array (samples x dimensions) of values in [0, 1)
+    '''
+    rng = np.random.default_rng(seed)
+    u = (rng.random((samples, dimensions)) + np.arange(samples)[:, None]) / samples
+    for j in range(dimensions):
+        u[:, j] = u[rng.permutation(samples), j]
+    return u
+
+
+def _triangular(u, low, high, mode=1):
+    # inverse CDF of the triangular distribution
+    f = (mode - low) / (high - low)
+    return np.where(u < f,
+                    low + np.sqrt(u * (high - low) * (mode - low)),
+                    high - np.sqrt((1 - u) * (high - low) * (high - mode)))
+
+
+def uncertainty_points(m, samples=1000, seed=None, factors=None, distribution='triangular'):
+    '''
+    Function to get Latin hypercube samples of the uncertain cost factors of a treatment train as sweep points.
+
+    :param m: WaterTAP3 model with the treatment train built
+    :param samples: Number of samples
+    :type samples: int
+    :param seed: Random seed
+    :type seed: int
+    :param factors: Factors to sample, ``uncertainty_factors(m)`` if None
+    :type factors: DataFrame
+    :param distribution: Distribution of each factor in its class range, 'triangular' (mode 1) or 'uniform'
+    :type distribution: str
+    :return: Sweep points for ``run_sweep``, labelled with 'sample' and the value of each factor
+        ('<unit>.<kind>')
+    '''
+    if factors is None:
+        factors = uncertainty_factors(m)
+    u = latin_hypercube(samples, len(factors), seed=seed)
+    low = factors.low.values
+    high = factors.high.values
+    if distribution == 'uniform':
+        values = low + u * (high - low)
+    else:
+        values = _triangular(u, low, high)
+    # samples with similar factors next to each other, so each solve starts from a nearby point
+    order = np.argsort(values.mean(axis=1)) if len(factors) else np.arange(samples)
+    labels = [f'{unit}.{kind}' for unit, kind in zip(factors.unit, factors.kind)]
+    paths = list(factors.path)
+    points = []
+    for i in order:
+        point = {'sample': int(i)}
+        point.update(zip(labels, values[i].tolist()))
+        point['settings'] = list(zip(paths, values[i].tolist()))
+        points.append(point)
+    return points
+
+
+def _evaluate_samples(m, factors, points, outputs):
+    try:
+        kernel = CostingKernel(m, list(factors.path), outputs)
+    except NotImplementedError as e:
+        _log.info(f'Solving instead of evaluating the costing: {e}')
+        return None
+    start = time.perf_counter()
+    labels = pd.DataFrame([{k: v for k, v in point.items() if k != 'settings'} for point in points])
+    results = kernel.evaluate([[val for _, val in point['settings']] for point in points])
+    labels['termination'] = 'optimal'
+    labels['solve_time'] = (time.perf_counter() - start) / max(len(points), 1)
+    return pd.concat([labels, results], axis=1)
+
+
+def run_uncertainty(m, samples=1000, seed=None, processes=None, solver='ipopt', outputs=None,
+                    distribution='triangular', percentiles=(5, 50, 95), chunk_size=None, evaluate_costing=True):
+    '''
+    Function to run a Monte Carlo analysis of the cost uncertainty of a treatment train solved with
+    ``run_watertap3``. The unit cost factors with an AACE class in the treatment train table (see
+    ``uncertainty_factors``) are sampled with a Latin hypercube and the samples are solved with ``run_sweep``,
+    each process solving its share of samples on one solved copy of the train. The cost factors only enter the
+    costing, so with ``evaluate_costing`` the samples are evaluated on the solved model with a
+    ``CostingKernel`` instead of solved.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param samples: Number of samples
+    :type samples: int
+    :param seed: Random seed
+    :type seed: int
+    :param processes: Number of processes (all cores if None)
+    :type processes: int
+    :param solver: Solver name
+    :type solver: str
+    :param outputs: Outputs to record for every sample ({name: component path}), ``default_outputs`` if None
+    :type outputs: dict
+    :param distribution: Distribution of each factor in its class range, 'triangular' or 'uniform'
+    :type distribution: str
+    :param percentiles: Percentiles of the outputs to print
+    :type percentiles: tuple
+    :param chunk_size: Samples per chunk handed to a process
+    :type chunk_size: int
+    :param evaluate_costing: Evaluate the costing instead of solving, if no factor enters a constraint
+    :type evaluate_costing: bool
+    :return: Results table, one row per sample, sorted by sample (empty if no unit has an uncertainty class)
+    :rtype: DataFrame
+    '''
+    if outputs is None:
+        outputs = default_outputs
+    factors = uncertainty_factors(m)
+    if factors.empty:
+        print('No units with cost uncertainty classes in the treatment train table')
+        return pd.DataFrame(columns=['sample', 'termination', 'solve_time', *outputs])
+    points = uncertainty_points(m, samples=samples, seed=seed, factors=factors, distribution=distribution)
+    print(f'\nRunning {samples} uncertainty samples of {len(factors)} cost factors')
+    df = None
+    if evaluate_costing and not feedback_parameters(m, list(factors.path)):
+        df = _evaluate_samples(m, factors, points, outputs)
+    if df is None:
+        df = run_sweep(m, points, outputs=outputs, processes=processes, solver=solver, chunk_size=chunk_size)
+    df = df.sort_values('sample').reset_index(drop=True)
+    summary = uncertainty_summary(df, outputs=list(outputs), percentiles=percentiles)
+    print(summary.loc[['lcow']] if 'lcow' in summary.index else summary)
+    return df
+
+
+def uncertainty_summary(df, outputs=None, percentiles=(5, 50, 95)):
+    '''
+    Function to get the percentiles of the outputs of an uncertainty run, over the samples that solved
+    optimally.
+
+    :param df: Results table from ``run_uncertainty``
+    :type df: DataFrame
+    :param outputs: Output names, ``default_outputs`` if None
+    :type outputs: list
+    :param percentiles: Percentiles
+    :type percentiles: tuple
+    :return: Table with the mean, standard deviation and percentiles (P5, P50, ...) of each output and the
+        number of samples used and failed
+    :rtype: DataFrame
+    '''
+    if outputs is None:
+        outputs = list(default_outputs)
+    ok = df[df.termination == 'optimal']
+    rows = {}
+    for name in outputs:
+        values = ok[name].astype(float)
+        row = {'mean': values.mean(), 'std': values.std()}
+        row.update({f'P{p:g}': values.quantile(p / 100) for p in percentiles})
+        row['samples'] = len(values)
+        row['failed'] = len(df) - len(ok)
+        rows[name] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
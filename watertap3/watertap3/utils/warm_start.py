@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+from pyomo.environ import Constraint, Suffix, Var
+from watertap3.data import get_cache_dir
+
+from .model_templates import template_key
+
+__all__ = ['warm_start_key',
+           'add_warm_start_suffixes',
+           'save_solution',
+           'load_solution',
+           'transfer_multipliers',
+           'clear_solutions',
+           'warm_start_options']
+
+_log = logging.getLogger(__name__)
+
+# ipopt options for starting from a stored primal-dual point
+warm_start_options = {
+        'warm_start_init_point': 'yes',
+        'warm_start_bound_push': 1E-8,
+        'warm_start_bound_frac': 1E-8,
+        'warm_start_slack_bound_push': 1E-8,
+        'warm_start_slack_bound_frac': 1E-8,
+        'warm_start_mult_bound_push': 1E-8,
+        'mu_init': 1E-6
+        }
+
+_solutions = OrderedDict()
+_max_solutions = 32
+
+
+def warm_start_key(m):
+    '''
+    Key for the stored solution of a treatment train: a hash of the model template key (case study,
+    scenario, source water, unit table, data version and build options).
+
+    :param m: WaterTAP3 model
+    :return: Key (hex string)
+    '''
+    return hashlib.sha1(repr(template_key(m)).encode()).hexdigest()[:20]
+
+
+def add_warm_start_suffixes(m):
+    '''
+    Add the suffixes ipopt uses to return bound multipliers and constraint duals (and to read them back
+    for a warm start). Does nothing if the model already has them.
+
+    :param m: WaterTAP3 model
+    '''
+    if m.component('dual') is None:
+        m.dual = Suffix(direction=Suffix.IMPORT_EXPORT)
+    for name, direction in (('ipopt_zL_out', Suffix.IMPORT), ('ipopt_zU_out', Suffix.IMPORT),
+                            ('ipopt_zL_in', Suffix.EXPORT), ('ipopt_zU_in', Suffix.EXPORT)):
+        if m.component(name) is None:
+            m.add_component(name, Suffix(direction=direction))
+
+
+def transfer_multipliers(m):
+    '''
+    Copy the bound multipliers ipopt returned in the last solve to the suffixes it reads them from, so
+    the next solve of the same model can warm start.
+
+    :param m: Solved WaterTAP3 model with warm start suffixes
+    '''
+    m.ipopt_zL_in.update(m.ipopt_zL_out)
+    m.ipopt_zU_in.update(m.ipopt_zU_out)
+
+
+def _solution_path(key):
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, 'warm_start', f'{key}.npz')
+
+
+def save_solution(m, key=None):
+    '''
+    Store the solution of a solved model: the values of all variables that are not fixed, their bound
+    multipliers and the constraint duals (if the model has warm start suffixes), indexed by component name.
+    Solutions are held in memory and, if a cache directory is set (see ``watertap3.data.set_cache_dir``),
+    saved to ``warm_start/<key>.npz`` in it so later processes can warm start too.
+
+    :param m: Solved WaterTAP3 model
+    :param key: Key to store the solution under (``warm_start_key(m)`` if None)
+    :type key: str
+    :return: Key the solution was stored under
+    '''
+    if key is None:
+        key = warm_start_key(m)
+    has_suffixes = m.component('ipopt_zL_out') is not None
+    var_names, var_values, var_zl, var_zu = [], [], [], []
+    for v in m.component_data_objects(Var, descend_into=True):
+        if v.fixed or v.value is None:
+            continue
+        var_names.append(v.name)
+        var_values.append(v.value)
+        if has_suffixes:
+            var_zl.append(m.ipopt_zL_out.get(v, 0))
+            var_zu.append(m.ipopt_zU_out.get(v, 0))
+    con_names, con_duals = [], []
+    if m.component('dual') is not None:
+        for c in m.component_data_objects(Constraint, active=True, descend_into=True):
+            dual = m.dual.get(c)
+            if dual is not None:
+                con_names.append(c.name)
+                con_duals.append(dual)
+    solution = {
+            'var_names': np.array(var_names),
+            'var_values': np.array(var_values, dtype=float),
+            'var_zl': np.array(var_zl, dtype=float),
+            'var_zu': np.array(var_zu, dtype=float),
+            'con_names': np.array(con_names),
+            'con_duals': np.array(con_duals, dtype=float)
+            }
+    _solutions[key] = solution
+    _solutions.move_to_end(key)
+    while len(_solutions) > _max_solutions:
+        _solutions.popitem(last=False)
+    path = _solution_path(key)
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez_compressed(tmp, **solution)
+        os.replace(tmp, path)
+    return key
+
+
+def _get_solution(key):
+    solution = _solutions.get(key)
+    if solution is not None:
+        return solution
+    path = _solution_path(key)
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as f:
+            solution = {name: f[name] for name in f.files}
+    except (OSError, ValueError) as e:
+        _log.warning(f'Could not read stored solution {path}: {e}')
+        return None
+    _solutions[key] = solution
+    return solution
+
+
+def load_solution(m, key=None):
+    '''
+    Load a stored solution into a freshly built model: variable values (for variables that are not fixed),
+    and, if the solution has them, bound multipliers and constraint duals into the warm start suffixes.
+    Components that are not in the model are skipped.
+
+    :param m: WaterTAP3 model
+    :param key: Key of the solution (``warm_start_key(m)`` if None)
+    :type key: str
+    :return: True if a solution was found and loaded
+    '''
+    if key is None:
+        key = warm_start_key(m)
+    solution = _get_solution(key)
+    if solution is None:
+        return False
+    variables = {v.name: v for v in m.component_data_objects(Var, descend_into=True)}
+    has_multipliers = len(solution['var_zl']) == len(solution['var_names'])
+    if has_multipliers or len(solution['con_names']):
+        add_warm_start_suffixes(m)
+    loaded = 0
+    for i, name in enumerate(solution['var_names'].tolist()):
+        v = variables.get(name)
+        if v is None or v.fixed:
+            continue
+        v.set_value(float(solution['var_values'][i]))
+        loaded += 1
+        if has_multipliers:
+            m.ipopt_zL_in[v] = float(solution['var_zl'][i])
+            m.ipopt_zU_in[v] = float(solution['var_zu'][i])
+    if len(solution['con_names']):
+        constraints = {c.name: c for c in m.component_data_objects(Constraint, active=True, descend_into=True)}
+        for name, dual in zip(solution['con_names'].tolist(), solution['con_duals'].tolist()):
+            c = constraints.get(name)
+            if c is not None:
+                m.dual[c] = dual
+    _log.debug(f'Loaded {loaded} of {len(solution["var_names"])} stored variable values for {key}')
+    return loaded > 0
+
+
+def clear_solutions(disk=False):
+    '''
+    Drop all solutions held in memory.
+
+    :param disk: Also delete the solutions saved in the cache directory
+    :type disk: bool
+    '''
+    _solutions.clear()
+    cache_dir = get_cache_dir()
+    if disk and cache_dir is not None:
+        warm_start_dir = os.path.join(cache_dir, 'warm_start')
+        if os.path.isdir(warm_start_dir):
+            for fname in os.listdir(warm_start_dir):
+                if fname.endswith('.npz'):
+                    os.remove(os.path.join(warm_start_dir, fname))
@@ -8,26 +8,46 @@ from idaes.core import FlowsheetBlock
 from idaes.core.util.model_statistics import degrees_of_freedom
 import os
 from pyomo.environ import Var, Expression, NonNegativeReals, Block, ConcreteModel, Constraint, Objective, SolverFactory, TransformationFactory, units as pyunits, value
+from pyomo.common.collections import ComponentMap
 from pyomo.network import SequentialDecomposition, Arc
 from pyomo.network.port import SimplePort
+from watertap3.data import get_table
 # from pyomo.contrib.mindtpy.MindtPy import MindtPySolver
 from . import financials
 from .case_study_trains import *
 from .post_processing import get_results_table
+from .initialization import initialize_flowsheet
+from .profiling import profile_phase, record_solver_time
+from .result_cache import get_cached_result, load_cached_solution, result_key, store_result
+from .retry import RetryPolicy
+from .solvers import get_solver, has_active_arcs, is_persistent, persistent_state, solve_model
+from .sensitivity_spec import default_sensitivity_spec, power_sensitivity_spec, run_spec, spec_points
+from .warm_start import add_warm_start_suffixes, load_solution, save_solution, transfer_multipliers, warm_start_options
 
 warnings.filterwarnings('ignore')
 
 __all__ = ['run_model', 'watertap_setup', 'run_model', 'run_model_no_print', 'run_watertap3', 'case_study_constraints', 'get_ix_stash', 'fix_ix_stash',
            'run_sensitivity', 'print_ro_results', 'print_results', 'set_bounds', 'get_ro_stash', 'fix_ro_stash',
-           'run_sensitivity_power']
+           'run_sensitivity_power', 'get_build_stash', 'restore_build_stash', 'sensitivity_sweep',
+           'set_up_cached_run']
 
 
 def watertap_setup(dynamic=False, case_study=None, reference='nawi', scenario=None,
-                   source_reference=None, source_case_study=None, source_scenario=None):
+                   source_reference=None, source_case_study=None, source_scenario=None,
+                   prune_constituents=False, keep_constituents=None):
+    '''
+    Function to set up a WaterTAP3 model for a case study and scenario.
+
+    :param prune_constituents: Build the model with only the constituents used in costs or constraints,
+        lumping the rest (see ``generate_constituent_list.prune_constituents``). Concentrations of the
+        lumped constituents are rebuilt after the solve for the results table.
+    :type prune_constituents: bool
+    :param keep_constituents: Extra constituents to keep in the model when pruning
+    :type keep_constituents: list
+    '''
 
     def get_source(reference, water_type, case_study, scenario):
-        input_file = 'data/case_study_water_sources.csv'
-        df = pd.read_csv(input_file, index_col='variable')
+        df = get_table('case_study_water_sources', index_col='variable')
         try:
             source_df = df[((df.case_study == case_study) & (df.water_type == water_type) & (df.reference == reference) & (df.scenario == scenario))].copy()
             source_flow = source_df.loc['flow'].value
@@ -47,150 +67,228 @@ def watertap_setup(dynamic=False, case_study=None, reference='nawi', scenario=No
             'dynamic': dynamic
             })
 
-    m.fs.train = {
-            'case_study': case_study,
-            'reference': reference,
-            'scenario': scenario
-            }
-
-    if source_reference is None:
-        source_reference = reference
-    if source_case_study is None:
-        source_case_study = case_study
-    if source_scenario is None:
-        source_scenario = scenario
-
-    df = pd.read_csv('data/treatment_train_setup.csv')
-
-    # df = filter_df(df, m)
-    water_type_list = []
-    m.fs.df_units = df[((df.Reference == reference) & (df.Scenario == scenario) & (df.CaseStudy == case_study))].copy()
-
-    m.fs.has_ro = False
-    m.fs.has_ix = False
-    if 'ion_exchange' in m.fs.df_units.Unit:
-        m.fs.has_ix = True
-    if 'reverse_osmosis' in m.fs.df_units.Unit:
-        m.fs.has_ro = True
-
-    for i in m.fs.df_units[m.fs.df_units.Type == 'intake'].index:
-        temp_dict = ast.literal_eval(m.fs.df_units[m.fs.df_units.Type == 'intake'].loc[i]['Parameter'])
-        for water_type in temp_dict['water_type']:
-            water_type_list.append(water_type)
-
-    if len(water_type_list) == 1:
-        water_type_list = water_type_list[0]
-
-    m.fs.source_water = {
-            'case_study': source_case_study,
-            'reference': source_reference,
-            'scenario': source_scenario,
-            'water_type': water_type_list
-            }
+    with profile_phase(m, 'watertap_setup', count=False):
+        m.fs.train = {
+                'case_study': case_study,
+                'reference': reference,
+                'scenario': scenario
+                }
+        m.fs.prune_constituents = prune_constituents
+        m.fs.keep_constituents = keep_constituents
+
+        if source_reference is None:
+            source_reference = reference
+        if source_case_study is None:
+            source_case_study = case_study
+        if source_scenario is None:
+            source_scenario = scenario
+
+        df = get_table('treatment_train_setup')
+
+        # df = filter_df(df, m)
+        water_type_list = []
+        m.fs.df_units = df[((df.Reference == reference) & (df.Scenario == scenario) & (df.CaseStudy == case_study))].copy()
+
+        m.fs.has_ro = False
+        m.fs.has_ix = False
+        if 'ion_exchange' in m.fs.df_units.Unit:
+            m.fs.has_ix = True
+        if 'reverse_osmosis' in m.fs.df_units.Unit:
+            m.fs.has_ro = True
+
+        for i in m.fs.df_units[m.fs.df_units.Type == 'intake'].index:
+            temp_dict = ast.literal_eval(m.fs.df_units[m.fs.df_units.Type == 'intake'].loc[i]['Parameter'])
+            for water_type in temp_dict['water_type']:
+                water_type_list.append(water_type)
+
+        if len(water_type_list) == 1:
+            water_type_list = water_type_list[0]
+
+        m.fs.source_water = {
+                'case_study': source_case_study,
+                'reference': source_reference,
+                'scenario': source_scenario,
+                'water_type': water_type_list
+                }
+
+        flow_dict = {}
+
+        if isinstance(m.fs.source_water['water_type'], list):
+            m.fs.source_df = pd.DataFrame()
+            for water_type in m.fs.source_water['water_type']:
+                source_flow, source_df = get_source(m.fs.source_water['reference'],
+                                                    water_type,
+                                                    m.fs.source_water['case_study'],
+                                                    m.fs.source_water['scenario'])
+                flow_dict[water_type] = source_flow
+                m.fs.source_df = m.fs.source_df.append(source_df)
 
-    flow_dict = {}
 
-    if isinstance(m.fs.source_water['water_type'], list):
-        m.fs.source_df = pd.DataFrame()
-        for water_type in m.fs.source_water['water_type']:
+        else:
             source_flow, source_df = get_source(m.fs.source_water['reference'],
-                                                water_type,
+                                                m.fs.source_water['water_type'],
                                                 m.fs.source_water['case_study'],
                                                 m.fs.source_water['scenario'])
-            flow_dict[water_type] = source_flow
-            m.fs.source_df = m.fs.source_df.append(source_df)
-
+            flow_dict[m.fs.source_water['water_type']] = source_flow
+            m.fs.source_df = source_df
 
-    else:
-        source_flow, source_df = get_source(m.fs.source_water['reference'],
-                                            m.fs.source_water['water_type'],
-                                            m.fs.source_water['case_study'],
-                                            m.fs.source_water['scenario'])
-        flow_dict[m.fs.source_water['water_type']] = source_flow
-        m.fs.source_df = source_df
-
-    m.fs.flow_in_dict = flow_dict
+        m.fs.flow_in_dict = flow_dict
 
     return m
 
 
-def run_model(m=None, solver='ipopt', solver_results=False, objective=False, max_attempts=3, print_it=False, initial_run=True):
+def _run_model(m, solver, solver_results, objective, max_attempts, initial_run, initialize, warm_start, persistent,
+               verbose):
+    # solve shared by run_model and run_model_no_print, verbose prints the degrees of freedom and the attempts
 
     if initial_run:
-        financials.get_system_costing(m.fs)
+        with profile_phase(m, 'get_system_costing'):
+            financials.get_system_costing(m.fs)
+
+    # persistent solves keep the flowsheet graph (and solver) between solves of the same model
+    state = persistent_state(m) if persistent else {}
+    G = state.get('graph')
+    if G is None or has_active_arcs(m):
+        with profile_phase(m, 'expand_arcs'):
+            TransformationFactory('network.expand_arcs').apply_to(m)
+            seq = SequentialDecomposition()
+            G = state['graph'] = seq.create_graph(m)
+
+    # warm start from the last solve of this model, or from a stored solution of the same train
+    warm = False
+    if warm_start:
+        add_warm_start_suffixes(m)
+        if hasattr(m.fs, 'results'):
+            transfer_multipliers(m)
+            warm = True
+        else:
+            with profile_phase(m, 'load_solution', count=False):
+                warm = load_solution(m)
 
-    TransformationFactory('network.expand_arcs').apply_to(m)
-    seq = SequentialDecomposition()
-    G = seq.create_graph(m)
+    # start the first solve of a model from a sequential-modular pass through the flowsheet
+    if initialize and not warm and not hasattr(m.fs, 'results'):
+        with profile_phase(m, 'initialize', count=False):
+            initialize_flowsheet(m, G)
 
     if objective:
         m.fs.objective_function = Objective(expr=m.fs.costing.LCOW)
 
-    solver = SolverFactory(solver)
+    solver_name = solver
+    solver = get_solver(m, solver_name, persistent=persistent)
+    if warm and solver_name == 'ipopt' and not is_persistent(solver):
+        solver.options.update(warm_start_options)
     # m.fs.solver = solver = SolverFactory('glpk')
 
     logging.getLogger('pyomo.core').setLevel(logging.ERROR)
 
-    # print('----------------------------------------------------------------------')
-    print('.................................')
-    print('\nDegrees of Freedom:', degrees_of_freedom(m))
-
-    m.fs.results = results = solver.solve(m, tee=solver_results)
-    print(f'\nInitial solve attempt {results.solver.termination_condition.swapcase()}')
+    if verbose:
+        # print('----------------------------------------------------------------------')
+        print('.................................')
+        if 'dof' not in state:
+            with profile_phase(m, 'degrees_of_freedom', count=False):
+                state['dof'] = degrees_of_freedom(m)
+        print('\nDegrees of Freedom:', state['dof'])
+
+    # retries escalate through the retry strategies, starting with the one that last worked for this train
+    policy = RetryPolicy(m, solver_name, G)
+    policy.start(solver)
+    with profile_phase(m, 'solve', count=False, strategy=policy.strategy) as record:
+        m.fs.results = results = solve_model(m, solver, tee=solver_results)
+    record_solver_time(record, results)
+    if verbose:
+        print(f'\nInitial solve attempt {results.solver.termination_condition.swapcase()}')
     # m.fs.results = results = solver.solve(m, mip_solver='glpk', nlp_solver='ipopt', tee=True)
 
     attempt_number = 1
-    while ((m.fs.results.solver.termination_condition in ['infeasible', 'maxIterations', 'unbounded']) & (attempt_number <= max_attempts)):
-        print(f'\nAttempt {attempt_number}:')
-        m.fs.results = results = solver.solve(m, tee=solver_results)
-        print(f'\n\tWaterTAP3 solver returned {results.solver.termination_condition.swapcase()} solution...')
+    while ((m.fs.results.solver.termination_condition in ['infeasible', 'maxIterations', 'unbounded']) & (attempt_number <= max_attempts)
+           & policy.has_next()):
+        if is_persistent(solver):
+            # APPSI does not load the point a failed attempt stopped at, the retries use the regular solver
+            policy.finish(solver, results)
+            solver = SolverFactory(solver_name)
+        strategy = policy.next_attempt(solver)
+        if verbose:
+            print(f'\nAttempt {attempt_number} ({strategy}):')
+        with profile_phase(m, 'solve', count=False, attempt=attempt_number, strategy=strategy) as record:
+            m.fs.results = results = solve_model(m, solver, tee=solver_results)
+        record_solver_time(record, results)
+        if verbose:
+            print(f'\n\tWaterTAP3 solver returned {results.solver.termination_condition.swapcase()} solution...')
         attempt_number += 1
 
-    print(f'\nWaterTAP3 solution {results.solver.termination_condition.swapcase()}\n')
-    # print('----------------------------------------------------------------------')
-    print('.................................')
-
-    if print_it:
-        print_results(m)
-
-def run_model_no_print(m=None, solver='ipopt', solver_results=False, objective=False, max_attempts=3, print_it=False, initial_run=True):
+    if verbose:
+        print(f'\nWaterTAP3 solution {results.solver.termination_condition.swapcase()}\n')
+    policy.finish(solver, results)
+    if warm_start and results.solver.termination_condition == 'optimal':
+        save_solution(m)
+    if verbose:
+        # print('----------------------------------------------------------------------')
+        print('.................................')
 
-    if initial_run:
-        financials.get_system_costing(m.fs)
 
-    TransformationFactory('network.expand_arcs').apply_to(m)
-    seq = SequentialDecomposition()
-    G = seq.create_graph(m)
-
-    if objective:
-        m.fs.objective_function = Objective(expr=m.fs.costing.LCOW)
+def run_model(m=None, solver='ipopt', solver_results=False, objective=False, max_attempts=3, print_it=False, initial_run=True,
+              initialize=True, warm_start=False, persistent=False):
 
-    solver = SolverFactory(solver)
-    # m.fs.solver = solver = SolverFactory('glpk')
+    _run_model(m, solver, solver_results, objective, max_attempts, initial_run, initialize, warm_start, persistent,
+               verbose=True)
 
-    logging.getLogger('pyomo.core').setLevel(logging.ERROR)
+    if print_it:
+        print_results(m)
 
+def run_model_no_print(m=None, solver='ipopt', solver_results=False, objective=False, max_attempts=3, print_it=False, initial_run=True,
+                       initialize=True, warm_start=False, persistent=False):
 
-    m.fs.results = results = solver.solve(m, tee=solver_results)
-    # m.fs.results = results = solver.solve(m, mip_solver='glpk', nlp_solver='ipopt', tee=True)
+    _run_model(m, solver, solver_results, objective, max_attempts, initial_run, initialize, warm_start, persistent,
+               verbose=False)
 
-    attempt_number = 1
-    while ((m.fs.results.solver.termination_condition in ['infeasible', 'maxIterations', 'unbounded']) & (attempt_number <= max_attempts)):
-        # print(f'\nAttempt {attempt_number}:')
-        m.fs.results = results = solver.solve(m, tee=solver_results)
-        # print(f'\n\tWaterTAP3 solver returned {results.solver.termination_condition.swapcase()} solution...')
-        attempt_number += 1
 
+def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', return_df=False, warm_start=False,
+                  use_cache=False, rebuild=False):
+    '''
+    Function to solve a WaterTAP3 treatment train and get the results table.
 
+    For trains with RO, the RO design (pressure, area, A and B) is found with the RO bounds and case study
+    constraints, then fixed for the final solve without them. This is done on the same model: the fixed
+    variables are reset to how they were when the train was built, the constraints added after the first solve
+    are deactivated and the objective is deactivated (see ``get_build_stash`` and ``restore_build_stash``).
+    Intermediate solves whose values do not carry into the final solve are skipped; the number skipped is
+    printed and kept in ``m.fs.solves_saved``.
 
-def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', return_df=False):
+    :param rebuild: Build the train again for the final solve instead (always done for trains with a
+        decision to make)
+    :type rebuild: bool
+    :param use_cache: Return stored results for the same train, data, fixed variable values, code and
+        arguments if there are any, and store the results of runs that solve. On a hit the model is not solved:
+        the system costing, the expanded arcs, the case study constraints and the objective are added and the
+        stored values, fixed variables, active constraints and solver results are loaded, so the model is as
+        if it had been solved. See ``result_cache``. Trains with a decision to make are always solved.
+    :type use_cache: bool
+    '''
 
     print('\n=========================START WT3 MODEL RUN==========================')
     scenario = m.fs.train['scenario']
     case_study = m.fs.train['case_study']
     reference = m.fs.train['reference']
 
-    run_model(m=m, solver=solver, objective=True)
+    # the decision changes the flowsheet, which the stored results do not record
+    use_cache = use_cache and not m.fs.choose
+    if use_cache:
+        cache_key = result_key(m, solver=solver, desired_recovery=desired_recovery, ro_bounds=ro_bounds)
+        cached = get_cached_result(cache_key)
+        if cached is not None:
+            print('\n=========================USING CACHED RESULTS=========================')
+            m = set_up_cached_run(m, cached, case_study, scenario)
+            df = cached['df'].copy()
+            m.fs.run_args = {'solver': solver, 'desired_recovery': desired_recovery, 'ro_bounds': ro_bounds}
+            print('\n==========================END WT3 MODEL RUN===========================')
+            if return_df:
+                return m, df
+            else:
+                return m
+
+    run_model(m=m, solver=solver, objective=True, warm_start=warm_start)
+    # everything added after this is undone in place for the final solve of RO trains
+    build_stash = get_build_stash(m)
 
     if m.fs.results.solver.termination_condition in ['infeasible', 'maxIterations', 'unbounded']:
         raise Exception(f'\nMODEL RUN ABORTED:'
@@ -201,13 +299,13 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
 
     if m.fs.has_ix:
         print('IX solved!\nFixing IX variables...')
-        m, ix_stash = (m)
+        m, ix_stash = get_ix_stash(m)
         m = fix_ix_stash(m, ix_stash)
 
     if m.fs.choose:
         m = make_decision(m, case_study, scenario)
         financials.get_system_costing(m.fs)
-        run_model(m=m, solver=solver, objective=True)
+        run_model(m=m, solver=solver, objective=True, warm_start=warm_start)
         m = case_study_constraints(m, case_study, scenario)
 
 
@@ -234,7 +332,7 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
             m.fs.recovery_bound = Constraint(expr=m.fs.costing.system_recovery <= desired_recovery)
             m.fs.recovery_bound1 = Constraint(expr=m.fs.costing.system_recovery >= desired_recovery - 1.5)
 
-            run_model(m=m, objective=True)
+            run_model(m=m, objective=True, warm_start=warm_start)
             if m.fs.results.solver.termination_condition in ['infeasible', 'maxIterations', 'unbounded']:
                 print(f'\nMODEL RUN ABORTED WHILE TARGETING SYSTEM RECOVERY OF {desired_recovery * 100}:'
                       f'\n\tWT3 solution is {m.fs.results.solver.termination_condition.swapcase()}'
@@ -263,14 +361,19 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
 
 
         ###### RESET BOUNDS AND DOUBLE CHECK RUN IS OK SO CAN GO INTO SENSITIVITY #####
-        if m.fs.new_case_study:
-            new_df_units = m.fs.df_units.copy()
-            m = watertap_setup(dynamic=False, case_study=case_study, scenario=scenario)
-            m = get_case_study(m=m, new_df_units=new_df_units)
+        if rebuild or m.fs.choose:
+            if m.fs.new_case_study:
+                new_df_units = m.fs.df_units.copy()
+                m = watertap_setup(dynamic=False, case_study=case_study, scenario=scenario)
+                m = get_case_study(m=m, new_df_units=new_df_units)
 
+            else:
+                m = watertap_setup(dynamic=False, case_study=case_study, scenario=scenario)
+                m = get_case_study(m=m)
         else:
-            m = watertap_setup(dynamic=False, case_study=case_study, scenario=scenario)
-            m = get_case_study(m=m)
+            m = restore_build_stash(m, build_stash)
+        single_build = not (rebuild or m.fs.choose)
+        solves_saved = 0
 
 
 
@@ -278,7 +381,11 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
             m.fs.evaporation_pond.water_recovery.fix(0.87669)
 
         if case_study == 'upw':
-            run_model(m=m, solver=solver, objective=True)
+            # the values of this solve do not carry into the final solve, so it is only needed on a new model
+            if single_build:
+                solves_saved += 1
+            else:
+                run_model(m=m, solver=solver, objective=True, warm_start=warm_start)
             m.fs.upw_list = upw_list
             m.fs.media_filtration.water_recovery.fix(0.9)
             m.fs.splitter2.split_fraction_outlet3.fix(upw_list[0])
@@ -294,10 +401,18 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
             m.fs.ion_exchange.cation_res_capacity.fix(ur_list[2])
 
         if case_study == 'irwin':
-            run_model(m=m, solver=solver, objective=True)
+            if single_build:
+                solves_saved += 1
+            else:
+                run_model(m=m, solver=solver, objective=True, warm_start=warm_start)
             m.fs.brine_concentrator.water_recovery.fix(0.8)
 
-        run_model(m=m, solver=solver, objective=True)
+        # with the RO design fixed, the final solve only depends on this solve through the IX design, or if
+        # the final problem is not square
+        if single_build and not m.fs.has_ix and degrees_of_freedom(m) == count_ro_stash_free(m, ro_stash):
+            solves_saved += 1
+        else:
+            run_model(m=m, solver=solver, objective=True, warm_start=warm_start)
 
         m.fs.objective_function.deactivate()
         m = fix_ro_stash(m, ro_stash)
@@ -305,8 +420,14 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
             m, ix_stash = get_ix_stash(m)
             m = fix_ix_stash(m, ix_stash)
 
+        m.fs.solves_saved = solves_saved
+        if single_build:
+            print(f'\nFinal solve set up on the same model: skipped rebuilding the train and {solves_saved} solve(s)')
 
-    run_model(m=m, solver=solver, objective=False, print_it=True)
+
+    run_model(m=m, solver=solver, objective=False, print_it=True, warm_start=warm_start)
+    # to solve the same train in other processes (see sweep.build_args)
+    m.fs.run_args = {'solver': solver, 'desired_recovery': desired_recovery, 'ro_bounds': ro_bounds}
 
     if m.fs.results.solver.termination_condition in ['infeasible', 'maxIterations', 'unbounded']:
         print(f'\nFINAL MODEL RUN ABORTED:'
@@ -318,7 +439,11 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
     # if m.fs.has_ro:
     #     print_ro_results(m)
 
-    df = get_results_table(m=m, case_study=case_study, scenario=scenario)
+    with profile_phase(m, 'get_results_table', count=False):
+        df = get_results_table(m=m, case_study=case_study, scenario=scenario)
+
+    if use_cache:
+        store_result(cache_key, m, df)
 
     print('\n==========================END WT3 MODEL RUN===========================')
 
@@ -328,6 +453,30 @@ def run_watertap3(m, solver='ipopt', desired_recovery=1, ro_bounds='seawater', r
         return m
 
 
+def set_up_cached_run(m, cached, case_study, scenario):
+    '''
+    Function to put a model of a treatment train into the solved state of stored ``run_watertap3`` results
+    without solving it: the components the solves add (system costing, expanded arcs, case study constraints
+    and the objective) are added, then the stored values, fixed variables, active constraints and objectives
+    and solver results are loaded (see ``load_cached_solution``).
+
+    :param m: WaterTAP3 model with the treatment train built
+    :param cached: Result from ``get_cached_result``
+    :param case_study: Case study name
+    :type case_study: str
+    :param scenario: Scenario name
+    :type scenario: str
+    :return: Model
+    '''
+    financials.get_system_costing(m.fs)
+    TransformationFactory('network.expand_arcs').apply_to(m)
+    m = case_study_constraints(m, case_study, scenario)
+    if 'fs.objective_function' in cached['objectives']:
+        m.fs.objective_function = Objective(expr=m.fs.costing.LCOW)
+    load_cached_solution(m, cached)
+    return m
+
+
 def get_ix_stash(m):
     m.fs.ix_stash = ix_stash = {}
     for k, v in m.fs.pfd_dict.items():
@@ -377,6 +526,36 @@ def fix_ro_stash(m, ro_stash):
     return m
 
 
+def count_ro_stash_free(m, ro_stash):
+    free = 0
+    for ro in ro_stash.keys():
+        unit = getattr(m.fs, ro)
+        for var in (unit.feed.pressure, unit.membrane_area, unit.a, unit.b):
+            free += sum(1 for v in var.values() if not v.fixed)
+    return free
+
+
+def get_build_stash(m):
+    m.fs.build_stash = build_stash = {
+            'fixed': ComponentMap((v, v.value) for v in m.component_data_objects(Var, descend_into=True) if v.fixed),
+            'constraints': set(c.name for c in m.component_objects(Constraint, active=True, descend_into=True))
+            }
+    return build_stash
+
+
+def restore_build_stash(m, build_stash):
+    for v in m.component_data_objects(Var, descend_into=True):
+        if v in build_stash['fixed']:
+            v.fix(build_stash['fixed'][v])
+        elif v.fixed:
+            v.unfix()
+    for c in m.component_objects(Constraint, active=True, descend_into=True):
+        if c.name not in build_stash['constraints']:
+            c.deactivate()
+    m.fs.objective_function.deactivate()
+    return m
+
+
 def check_has_ro(m):
     has_ro = False
     for key in m.fs.pfd_dict.keys():
@@ -445,167 +624,38 @@ def print_results(m):
     print('\n======================================================================\n')
 
 
-def run_sensitivity(m=None, save_results=False, return_results=False, scenario=None, case_study=None, tds_only=False):
+def run_sensitivity(m=None, save_results=False, return_results=False, scenario=None, case_study=None, tds_only=False,
+                    processes=None, spec=None):
+    '''
+    Function to run the sensitivity analysis of a treatment train solved with ``run_watertap3``. The sweeps are
+    defined in ``default_sensitivity_spec`` and solved with ``run_spec``.
 
+    :param tds_only: Only sweep the inlet TDS, recording the costing totals
+    :type tds_only: bool
+    :param processes: Solve the sweep points in this many processes (see ``sweep.run_sweep``) instead of one
+        after another on ``m``
+    :type processes: int
+    :param spec: Sensitivity specification to run instead of ``default_sensitivity_spec`` (see ``load_spec``)
+    '''
 
     ro_list = ['reverse_osmosis', 'ro_first_pass', 'ro_a1', 'ro_b1',
                'ro_active', 'ro_restore', 'ro_first_stage']
 
-    sens_df = pd.DataFrame()
-
     m_scenario = scenario
-    case_print = m.fs.train['case_study'].replace('_', ' ').swapcase()
-    scenario_print = m.fs.train['scenario'].replace('_', ' ').swapcase()
-
-    m.fs.lcow_list = lcow_list = []
-    m.fs.water_recovery_list = water_recovery_list = []
-    m.fs.scenario_value = scenario_value = []
-    m.fs.scenario_name = scenario_name = []
-    m.fs.elec_lcow = elec_lcow = []
-    m.fs.elec_int = elec_int = []
-    m.fs.baseline_sens_value = baseline_sens_value = []
-    m.fs.baseline_lcows = baseline_lcows = []
-    m.fs.baseline_elect_ints = baseline_elect_ints = []
-    m.fs.lcow_norm = lcow_norm = []
-    m.fs.lcow_diff = lcow_diff = []
-    m.fs.sens_vars = sens_vars = []
-    m.fs.treated_water = treated_water = []
-    m.fs.treated_water_norm = treated_water_norm = []
-    m.fs.elect_int_norm = elect_int_norm = []
-    m.fs.sens_var_norm = sens_var_norm = []
-    m.fs.ro_pressure = ro_pressure = []
-    m.fs.ro_press_norm = ro_press_norm = []
-    m.fs.ro_area = ro_area = []
-    m.fs.ro_area_norm = ro_area_norm = []
-    m.fs.mem_replacement = mem_replacement = []
-
-    baseline_treated_water = value(m.fs.costing.treated_water)
-    baseline_lcow = value(m.fs.costing.LCOW)
-    baseline_elect_int = value(m.fs.costing.electricity_intensity)
-
-    lcow_list.append(value(m.fs.costing.LCOW))
-    water_recovery_list.append(value(m.fs.costing.system_recovery))
-    scenario_value.append('baseline')
-    scenario_name.append(scenario)
-    elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-    elec_int.append(value(m.fs.costing.electricity_intensity))
-    baseline_sens_value.append(np.nan)
-    baseline_lcows.append(baseline_lcow)
-    baseline_elect_ints.append(baseline_elect_int)
-    lcow_norm.append(1)
-    lcow_diff.append(0)
-    sens_vars.append('baseline')
-    treated_water.append(value(m.fs.costing.treated_water))
-    treated_water_norm.append(1)
-    elect_int_norm.append(1)
-    sens_var_norm.append(1)
-    mem_replacement.append(None)
-    ro_pressure.append(None)
-    ro_press_norm.append(None)
-    ro_area.append(None)
-    ro_area_norm.append(None)
-
     runs_per_scenario = 20
 
     if tds_only:
-
-        runs_per_scenario = 10
-
-        lcow = []
-        tci_total = []
-        op_total = []
-        op_annual = []
-        fixed_op_annual = []
-        other_annual = []
-        elect_cost_annual = []
-        elect_intens = []
-        catchem_annual = []
-
-        lcow.append(m.fs.costing.LCOW())
-        tci_total.append(m.fs.costing.capital_investment_total())
-        op_total.append(m.fs.costing.operating_cost_total())
-        op_annual.append(m.fs.costing.operating_cost_annual())
-        fixed_op_annual.append(m.fs.costing.fixed_op_cost_annual())
-        other_annual.append(m.fs.costing.other_var_cost_annual())
-        elect_cost_annual.append(m.fs.costing.electricity_cost_annual())
-        elect_intens.append(m.fs.costing.electricity_intensity())
-        catchem_annual.append(m.fs.costing.cat_and_chem_cost_annual())
-
-        tds_in = False
-
-        for key in m.fs.flow_in_dict:
-            if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-                tds_in = True
-
-        if tds_in:
-            # print('\n-------', 'RESET', '-------\n')
-            run_model_no_print(m=m, objective=False)
-            # print('LCOW -->', m.fs.costing.LCOW())
-
-            ############ Salinity +/- 30% ############
-            stash_value = []
-            tds_list = []
-            for key in m.fs.flow_in_dict:
-                if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-                    stash_value.append(value(getattr(m.fs, key).conc_mass_in[0, 'tds']))
-            # print(stash_value)
-            scenario = 'Inlet TDS +-25%'
-            sens_var = 'tds_in'
-            # print('-------', scenario, '-------')
-            ub = 1.25
-            lb = 0.75
-
-            # if m_scenario in ['edr_ph_ro', 'ro_and_mf']:
-            #     print('redoing upper and lower bounds')
-            #     ub = 80
-            #     lb = 60
-
-            step = (ub - lb) / runs_per_scenario
-
-            for i in np.arange(lb, ub + step, step):
-                q = 0
-                for key in m.fs.flow_in_dict:
-                    if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-                        getattr(m.fs, key).conc_mass_in[0, 'tds'].fix(stash_value[q] * i)
-                        q += 1
-                # print('\n===============================')
-                # print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-                # print('===============================\n')
-                run_model_no_print(m=m, objective=False)
-
-                scenario_value.append(sum(stash_value) * i)
-                scenario_name.append(scenario)
-                lcow.append(m.fs.costing.LCOW())
-                tci_total.append(m.fs.costing.capital_investment_total())
-                op_total.append(m.fs.costing.operating_cost_total())
-                op_annual.append(m.fs.costing.operating_cost_annual())
-                fixed_op_annual.append(m.fs.costing.fixed_op_cost_annual())
-                other_annual.append(m.fs.costing.other_var_cost_annual())
-                elect_cost_annual.append(m.fs.costing.electricity_cost_annual())
-                elect_intens.append(m.fs.costing.electricity_intensity())
-                catchem_annual.append(m.fs.costing.cat_and_chem_cost_annual())
-
-            q = 0
-            for key in m.fs.flow_in_dict:
-                if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-                    getattr(m.fs, key).conc_mass_in[0, 'tds'].fix(stash_value[q])
-                    q += 1
-
-            run_model_no_print(m=m, objective=False)
-
-            sens_df['scenario_name'] = scenario_name
-            sens_df['scenario_value'] = scenario_value
-
-            sens_df['lcow'] = lcow
-            sens_df['tci_total'] = tci_total
-            sens_df['op_total'] = op_total
-            sens_df['op_annual'] = op_annual
-            sens_df['fixed_op_annual'] = fixed_op_annual
-            sens_df['other_annual'] = other_annual
-            sens_df['elect_cost_annual'] = elect_cost_annual
-            sens_df['elect_intens'] = elect_intens
-            sens_df['catchem_annual'] = catchem_annual
-
+        tds_spec = default_sensitivity_spec(runs_per_scenario=10, tds_only=True)
+        if spec_points(m, tds_spec, scenario=m_scenario):
+            baseline = {name: value(m.find_component(path)) for name, path in tds_spec['outputs'].items()}
+            results = run_spec(m, tds_spec, scenario=m_scenario, processes=processes or 1)
+            run_model_no_print(m=m, objective=False, persistent=True)
+
+            sens_df = pd.DataFrame()
+            sens_df['scenario_name'] = [m_scenario, *results.scenario_name]
+            sens_df['scenario_value'] = ['baseline', *results.scenario_value]
+            for name in tds_spec['outputs']:
+                sens_df[name] = [baseline[name], *results[name]]
 
             if save_results:
                 sens_df.to_csv('results/case_studies/%s_%s_sensitivity.csv' % (case_study, m_scenario), index=False)
@@ -614,778 +664,97 @@ def run_sensitivity(m=None, save_results=False, return_results=False, scenario=N
             else:
                 return
 
-            # print('\n====================== END SENSITIVITY ANALYSIS ======================\n')
     print('\n==================== STARTING SENSITIVITY ANALYSIS ===================\n')
-    ############ Plant Capacity Utilization 70-100% ############
-    stash_value = m.fs.costing_param.plant_cap_utilization()
-    scenario = 'Plant Capacity Utilization 70-100%'
-    sens_var = 'plant_cap'
-    print('-------', scenario, '-------')
-    ub = 1
-    lb = 0.7
-    step = (ub - lb) / runs_per_scenario
-    for i in np.arange(lb, ub + step, step):
-
-        m.fs.costing_param.plant_cap_utilization.fix(i)
-
-        run_model(m=m, objective=False)
-
-        print('\n===============================')
-        print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-        print('===============================\n')
-        print(scenario, i * 100, 'LCOW -->', m.fs.costing.LCOW())
-
-        lcow_list.append(value(m.fs.costing.LCOW))
-        water_recovery_list.append(value(m.fs.costing.system_recovery))
-        scenario_value.append(i * 100)
-        scenario_name.append(scenario)
-        elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-        elec_int.append(value(m.fs.costing.electricity_intensity))
-        baseline_sens_value.append(stash_value)
-        baseline_lcows.append(baseline_lcow)
-        baseline_elect_ints.append(baseline_elect_int)
-        lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-        lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-        sens_vars.append(sens_var)
-        treated_water.append(value(m.fs.costing.treated_water))
-        treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-        elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-        sens_var_norm.append(i / stash_value)
-        ro_pressure.append(None)
-        ro_press_norm.append(None)
-        ro_area.append(None)
-        ro_area_norm.append(None)
-        mem_replacement.append(None)
-
-    m.fs.costing_param.plant_cap_utilization.fix(stash_value)
-    ############################################################
-
-    print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
-    print('LCOW -->', m.fs.costing.LCOW())
-
-    ############ WACC 5-10%############
-    stash_value = m.fs.costing_param.wacc()
-    scenario = 'Weighted Average Cost of Capital 5-10%'
-    sens_var = 'wacc'
-    print('-------', scenario, '-------')
-    ub = stash_value + 0.02
-    lb = stash_value - 0.03
-    step = (ub - lb) / runs_per_scenario
-    for i in np.arange(lb, ub + step, step):
-        print('\n===============================')
-        print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-        print('===============================\n')
-        m.fs.costing_param.wacc.fix(i)
-        run_model(m=m, objective=False)
-        print(scenario, i * 100, 'LCOW -->', m.fs.costing.LCOW())
-
-        lcow_list.append(value(m.fs.costing.LCOW))
-        water_recovery_list.append(value(m.fs.costing.system_recovery))
-        scenario_value.append(i * 100)
-        scenario_name.append(scenario)
-        elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-        elec_int.append(value(m.fs.costing.electricity_intensity))
-        baseline_sens_value.append(stash_value)
-        baseline_lcows.append(baseline_lcow)
-        baseline_elect_ints.append(baseline_elect_int)
-        lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-        lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-        sens_vars.append(sens_var)
-        treated_water.append(value(m.fs.costing.treated_water))
-        treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-        elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-        sens_var_norm.append(i / stash_value)
-        ro_pressure.append(None)
-        ro_press_norm.append(None)
-        ro_area.append(None)
-        ro_area_norm.append(None)
-        mem_replacement.append(None)
-
-    m.fs.costing_param.wacc.fix(stash_value)
-    ############################################################
-
-    tds_in = False
-
-    for key in m.fs.flow_in_dict:
-        if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-            tds_in = True
-
-    if tds_in:
-        print('\n-------', 'RESET', '-------\n')
-        run_model(m=m, objective=False)
-        print('LCOW -->', m.fs.costing.LCOW())
-
-        ############ Salinity +/- 30% ############
-        stash_value = []
-        tds_list = []
-        for key in m.fs.flow_in_dict:
-            if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-                stash_value.append(value(getattr(m.fs, key).conc_mass_in[0, 'tds']))
-        print(stash_value)
-        scenario = 'Inlet TDS +-25%'
-        sens_var = 'tds_in'
-        print('-------', scenario, '-------')
-        ub = 1.25
-        lb = 0.75
-
-        # if m_scenario in ['edr_ph_ro', 'ro_and_mf']:
-        #     print('redoing upper and lower bounds')
-        #     ub = 80
-        #     lb = 60
-
-        step = (ub - lb) / runs_per_scenario
-
-        for i in np.arange(lb, ub + step, step):
-            q = 0
-            for key in m.fs.flow_in_dict:
-                if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-                    getattr(m.fs, key).conc_mass_in[0, 'tds'].fix(stash_value[q] * i)
-                    q += 1
-            print('\n===============================')
-            print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-            print('===============================\n')
-            run_model(m=m, objective=False)
-            print(scenario, sum(stash_value) * i, 'LCOW -->', m.fs.costing.LCOW())
-
-            lcow_list.append(value(m.fs.costing.LCOW))
-            water_recovery_list.append(value(m.fs.costing.system_recovery))
-            scenario_value.append(sum(stash_value) * i)
-            scenario_name.append(scenario)
-            elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-            elec_int.append(value(m.fs.costing.electricity_intensity))
-            baseline_sens_value.append(sum(stash_value))
-            baseline_lcows.append(baseline_lcow)
-            baseline_elect_ints.append(baseline_elect_int)
-            lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-            lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-            sens_vars.append(sens_var)
-            treated_water.append(value(m.fs.costing.treated_water))
-            treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-            elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-            sens_var_norm.append(i)
-            ro_pressure.append(None)
-            ro_press_norm.append(None)
-            ro_area.append(None)
-            ro_area_norm.append(None)
-            mem_replacement.append(None)
-
-        q = 0
-        for key in m.fs.flow_in_dict:
-            if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-                getattr(m.fs, key).conc_mass_in[0, 'tds'].fix(stash_value[q])
-                q += 1
-
-    ############################################################
-    if m_scenario not in ['edr_ph_ro', 'ro_and_mf']:
-        if m.fs.train['case_study'] in ['cherokee', 'gila_river']:
-            print('skips RO sens')
-        else:
-            print('\n-------', 'RESET', '-------\n')
-            run_model(m=m, objective=False)
-            print('LCOW -->', m.fs.costing.LCOW())
-            ############ inlet flow +-25% ############
-            m.fs.stash_value = stash_value = []
-            for key in m.fs.flow_in_dict:
-                stash_value.append(value(getattr(m.fs, key).flow_vol_in[0]))
-            scenario = 'Inlet Flow +-25%'
-            sens_var = 'flow_in'
-            print('-------', scenario, '-------')
-            ub = 1.25
-            lb = 0.75
-            step = (ub - lb) / runs_per_scenario
-
-            for i in np.arange(lb, ub + step, step):
-                # q = 0
-                for q, key in enumerate(m.fs.flow_in_dict.keys()):
-                    getattr(m.fs, key).flow_vol_in[0].fix(stash_value[q] * i)  # q += 1
-                print('\n===============================')
-                print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-                print('===============================\n')
-                run_model(m=m, objective=False)
-                print(scenario, stash_value[q] * i, 'LCOW -->', m.fs.costing.LCOW())
-
-                lcow_list.append(value(m.fs.costing.LCOW))
-                water_recovery_list.append(value(m.fs.costing.system_recovery))
-                scenario_value.append(sum(stash_value) * i)
-                scenario_name.append(scenario)
-                elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-                elec_int.append(value(m.fs.costing.electricity_intensity))
-                baseline_sens_value.append(sum(stash_value))
-                baseline_lcows.append(baseline_lcow)
-                baseline_elect_ints.append(baseline_elect_int)
-                lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-                lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-                sens_vars.append(sens_var)
-                treated_water.append(value(m.fs.costing.treated_water))
-                treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-                elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-                sens_var_norm.append(i)
-                ro_pressure.append(None)
-                ro_press_norm.append(None)
-                ro_area.append(None)
-                ro_area_norm.append(None)
-                mem_replacement.append(None)
-
-            for q, key in enumerate(m.fs.flow_in_dict):
-                getattr(m.fs, key).flow_vol_in[0].fix(stash_value[q])
-
-    ############################################################
-    print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
-    print('LCOW -->', m.fs.costing.LCOW())
-    ############ lifetime years ############
-
-    stash_value = value(m.fs.costing_param.plant_lifetime_yrs)
-    scenario = 'Plant Lifetime 15-45 yrs'
-    sens_var = 'plant_life'
-    print('-------', scenario, '-------')
-    ub = 45
-    lb = 15
-    step = (ub - lb) / runs_per_scenario
-    for i in np.arange(lb, ub + step, step):
-        m.fs.costing_param.plant_lifetime_yrs = i
-        print('\n===============================')
-        print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-        print('===============================\n')
-        run_model(m=m, objective=False)
-        print(scenario, i, 'LCOW -->', m.fs.costing.LCOW())
-
-        lcow_list.append(value(m.fs.costing.LCOW))
-        water_recovery_list.append(value(m.fs.costing.system_recovery))
-        scenario_value.append(i)
-        scenario_name.append(scenario)
-        elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-        elec_int.append(value(m.fs.costing.electricity_intensity))
-        baseline_sens_value.append(stash_value)
-        baseline_lcows.append(baseline_lcow)
-        baseline_elect_ints.append(baseline_elect_int)
-        lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-        lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-        sens_vars.append(sens_var)
-        treated_water.append(value(m.fs.costing.treated_water))
-        treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-        elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-        sens_var_norm.append(i - stash_value)
-        ro_pressure.append(None)
-        ro_press_norm.append(None)
-        ro_area.append(None)
-        ro_area_norm.append(None)
-        mem_replacement.append(None)
-
-    m.fs.costing_param.plant_lifetime_yrs = stash_value
-    ############################################################
-    print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
-    print('LCOW -->', m.fs.costing.LCOW())
-    ############ elec cost +-30% ############
-
-    stash_value = value(m.fs.costing_param.electricity_price)
-    scenario = 'Electricity Price +- 30%'
-    sens_var = 'elect_price'
-    print('-------', scenario, '-------')
-    ub = stash_value * 1.3
-    lb = stash_value * 0.7
-    step = (ub - lb) / runs_per_scenario
-    for i in np.arange(lb, ub + step, step):
-        m.fs.costing_param.electricity_price = i
-        print('\n===============================')
-        print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-        print('===============================\n')
-        run_model(m=m, objective=False)
-        print(scenario, i * stash_value, 'LCOW -->', m.fs.costing.LCOW())
-
-        lcow_list.append(value(m.fs.costing.LCOW))
-        water_recovery_list.append(value(m.fs.costing.system_recovery))
-        scenario_value.append(i * stash_value)
-        scenario_name.append(scenario)
-        elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-        elec_int.append(value(m.fs.costing.electricity_intensity))
-        baseline_sens_value.append(stash_value)
-        baseline_lcows.append(baseline_lcow)
-        baseline_elect_ints.append(baseline_elect_int)
-        lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-        lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-        sens_vars.append(sens_var)
-        treated_water.append(value(m.fs.costing.treated_water))
-        treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-        elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-        sens_var_norm.append(i / stash_value)
-        ro_pressure.append(None)
-        ro_press_norm.append(None)
-        ro_area.append(None)
-        ro_area_norm.append(None)
-        mem_replacement.append(None)
-
-    m.fs.costing_param.electricity_price = stash_value
+    sens_df = sensitivity_sweep(m, scenario=m_scenario, runs_per_scenario=runs_per_scenario, ro_list=ro_list,
+                                processes=processes or 1, spec=spec)
 
-    ############################################################
-    print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
-    print('LCOW -->', m.fs.costing.LCOW())
-
-    # dwi_list = ['emwd', 'big_spring', 'kbhdp']
-    # if m.fs.train['case_study'] in dwi_list:
-    for key in m.fs.pfd_dict.keys():
-        if m.fs.pfd_dict[key]['Unit'] == 'deep_well_injection':
-
-            stash_value = value(getattr(m.fs, key).lift_height[0])
-            scenario = 'Injection Pressure LH 100-2000 ft'
-            sens_var = 'dwi_inj_pressure'
-            print('-------', scenario, '-------')
-            ub = 3500
-            lb = 100
-            step = (ub - lb) / runs_per_scenario
-            for i in np.arange(lb, ub + step, step):
-                getattr(m.fs, key).lift_height.fix(i)
-                print('\n===============================')
-                print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-                print('===============================\n')
-                run_model(m=m, objective=False)
-                print(scenario, i, 'LCOW -->', m.fs.costing.LCOW())
-
-                lcow_list.append(value(m.fs.costing.LCOW))
-                water_recovery_list.append(value(m.fs.costing.system_recovery))
-                scenario_value.append(i)
-                scenario_name.append(scenario)
-                elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-                elec_int.append(value(m.fs.costing.electricity_intensity))
-                baseline_sens_value.append(stash_value)
-                baseline_lcows.append(baseline_lcow)
-                baseline_elect_ints.append(baseline_elect_int)
-                lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-                lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-                sens_vars.append(sens_var)
-                treated_water.append(value(m.fs.costing.treated_water))
-                treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-                elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-                sens_var_norm.append(i / stash_value)
-                ro_pressure.append(None)
-                ro_press_norm.append(None)
-                ro_area.append(None)
-                ro_area_norm.append(None)
-                mem_replacement.append(None)
-
-            getattr(m.fs, key).lift_height.fix(stash_value)
-
-    ############################################################
-
-    ############################################################
-    print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
-    print('LCOW -->', m.fs.costing.LCOW())
-    ############ power sens -> adjust recovery of pre-evap pond to see evaporation area needs ############
-
-    # cherokee
-    # set RO recovery for ccro + brine to change, evap pond area unfixed and calculated by model, recovery set at 90%.
-    # same for gila baseline
-
-    m.fs.area_list = area_list = []
-
-    # if m.fs.train['case_study'] == "cherokee" and m_scenario == "zld_ct":
-    #     if 'reverse_osmosis_a' in m.fs.pfd_dict.keys():
-    #         stash_value = value(getattr(m.fs, 'evaporation_pond').area[0])
-    #         cenario = 'Area'
-    #         sens_var = 'evap_pond_area'
-    #         print('-------', scenario, '-------')
-    #
-    #         lb = 0.45
-    #         ub = 0.95
-    #         step = (ub - lb) / 50  # 50 runs
-    #         getattr(m.fs, 'evaporation_pond').water_recovery.fix(0.9)
-    #         getattr(m.fs, 'evaporation_pond').area.unfix()
-    #
-    #
-    #         for recovery_rate in np.arange(lb, ub + step, step):
-    #             m.fs.reverse_osmosis_a.kurby4 = Constraint(
-    #                     expr=m.fs.reverse_osmosis_a.flow_vol_out[0] >=
-    #                          (recovery_rate * m.fs.reverse_osmosis_a.flow_vol_in[0]))
-    #             print('\n===============================')
-    #             print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-    #             print('===============================\n')
-    #             run_model(m=m, objective=False)
-    #             print(scenario, recovery_rate, 'LCOW -->', m.fs.costing.LCOW())
-    #
-    #             lcow_list.append(value(m.fs.costing.LCOW))
-    #             water_recovery_list.append(value(m.fs.costing.system_recovery))
-    #             scenario_value.append(recovery_rate)
-    #             scenario_name.append(scenario)
-    #             elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-    #             elec_int.append(value(m.fs.costing.electricity_intensity))
-    #             area_list.append(value(m.fs.evaporation_pond.area[0]))
-    #
-    #         getattr(m.fs, key).water_recovery.unfix()
-    #         getattr(m.fs, key).area.fix(stash_value)
-    #         df_area = pd.DataFrame(area_list)
-    #         df_area.to_csv('results/case_studies/area_list_%s_%s_%s.csv' % (
-    #                 m.fs.train['case_study'], m_scenario, key))
-
-    #         for key in m.fs.pfd_dict.keys():
-    #             if m.fs.pfd_dict[key]['Unit'] == 'evaporation_pond':
-
-    #                 stash_value = value(getattr(m.fs, key).area[0])
-    #                 scenario = 'Area'
-    #                 sens_var = 'evap_pond_area'
-    #                 print('-------', scenario, '-------')
-    #                 if m.fs.train['case_study'] == 'cherokee':
-    #                     ub = 1.5
-    #                     lb = 0.75
-    #                 if m.fs.train['case_study'] == 'gila_river':
-    #                     lb = 0.5
-    #                     ub = 1.05
-    #                 step = (ub - lb) / 50  # 50 runs
-    #                 for i in np.arange(lb, ub + step, step):
-    #                     getattr(m.fs, key).area.fix(i * stash_value)
-    #                     getattr(m.fs, key).water_recovery.unfix()
-    #                     run_model(m=m, objective=False)
-    #                     print(scenario, i * stash_value, 'LCOW -->', m.fs.costing.LCOW())
-
-    #                     lcow_list.append(value(m.fs.costing.LCOW))
-    #                     water_recovery_list.append(value(m.fs.costing.system_recovery))
-    #                     scenario_value.append(i * stash_value)
-    #                     scenario_name.append(scenario)
-    #                     elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-    #                     elec_int.append(value(m.fs.costing.electricity_intensity))
-    #                     area_list.append(value(m.fs.evaporation_pond.area[0]))
-
-    #                 getattr(m.fs, key).area.fix(stash_value)
-    #                 df_area = pd.DataFrame(area_list)
-    #                 df_area.to_csv('results/case_studies/area_list_%s_%s_%s.csv' % (
-    #                         m.fs.train['case_study'], m_scenario, key))
-
-    ############################################################
-    print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
-    print('LCOW -->', m.fs.costing.LCOW())
-    ############ RO scenarios --> pressure % change, membrane area, replacement rate% ############
-
-    if m_scenario not in ['edr_ph_ro', 'ro_and_mf']:
-        if m.fs.train['case_study'] in ['cherokee', 'gila_river', 'upw']:
-            print('skips RO sens')
-        else:
-            for key in m.fs.pfd_dict.keys():
-                if m.fs.pfd_dict[key]['Unit'] == 'reverse_osmosis':
-                    if key in ro_list:
-                        # if m.fs.train['case_study'] == 'ocwd':
-                        #     m.fs.del_component(m.fs.ro_pressure_constr)
-                        area = value(getattr(m.fs, key).membrane_area[0])
-                        scenario_dict = {
-                                'membrane_area': [-area * 0.2, area * 0.2],
-                                'pressure': [0.85, 1.15],
-                                'factor_membrane_replacement': [-0.1, 0.3]
-                                }
-                        for scenario in scenario_dict.keys():
-
-                            print('\n-------', 'RESET', '-------\n')
-                            run_model(m=m, objective=False)
-                            print('LCOW -->', m.fs.costing.LCOW())
-
-                            print('-------', scenario, '-------')
-                            if scenario == 'pressure':
-                                stash_value = value(getattr(getattr(getattr(m.fs, key), 'feed'), scenario)[0])
-                                ub = stash_value * scenario_dict[scenario][1]
-                                lb = stash_value * scenario_dict[scenario][0]
-                            else:
-                                stash_value = value(getattr(getattr(m.fs, key), scenario)[0])
-                                ub = stash_value + scenario_dict[scenario][1]
-                                lb = stash_value + scenario_dict[scenario][0]
-
-                            step = (ub - lb) / runs_per_scenario
-
-                            for i in np.arange(lb, ub + step, step):
-                                if scenario == 'pressure':
-                                    getattr(getattr(getattr(m.fs, key), 'feed'), scenario).fix(i)
-                                else:
-                                    getattr(getattr(m.fs, key), scenario).fix(i)
-                                print('\n===============================')
-                                print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-                                print('===============================\n')
-                                run_model(m=m, objective=False)
-                                print(scenario, i, 'LCOW -->', m.fs.costing.LCOW())
-
-                                lcow_list.append(value(m.fs.costing.LCOW))
-                                water_recovery_list.append(value(m.fs.costing.system_recovery))
-                                scenario_value.append(i)
-                                scenario_name.append(key + '_' + scenario)
-                                elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-                                elec_int.append(value(m.fs.costing.electricity_intensity))
-                                baseline_sens_value.append(stash_value)
-                                baseline_lcows.append(baseline_lcow)
-                                baseline_elect_ints.append(baseline_elect_int)
-                                lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-                                lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-                                sens_vars.append(key + '_' + scenario)
-                                treated_water.append(value(m.fs.costing.treated_water))
-                                treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-                                elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-                                sens_var_norm.append(i / stash_value)
-                                ro_pressure.append(value(getattr(getattr(getattr(m.fs, key), 'feed'), 'pressure')[0]))
-                                ro_area.append(value(getattr(getattr(m.fs, key), 'membrane_area')[0]))
-                                mem_replacement.append(value(getattr(getattr(m.fs, key), 'factor_membrane_replacement')[0]))
-                                if scenario == 'pressure':
-                                    ro_press_norm.append(ro_pressure[-1] / stash_value)
-                                    ro_area_norm.append(None)
-                                elif scenario == 'membrane_area':
-                                    ro_area_norm.append(ro_area[-1] / stash_value)
-                                    ro_press_norm.append(None)
-                                elif scenario == 'factor_membrane_replacement':
-                                    ro_area_norm.append(None)
-                                    ro_press_norm.append(None)
-
-                            if scenario == 'pressure':
-                                getattr(getattr(getattr(m.fs, key), 'feed'), scenario).fix(stash_value)
-                            else:
-                                getattr(getattr(m.fs, key), scenario).fix(stash_value)
-
-    ############################################################
-    # in depth sens analysis #
-    # if m.fs.train['case_study'] in ['san_luis']:
-    #
-    #     tds_in = False
-    #
-    #     for key in m.fs.flow_in_dict:
-    #         if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-    #             tds_in = True
-    #
-    #     if tds_in is True:
-    #         print('\n-------', 'RESET', '-------\n')
-    #         run_model(m=m, objective=False)
-    #         print('LCOW -->', m.fs.costing.LCOW())
-    #
-    #         ############ salinity  +-30% ############
-    #         stash_value = []
-    #         for key in m.fs.flow_in_dict:
-    #             if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-    #                 stash_value.append(value(getattr(m.fs, key).conc_mass_in[0, 'tds']))
-    #         print(stash_value)
-    #         scenario = 'Inlet TDS +-25%'
-    #         print('-------', scenario, '-------')
-    #         ub = 1.25
-    #         lb = 0.75
-    #
-    #         step = (ub - lb) / 1000
-    #
-    #         for i in np.arange(lb, ub + step, step):
-    #             q = 0
-    #             for key in m.fs.flow_in_dict:
-    #                 if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-    #                     getattr(m.fs, key).conc_mass_in[0, 'tds'].fix(stash_value[q] * i)
-    #                     q += 1
-    #             print('\n===============================')
-    #             print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-    #             print('===============================\n')
-    #             run_model(m=m, objective=False)
-    #             print(scenario, sum(stash_value) * i, 'LCOW -->', m.fs.costing.LCOW())
-    #
-    #             lcow_list.append(value(m.fs.costing.LCOW))
-    #             water_recovery_list.append(value(m.fs.costing.system_recovery))
-    #             scenario_value.append(sum(stash_value) * i)
-    #             scenario_name.append(scenario)
-    #             elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-    #             elec_int.append(value(m.fs.costing.electricity_intensity))
-    #
-    #         q = 0
-    #         for key in m.fs.flow_in_dict:
-    #             if 'tds' in list(getattr(m.fs, key).config.property_package.component_list):
-    #                 getattr(m.fs, key).conc_mass_in[0, 'tds'].fix(stash_value[q])
-    #                 q += 1
-
-    ############################################################
-    ############################################################
-    ############################################################
-    ############################################################
-
-    # toc_in = False
-    # for key in m.fs.flow_in_dict:
-    #     if 'toc' in list(getattr(m.fs, key).config.property_package.component_list):
-    #         toc_in = True
-    #
-    # if toc_in:
-    #     print('\n-------', 'RESET', '-------\n')
-    #     run_model(m=m, objective=False)
-    #     print('LCOW -->', m.fs.costing.LCOW())
-    #
-    #     ############ TOC  +-30% ############
-    #     stash_value = []
-    #     for key in m.fs.flow_in_dict:
-    #         if 'toc' in list(getattr(m.fs, key).config.property_package.component_list):
-    #             stash_value.append(value(getattr(m.fs, key).conc_mass_in[0, 'toc']))
-    #     print(stash_value)
-    #     scenario = 'Inlet TOC +-25%'
-    #     sens_var = 'toc_in'
-    #     print('-------', scenario, '-------')
-    #     ub = 1.25
-    #     lb = 0.75
-    #
-    #     step = (ub - lb) / runs_per_scenario
-    #
-    #     for i in np.arange(lb, ub + step, step):
-    #         q = 0
-    #         for key in m.fs.flow_in_dict:
-    #             if 'toc' in list(getattr(m.fs, key).config.property_package.component_list):
-    #                 getattr(m.fs, key).conc_mass_in[0, 'toc'].fix(stash_value[q] * i)
-    #                 q += 1
-    #         print('\n===============================')
-    #         print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-    #         print('===============================\n')
-    #         run_model(m=m, objective=False)
-    #         print(scenario, sum(stash_value) * i, 'LCOW -->', m.fs.costing.LCOW())
-    #
-    #         lcow_list.append(value(m.fs.costing.LCOW))
-    #         water_recovery_list.append(value(m.fs.costing.system_recovery))
-    #         scenario_value.append(sum(stash_value) * i)
-    #         scenario_name.append(scenario)
-    #         elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-    #         elec_int.append(value(m.fs.costing.electricity_intensity))
-    #         baseline_sens_value.append(stash_value)
-    #         baseline_lcows.append(baseline_lcow)
-    #         baseline_elect_ints.append(baseline_elect_int)
-    #         lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-    #         lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-    #         sens_vars.append(sens_var)
-    #         treated_water.append(value(m.fs.costing.treated_water))
-    #         treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-    #         elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-    #         sens_var_norm.append(i / stash_value)
-    #
-    #
-    #     q = 0
-    #     for key in m.fs.flow_in_dict:
-    #         if 'toc' in list(getattr(m.fs, key).config.property_package.component_list):
-    #             getattr(m.fs, key).conc_mass_in[0, 'toc'].fix(stash_value[q])
-    #             q += 1
-
-    print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
-    print('LCOW -->', m.fs.costing.LCOW())
-
-    ############ Component Replacement Costs -75% ############
-    stash_value = m.fs.costing_param.maintenance_costs_percent_FCI()
-
-    print(stash_value)
-    scenario = 'Component Replacement Costs -75%'
-    sens_var = 'component_replacement'
-    print('-------', scenario, '-------')
-    ub = 1
-    lb = 0.1
-
-    step = (ub - lb) / runs_per_scenario
-
-    for i in np.arange(lb, ub + step, step):
-        m.fs.costing_param.maintenance_costs_percent_FCI.fix(stash_value * i)
-        print('\n===============================')
-        print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}')
-        print('===============================\n')
-        run_model(m=m, objective=False)
-        print(scenario, stash_value * i, 'LCOW -->', m.fs.costing.LCOW())
-
-        lcow_list.append(value(m.fs.costing.LCOW))
-        water_recovery_list.append(value(m.fs.costing.system_recovery))
-        scenario_value.append(stash_value * i)
-        scenario_name.append(scenario)
-        elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-        elec_int.append(value(m.fs.costing.electricity_intensity))
-        baseline_sens_value.append(stash_value)
-        baseline_lcows.append(baseline_lcow)
-        baseline_elect_ints.append(baseline_elect_int)
-        lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-        lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-        sens_vars.append(sens_var)
-        treated_water.append(value(m.fs.costing.treated_water))
-        treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-        elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-        sens_var_norm.append((stash_value * i) / stash_value)
-        ro_pressure.append(None)
-        ro_press_norm.append(None)
-        ro_area.append(None)
-        ro_area_norm.append(None)
-        mem_replacement.append(None)
-    m.fs.costing_param.maintenance_costs_percent_FCI.fix(stash_value)
-    ############################################################
-    ############################################################
-    ############################################################
-    ############################################################
+    if save_results:
+        sens_df.to_csv('results/case_studies/%s_%s_sensitivity.csv' % (case_study, m_scenario), index=False)
+    print('\n====================== END SENSITIVITY ANALYSIS ======================\n')
+    if return_results:
+        return sens_df
 
-    if m.fs.train['case_study'] in ['monterey_one']:
-        stash_value = m.fs.coag_and_floc.alum_dose[0]()
-        print(stash_value)
-        scenario = 'Alum Dose 0.5-20 mg/L'
-        sens_var = 'alum_dose'
-        print('-------', scenario, '-------')
-        ub = 0.020
-        lb = 0.0005
-        step = (ub - lb) / runs_per_scenario
-        for i in np.arange(lb, ub + step, step):
-            m.fs.coag_and_floc.alum_dose.fix(i)
-            print('\n===============================')
-            print(f'CASE STUDY = {case_print}\nSCENARIO = {scenario_print}\n')
-            print('===============================\n')
-            run_model(m=m, objective=False)
-            print(scenario, i, 'LCOW -->', m.fs.costing.LCOW())
-
-            lcow_list.append(value(m.fs.costing.LCOW))
-            water_recovery_list.append(value(m.fs.costing.system_recovery))
-            scenario_value.append(i)
-            scenario_name.append(scenario)
-            elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-            elec_int.append(value(m.fs.costing.electricity_intensity))
-            baseline_sens_value.append(value(stash_value))
-            baseline_lcows.append(baseline_lcow)
-            baseline_elect_ints.append(baseline_elect_int)
-            lcow_norm.append(value(m.fs.costing.LCOW) / baseline_lcow)
-            lcow_diff.append(value(m.fs.costing.LCOW) - baseline_lcow)
-            sens_vars.append(sens_var)
-            treated_water.append(value(m.fs.costing.treated_water))
-            treated_water_norm.append(value(m.fs.costing.treated_water) / baseline_treated_water)
-            elect_int_norm.append(value(m.fs.costing.electricity_intensity) / baseline_elect_int)
-            sens_var_norm.append(value(i / stash_value))
-            ro_pressure.append(None)
-            ro_press_norm.append(None)
-            ro_area.append(None)
-            ro_area_norm.append(None)
-            mem_replacement.append(None)
-
-        m.fs.coag_and_floc.alum_dose.fix(stash_value)
 
-    ############################################################
+def sensitivity_sweep(m, scenario=None, runs_per_scenario=20, ro_list=None, processes=None, spec=None):
+    '''
+    Function to solve the sensitivity analysis points of ``run_sensitivity`` (see ``default_sensitivity_spec``) with
+    ``run_spec`` and get the sensitivity table.
+
+    :param m: WaterTAP3 model solved with ``run_watertap3``
+    :param scenario: Scenario name of the train
+    :type scenario: str
+    :param runs_per_scenario: Number of steps in each sweep
+    :type runs_per_scenario: int
+    :param ro_list: Names of the RO units to sweep
+    :type ro_list: list
+    :param processes: Number of processes (all cores if None)
+    :type processes: int
+    :param spec: Specification to run instead of ``default_sensitivity_spec`` (see ``load_spec``)
+    :return: Sensitivity table
+    :rtype: DataFrame
+    '''
+    if spec is None:
+        spec = default_sensitivity_spec(runs_per_scenario=runs_per_scenario, ro_list=ro_list)
+    baseline_lcow = value(m.fs.costing.LCOW)
+    baseline_treated_water = value(m.fs.costing.treated_water)
+    baseline_elect_int = value(m.fs.costing.electricity_intensity)
+    baseline = pd.DataFrame([{
+            'sens_var': 'baseline',
+            'scenario_name': scenario,
+            'scenario_value': 'baseline',
+            'baseline_sens_value': np.nan,
+            'sens_var_norm': 1,
+            'lcow': baseline_lcow,
+            'water_recovery': value(m.fs.costing.system_recovery),
+            'treated_water': baseline_treated_water,
+            'elec_lcow': value(m.fs.costing.elec_frac_LCOW),
+            'elec_int': baseline_elect_int
+            }])
+
+    results = run_spec(m, spec, scenario=scenario, processes=processes)
+    failed = results.termination != 'optimal'
+    if failed.any():
+        print(f'{failed.sum()} sensitivity point(s) did not solve optimally')
+    results = pd.concat([baseline, results], ignore_index=True)
 
     # final run to get baseline numbers again
-    run_model(m=m, objective=True)
+    run_model(m=m, objective=True, persistent=True)
+
+    ro_scenario = results.ro_scenario if 'ro_scenario' in results else pd.Series(None, index=results.index)
+    for name in ['ro_pressure', 'ro_area', 'mem_replacement']:
+        if name not in results:
+            results[name] = np.nan
+    ro_baseline = pd.to_numeric(results.baseline_sens_value, errors='coerce')
 
-    sens_df['sensitivity_var'] = sens_vars
-    sens_df['baseline_sens_value'] = baseline_sens_value
-    sens_df['scenario_value'] = scenario_value
-    sens_df['sensitivity_var_norm'] = sens_var_norm
-    sens_df['lcow'] = lcow_list
-    sens_df['lcow_norm'] = lcow_norm
-    sens_df['lcow_diff'] = lcow_diff
-    sens_df['baseline_lcow'] = baseline_lcows
-    sens_df['water_recovery'] = water_recovery_list
-    sens_df['treated_water_vol'] = treated_water
+    sens_df = pd.DataFrame()
+    sens_df['sensitivity_var'] = results.sens_var
+    sens_df['baseline_sens_value'] = results.baseline_sens_value
+    sens_df['scenario_value'] = results.scenario_value
+    sens_df['sensitivity_var_norm'] = results.sens_var_norm
+    sens_df['lcow'] = results.lcow
+    sens_df['lcow_norm'] = results.lcow / baseline_lcow
+    sens_df['lcow_diff'] = results.lcow - baseline_lcow
+    sens_df['baseline_lcow'] = baseline_lcow
+    sens_df['water_recovery'] = results.water_recovery
+    sens_df['treated_water_vol'] = results.treated_water
     sens_df['baseline_treated_water'] = baseline_treated_water
-    sens_df['treated_water_norm'] = treated_water_norm
-    sens_df['elec_lcow'] = elec_lcow
-    sens_df['baseline_elect_int'] = baseline_elect_ints
-    sens_df['elec_int'] = elec_int
-    sens_df['elect_int_norm'] = elect_int_norm
-    sens_df['scenario_name'] = scenario_name
+    sens_df['treated_water_norm'] = results.treated_water / baseline_treated_water
+    sens_df['elec_lcow'] = results.elec_lcow
+    sens_df['baseline_elect_int'] = baseline_elect_int
+    sens_df['elec_int'] = results.elec_int
+    sens_df['elect_int_norm'] = results.elec_int / baseline_elect_int
+    sens_df['scenario_name'] = results.scenario_name
     sens_df['lcow_difference'] = sens_df.lcow - value(m.fs.costing.LCOW)
     sens_df['water_recovery_difference'] = (sens_df.water_recovery - value(m.fs.costing.system_recovery))
     sens_df['elec_lcow_difference'] = (sens_df.elec_lcow - value(m.fs.costing.elec_frac_LCOW))
     sens_df.elec_lcow = sens_df.elec_lcow * 100
     sens_df.water_recovery = sens_df.water_recovery * 100
-    sens_df['ro_pressure'] = ro_pressure
-    sens_df['ro_press_norm'] = ro_press_norm
-    sens_df['ro_area'] = ro_area
-    sens_df['ro_area_norm'] = ro_area_norm
-    sens_df['mem_replacement'] = mem_replacement
-
-    if save_results:
-        sens_df.to_csv('results/case_studies/%s_%s_sensitivity.csv' % (case_study, m_scenario), index=False)
-    if return_results:
-        return sens_df
-
-    print('\n====================== END SENSITIVITY ANALYSIS ======================\n')
+    sens_df['ro_pressure'] = results.ro_pressure
+    sens_df['ro_press_norm'] = (results.ro_pressure / ro_baseline).where(ro_scenario == 'pressure')
+    sens_df['ro_area'] = results.ro_area
+    sens_df['ro_area_norm'] = (results.ro_area / ro_baseline).where(ro_scenario == 'membrane_area')
+    sens_df['mem_replacement'] = results.mem_replacement
+    return sens_df
 
 
 def print_ro_results(m, ro_name):
@@ -1844,191 +1213,45 @@ def make_decision(m, case_study, scenario):
     # return m
 
 def run_sensitivity_power(m=None, save_results=False, return_results=False, scenario=None,
-                          case_study=None):
-    ro_list = ['reverse_osmosis', 'ro_first_pass', 'ro_a1', 'ro_b1', 'ro_active', 'ro_restore']
+                          case_study=None, processes=None):
+    '''
+    Function to run the evaporation pond area sweeps of ``power_sensitivity_spec`` on a treatment train solved
+    with ``run_watertap3``.
 
-    sens_df = pd.DataFrame()
+    :param processes: Solve the sweep points in this many processes (see ``sweep.run_sweep``) instead of one
+        after another on ``m``
+    :type processes: int
+    '''
 
     m_scenario = scenario
 
-    m.fs.lcow_list = lcow_list = []
-    m.fs.water_recovery_list = water_recovery_list = []
-    m.fs.scenario_value = scenario_value = []
-    m.fs.scenario_name = scenario_name = []
-    m.fs.elec_lcow = elec_lcow = []
-    m.fs.elec_int = elec_int = []
-    m.fs.treated_water = treated_water = []
-    m.fs.bc_elec = bc_elec = []
-    m.fs.ro_elec = ro_elec = []
-
-    m.fs.ro_a_pressure = ro_a_pressure = []
-    m.fs.ro_a_elect_int = ro_a_elect_int = []
-    m.fs.ro_a_elect_cost = ro_a_elect_cost = []
-    m.fs.ro_a_recovery = ro_a_recovery = []
-    m.fs.ro_a_capital = ro_a_capital = []
-    m.fs.ro_a_om = ro_a_om = []
-    m.fs.ro_a_flow_in = ro_a_flow_in = []
-    m.fs.ro_a_flow_out = ro_a_flow_out = []
-    m.fs.ro_a_area = ro_a_area = []
-    m.fs.ro_a_tds_in = ro_a_tds_in = []
-    m.fs.ro_a_tds_out = ro_a_tds_out = []
-    m.fs.ro_a_flux = ro_a_flux = []
-    m.fs.ro_a_mass_h2o = ro_a_mass_h2o = []
-    m.fs.ro_a_f_osm = ro_a_f_osm = []
-    m.fs.ro_a_r_osm = ro_a_r_osm = []
-    m.fs.ro_a_mass_tds = ro_a_mass_tds = []
-    m.fs.ro_a_salt_rej = ro_a_salt_rej = []
-    m.fs.landfill_zld_tds = landfill_zld_tds = []
-
-    m.fs.ro_pressure = ro_pressure = []
-    m.fs.ro_elect_int = ro_elect_int = []
-    m.fs.ro_elect_cost = ro_elect_cost = []
-    m.fs.ro_recovery = ro_recovery = []
-    m.fs.sys_elec = sys_elec = []
-    m.fs.sys_elec_int = sys_elec_int = []
-    m.fs.evap_flow_out = evap_flow_out = []
-    m.fs.evap_flow_waste = evap_flow_waste = []
-    m.fs.evap_capital = evap_capital = []
-    m.fs.area_list = area_list = []
-
-    if m.fs.train['case_study'] == "cherokee" and m_scenario == "zld_ct":
-        if 'reverse_osmosis_a' in m.fs.pfd_dict.keys():
-            stash_value = value(getattr(m.fs, 'evaporation_pond').area[0])
-            scenario = 'Area'
-            sens_var = 'evap_pond_area'
-            print('-------', scenario, '-------')
-            lb = 0.45
-            ub = 0.96
-            step = (ub - lb) / 50  # 50 runs
-            getattr(m.fs, 'evaporation_pond').water_recovery.fix(0.9)
-            getattr(m.fs, 'evaporation_pond').area.unfix()
-            m.fs.reverse_osmosis_a.feed.pressure.unfix()
-            m.fs.reverse_osmosis_a.membrane_area.unfix()
-
-            for recovery_rate in np.arange(lb, ub, step):
-                m.fs.reverse_osmosis_a.kurby4 = Constraint(expr=m.fs.reverse_osmosis_a.flow_vol_out[0] <= (recovery_rate * m.fs.reverse_osmosis_a.flow_vol_in[0]))
-
-                run_model(m=m, objective=True)
-                print(scenario, recovery_rate, 'LCOW -->', m.fs.costing.LCOW())
-
-                # print('evap pond recovery:', getattr(m.fs, 'evaporation_pond').water_recovery[0]())
-                # print('evap pond area:', getattr(m.fs, 'evaporation_pond').area[0]())
-                # print('RO recovery:', m.fs.reverse_osmosis_a.flow_vol_out[0]() / m.fs.reverse_osmosis_a.flow_vol_in[0]())
-
-                lcow_list.append(value(m.fs.costing.LCOW))
-                water_recovery_list.append(value(m.fs.costing.system_recovery))
-                scenario_value.append(recovery_rate)
-                scenario_name.append(scenario)
-                elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-                elec_int.append(value(m.fs.costing.electricity_intensity))
-                area_list.append(value(m.fs.evaporation_pond.area[0]))
-                treated_water.append(m.fs.costing.treated_water())
-                ro_a_elect_cost.append(m.fs.reverse_osmosis_a.costing.electricity_cost())
-                ro_a_elect_int.append(m.fs.reverse_osmosis_a.electricity())
-                ro_a_pressure.append(m.fs.reverse_osmosis_a.feed.pressure[0]())
-
-                ro_a_recovery.append(m.fs.reverse_osmosis_a.ro_recovery())
-                ro_a_capital.append(m.fs.reverse_osmosis_a.costing.total_cap_investment())
-                ro_a_om.append(m.fs.reverse_osmosis_a.costing.annual_op_main_cost())
-                ro_a_flow_in.append(m.fs.reverse_osmosis_a.flow_vol_in[0]())
-                ro_a_flow_out.append(m.fs.reverse_osmosis_a.flow_vol_out[0]())
-                ro_a_area.append(m.fs.reverse_osmosis_a.membrane_area[0]())
-                ro_a_tds_in.append(m.fs.reverse_osmosis_a.conc_mass_in[0, 'tds']())
-                ro_a_tds_out.append(m.fs.reverse_osmosis_a.conc_mass_out[0, 'tds']())
-                ro_a_flux.append(m.fs.reverse_osmosis_a.flux_lmh())
-                ro_a_mass_h2o.append(m.fs.reverse_osmosis_a.permeate.mass_flow_H2O[0]())
-                ro_a_f_osm.append(m.fs.reverse_osmosis_a.feed.pressure_osm[0]())
-                ro_a_r_osm.append(m.fs.reverse_osmosis_a.retentate.pressure_osm[0]())
-                ro_a_mass_tds.append(m.fs.reverse_osmosis_a.permeate.mass_flow_tds[0]())
-                ro_a_salt_rej.append(m.fs.reverse_osmosis_a.salt_rejection_conc())
-
-                landfill_zld_tds.append(m.fs.landfill_zld.conc_mass_in[0, 'tds']())
-                ro_elect_cost.append(m.fs.boiler_ro.costing.electricity_cost())
-                ro_pressure.append(m.fs.boiler_ro.feed.pressure[0]())
-                ro_elect_int.append(m.fs.boiler_ro.electricity())
-                ro_recovery.append(m.fs.boiler_ro.ro_recovery())
-                sys_elec.append(m.fs.costing.electricity_cost_annual())
-                sys_elec_int.append(m.fs.costing.electricity_intensity())
-                evap_flow_out.append(m.fs.evaporation_pond.flow_vol_out[0]())
-                evap_flow_waste.append(m.fs.evaporation_pond.flow_vol_waste[0]())
-                evap_capital.append(m.fs.evaporation_pond.costing.total_cap_investment())
-
-                # print('Electricity intensity', elec_int[-1])
-                # print('Electricity intensity RO:', m.fs.reverse_osmosis_a.costing.elec_int_treated())
-                # print('Electricity cost RO-A:', m.fs.reverse_osmosis_a.costing.electricity_cost())
-                # print('Electricity intensity RO-B:', m.fs.boiler_ro.electricity())
-                # print('Treated water:', m.fs.costing.treated_water())
-                # print('Area', area_list)
-                # print_ro_results(m)
-            getattr(m.fs, 'evaporation_pond').water_recovery.unfix()
-            getattr(m.fs, 'evaporation_pond').area.fix(stash_value)
-
-    if m.fs.train['case_study'] == "gila_river" and m_scenario == "baseline":
-        if 'reverse_osmosis' in m.fs.pfd_dict.keys():
-            stash_value = value(getattr(m.fs, 'evaporation_pond').area[0])
-            scenario = 'Area'
-            sens_var = 'evap_pond_area'
-            print('-------', scenario, '-------')
-
-            lb = 0.45
-            ub = 0.90
-            step = (ub - lb) / 50  # 50 runs
-            getattr(m.fs, 'evaporation_pond').water_recovery.fix(0.9)
-            getattr(m.fs, 'evaporation_pond').area.unfix()
-
-            m.fs.reverse_osmosis.feed.pressure.unfix()
-            m.fs.reverse_osmosis.membrane_area.unfix()
-
-            for recovery_rate in np.arange(lb, ub, step):
-                m.fs.reverse_osmosis.kurby4 = Constraint(expr=m.fs.reverse_osmosis.flow_vol_out[0] <= (recovery_rate * m.fs.reverse_osmosis.flow_vol_in[0]))
-
-                m.fs.brine_concentrator.water_recovery.fix(recovery_rate)
-
-                run_model(m=m, objective=True)
-                print(scenario, recovery_rate, 'LCOW -->', m.fs.costing.LCOW())
-
-                print('evap pond recovery:', getattr(m.fs, 'evaporation_pond').water_recovery[0]())
-                print('evap pond area:', getattr(m.fs, 'evaporation_pond').area[0]())
-                print('RO recovery:', m.fs.reverse_osmosis.flow_vol_out[0]() / m.fs.reverse_osmosis.flow_vol_in[0]())
-                lcow_list.append(value(m.fs.costing.LCOW))
-                water_recovery_list.append(value(m.fs.costing.system_recovery))
-                scenario_value.append(recovery_rate)
-                scenario_name.append(scenario)
-                elec_lcow.append(value(m.fs.costing.elec_frac_LCOW))
-                elec_int.append(value(m.fs.costing.electricity_intensity))
-                area_list.append(value(m.fs.evaporation_pond.area[0]))
-                treated_water.append(m.fs.costing.treated_water())
-                ro_a_elect_cost.append(m.fs.costing.electricity_cost_annual())
-                bc_elec.append(m.fs.brine_concentrator.costing.electricity_cost())
-                ro_elec.append(m.fs.reverse_osmosis.costing.electricity_cost())
-                sys_elec.append(m.fs.costing.electricity_cost_annual())
-                sys_elec_int.append(m.fs.costing.electricity_intensity())
-
-            getattr(m.fs, 'evaporation_pond').water_recovery.unfix()
-            getattr(m.fs, 'evaporation_pond').area.fix(stash_value)
+    results = run_spec(m, power_sensitivity_spec(), scenario=m_scenario, processes=processes or 1)
+    for row in results.itertuples():
+        print(row.scenario_name, row.scenario_value, 'LCOW -->', row.lcow)
 
     ############################################################
     # final run to get baseline numbers again
     print('\n-------', 'RESET', '-------\n')
-    run_model(m=m, objective=False)
+    run_model(m=m, objective=False, persistent=True)
     print('LCOW -->', m.fs.costing.LCOW())
 
-    run_model(m=m, objective=True)
+    run_model(m=m, objective=True, persistent=True)
 
-    sens_df['lcow'] = lcow_list
-    sens_df['water_recovery'] = water_recovery_list
-    sens_df['elec_lcow'] = elec_lcow
-    sens_df['elec_int'] = elec_int
-    sens_df['scenario_value'] = scenario_value
-    sens_df['scenario_name'] = scenario_name
+    sens_df = pd.DataFrame()
+    sens_df['lcow'] = results.lcow
+    sens_df['water_recovery'] = results.water_recovery
+    sens_df['elec_lcow'] = results.elec_lcow
+    sens_df['elec_int'] = results.elec_int
+    sens_df['scenario_value'] = results.scenario_value
+    sens_df['scenario_name'] = results.scenario_name
     sens_df['lcow_difference'] = sens_df.lcow - value(m.fs.costing.LCOW)
     sens_df['water_recovery_difference'] = (sens_df.water_recovery - value(m.fs.costing.system_recovery))
     sens_df['elec_lcow_difference'] = (sens_df.elec_lcow - value(m.fs.costing.elec_frac_LCOW))
-    sens_df['area'] = area_list
+    sens_df['area'] = results.area
     sens_df.elec_lcow = sens_df.elec_lcow * 100
     sens_df.water_recovery = sens_df.water_recovery * 100
 
     if save_results:
         sens_df.to_csv('results/case_studies/area_%s_%s_sensitivity.csv' % (case_study, m_scenario), index=False)
     if return_results:
-        return sens_df
\ No newline at end of file
+        return sens_df
@@ -1,6 +1,6 @@
-import pandas as pd
-from pyomo.environ import Block, Constraint, Expression, NonNegativeReals, Var, exp, log, units as pyunits
+from pyomo.environ import Block, Constraint, Expression, NonNegativeReals, Var, units as pyunits
 from watertap3.utils import financials
+from watertap3.utils.epa_cost_eqns import epa_cost
 from watertap3.wt_units.wt_unit import WT3UnitProcess
 
 ## REFERENCE: ADD REFERENCE HERE
@@ -9,32 +9,21 @@ module_name = 'anion_exchange_epa'
 basis_year = 2012
 tpec_or_tic = 'TIC'
 
+pv_eqns = {
+        'stainless': 'ss_pv_eq',  # cost of stainless steel pressure vessel
+        'carbon with stainless': 'cs_pv_eq',  # cost of carbon steel pressure vessels with stainless internals
+        'carbon with plastic': 'csp_pv_eq',  # cost of carbon steel pressure vessels with plastic internals
+        'fiberglass': 'fg_pv_eq'  # cost of fiberglass pressure vessels
+        }
+
 
 class UnitProcess(WT3UnitProcess):
 
     def fixed_cap(self):
         t = self.flowsheet().config.time.first()
-        def anion_ex_cost_curves(eqn, x):
-            cost_df = pd.read_csv('data/an_ex_cost_eqns.csv', index_col='eqn')
-            cost_df.drop(columns=['pct_deviation', 'date_modified', 'r_squared', 'max_size', 'min_size'], inplace=True)
-            coeffs = dict(cost_df.loc[eqn].items())
-            cost = coeffs['C1'] * x ** coeffs['C2'] + coeffs['C3'] * log(x) + coeffs['C4'] + coeffs['C5'] * exp(coeffs['C6'] * x) + coeffs['C7'] * x ** 3 + coeffs['C8'] * x ** 2 + coeffs[
-                'C9'] * x + coeffs['C10']
-            return cost
 
         ### VESSEL COST ###
-        self.pv_ss_cost = anion_ex_cost_curves('ss_pv_eq', (80 * 7.48))  # cost of stainless steel pressure vessel
-        self.pv_cs_cost = anion_ex_cost_curves('cs_pv_eq', (80 * 7.48))  # cost of carbon steel pressure vessels with stainless internals
-        self.pv_csp_cost = anion_ex_cost_curves('csp_pv_eq', (80 * 7.48))  # cost of carbon steel pressure vessels with plastic internals
-        self.pv_fg_cost = anion_ex_cost_curves('fg_pv_eq', (80 * 7.48))  # cost of fiberglass pressure vessels
-        if self.pv_material == 'stainless':
-            pv_cost = self.pv_ss_cost * self.tot_tanks
-        if self.pv_material == 'carbon with stainless':
-            pv_cost = self.pv_cs_cost * self.tot_tanks
-        if self.pv_material == 'carbon with plastic':
-            pv_cost = self.pv_csp_cost * self.tot_tanks
-        if self.pv_material == 'fiberglass':
-            pv_cost = self.pv_fg_cost * self.tot_tanks
+        pv_cost = epa_cost('an_ex_cost_eqns', pv_eqns[self.pv_material], (80 * 7.48)) * self.tot_tanks
         #             resin_type_list = ['styrenic_gel_1', 'styrenic_gel_2', 'styrenic_macro_1', 'styrenic_macro_2', 'polyacrylic', 'nitrate']
 
         ### RESIN COST ##
@@ -43,9 +32,9 @@ class UnitProcess(WT3UnitProcess):
         self.resin_cap = (self.anion_resin_volume[t] * self.resin_cost[t]) + (self.cation_resin_volume[t] * self.resin_cost[t])
 
         ### BACKWASH TANKS ###
-        # bw_ss_cost = anion_ex_cost_curves('st_bwt_eq', back_tank_vol)
-        # bw_fg_cost = anion_ex_cost_curves('fg_bwt_eq', back_tank_vol)
-        # bw_hdpe_cost = anion_ex_cost_curves('hdpe_bwt_eq', back_tank_vol)
+        # bw_ss_cost = epa_cost('an_ex_cost_eqns', 'st_bwt_eq', back_tank_vol)
+        # bw_fg_cost = epa_cost('an_ex_cost_eqns', 'fg_bwt_eq', back_tank_vol)
+        # bw_hdpe_cost = epa_cost('an_ex_cost_eqns', 'hdpe_bwt_eq', back_tank_vol)
         # if bw_tank_type == 'stainless':
         #     bw_tank_cost = bw_ss_cost * self.back_tanks
         # if bw_tank_type == 'fiberglass':
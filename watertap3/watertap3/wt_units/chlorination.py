@@ -1,7 +1,8 @@
 import numpy as np
-import pandas as pd
-from pyomo.environ import Block, Expression, units as pyunits
-from watertap3.utils import financials, ml_regression
+from pyomo.environ import Block, Expression, units as pyunits, value
+from watertap3.data import get_table, table_hash
+from watertap3.utils import financials
+from watertap3.utils.coefficient_store import fit_power_law_batch, get_coefficients
 from watertap3.wt_units.wt_unit import WT3UnitProcess
 
 ## REFERENCE: Texas Water Board
@@ -10,6 +11,77 @@ module_name = 'chlorination'
 basis_year = 2014
 tpec_or_tic = 'TPEC'
 
+_surface = {}
+
+
+def dose_cost_surface():
+    '''
+    Chlorine dose-cost surface from chlorine_dose_cost.csv. For each flow in the table, cost is fit as
+    cost = a * dose ** b (through the origin). Fit once per version of the table.
+
+    :return: Dictionary with the table flows [MGD], the power-law coefficients a, b for each flow, and the
+        table doses and costs (cost has shape len(doses) x len(flows), NaN where the table has no point)
+    '''
+    source_hash = table_hash('chlorine_dose_cost')
+    if _surface.get('hash') == source_hash:
+        return _surface['surface']
+    df = get_table('chlorine_dose_cost')
+    flows = np.unique(df.Flow_mgd.values).astype(float)
+    doses = np.unique(df.Dose.values).astype(float)
+    cost = np.full((len(doses), len(flows)), np.nan)
+    cost[np.searchsorted(doses, df.Dose.values), np.searchsorted(flows, df.Flow_mgd.values)] = df.Cost.values
+
+    def fit():
+        coeffs = []
+        for i, flow in enumerate(flows):
+            has_point = ~np.isnan(cost[:, i])
+            xs = np.hstack((0, doses[has_point]))
+            ys = np.hstack((0, cost[has_point, i]))
+            coeffs.extend(float(c) for c in fit_power_law_batch(xs, ys))
+        return coeffs
+
+    coeffs = get_coefficients(module_name, 'dose_cost_surface', source_hash, fit).reshape(len(flows), 2)
+    surface = {'flows': flows, 'a': coeffs[:, 0], 'b': coeffs[:, 1], 'doses': doses, 'cost': cost}
+    _surface.update(hash=source_hash, surface=surface)
+    return surface
+
+
+def dose_cost(dose):
+    '''
+    Chlorination cost at each flow in the dose-cost surface for a chlorine dose. Uses the table cost where
+    the table has a point for the dose, and the fitted dose-cost curve otherwise.
+
+    :param dose: Chlorine dose [mg/L]
+    :type dose: float
+    :return: flows [MGD], cost at each flow
+    '''
+    surface = dose_cost_surface()
+    cost = surface['a'] * dose ** surface['b']
+    on_table = np.isclose(surface['doses'], dose)
+    if on_table.any():
+        table_cost = surface['cost'][on_table.argmax()]
+        cost = np.where(np.isnan(table_cost), cost, table_cost)
+    return surface['flows'], cost
+
+
+def chlorination_cost_coeffs(dose):
+    '''
+    Coefficients a, b for chlorination cost as a function of flow (cost = a * flow ** b, flow in MGD) for
+    any chlorine dose.
+
+    :param dose: Chlorine dose [mg/L]
+    :type dose: float
+    :return: a, b
+    '''
+    dose = float(dose)
+    if dose <= 0:
+        raise ValueError(f'Chlorine dose must be positive, got {dose} mg/L')
+    flows, cost = dose_cost(dose)
+    xs = np.hstack((0, flows))
+    ys = np.hstack((0, cost))
+    a, b = get_coefficients(module_name, f'dose={dose!r}', table_hash('chlorine_dose_cost'), lambda: fit_power_law_batch(xs, ys))
+    return float(a), float(b)
+
 
 class UnitProcess(WT3UnitProcess):
 
@@ -38,40 +110,7 @@ class UnitProcess(WT3UnitProcess):
             self.dose = self.chlorine_decay_rate * self.contact_time + self.ct / self.contact_time_mins
         chem_name = unit_params['chemical_name']
         self.chem_dict = {chem_name: self.dose * 1E-3}
-        self.df = df = pd.read_csv('data/chlorine_dose_cost.csv')
-        self.new_dose_list = new_dose_list = np.arange(0, 25.1, 0.1)
-        self.cost_list = cost_list = []
-        self.flow_list = flow_list = []
-        self.dose_list = dose_list = []
-        for flow in df.Flow_mgd.unique():
-            self.df_hold = df_hold = df[df.Flow_mgd == flow]
-            if 0 not in df_hold.Cost.values:
-                xs = np.hstack((0, df_hold.Dose.values))
-                ys = np.hstack((0, df_hold.Cost.values))
-            else:
-                xs = df_hold.Dose.values
-                ys = df_hold.Cost.values
-            a = ml_regression.get_cost_curve_coefs(xs=xs, ys=ys)[0][0]
-            b = ml_regression.get_cost_curve_coefs(xs=xs, ys=ys)[0][1]
-            for new_dose in new_dose_list:
-                if new_dose in df.Dose:
-                    if flow in df.Flow_mgd:
-                        cost_list.append(df[((df.Dose == new_dose) & (df.Flow_mgd == flow))].Cost.max())
-                    else:
-                        cost_list.append(a * new_dose ** b)
-                else:
-                    cost_list.append(a * new_dose ** b)
-                dose_list.append(new_dose)
-                flow_list.append(flow)
-        self.dose_cost_table = dose_cost_table = pd.DataFrame()
-        dose_cost_table['flow_mgd'] = flow_list
-        dose_cost_table['dose'] = dose_list
-        dose_cost_table['cost'] = cost_list
-        self.df1 = df1 = dose_cost_table[dose_cost_table.dose == self.dose]
-        xs = np.hstack((0, df1.flow_mgd.values))
-        ys = np.hstack((0, df1.cost.values))
-        a = ml_regression.get_cost_curve_coefs(xs=xs, ys=ys)[0][0]
-        b = ml_regression.get_cost_curve_coefs(xs=xs, ys=ys)[0][1]
+        a, b = chlorination_cost_coeffs(value(self.dose))
         return (a * self.flow_in ** b) * 1E-3
 
     def elect(self):
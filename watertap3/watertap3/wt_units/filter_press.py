@@ -1,8 +1,7 @@
 from pyomo.environ import Block, Expression, Var, Constraint, NonNegativeReals, units as pyunits
 from watertap3.utils import financials
+from watertap3.utils.coefficient_store import array_hash, fit_proportional, get_coefficients
 from watertap3.wt_units.wt_unit import WT3UnitProcess
-from scipy.optimize import curve_fit
-import pandas as pd
 
 ## REFERENCE
 ## CAPITAL:
@@ -63,7 +62,7 @@ class UnitProcess(WT3UnitProcess):
         x = self.data['gal_per_cycle']
         y = self.data[self.slurry_dry_solids]
 
-        self.slope, _ = curve_fit(lambda m, x: m * x, x, y)
+        self.slope = get_coefficients(module_name, self.slurry_dry_solids, array_hash(x, y), lambda: fit_proportional(x, y))
 
         self.press_volume = Var(time,
                                 initialize=0,
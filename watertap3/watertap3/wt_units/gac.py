@@ -1,5 +1,6 @@
 from pyomo.environ import Block, Expression, units as pyunits
 from watertap3.utils import financials
+from watertap3.utils.epa_cost_eqns import epa_cost
 from watertap3.wt_units.wt_unit import WT3UnitProcess
 
 ## REFERENCE: EPA model
@@ -888,29 +889,20 @@ class UnitProcess(WT3UnitProcess):
         # CONTACTORS  ## PRESSURE VESSELS
         def fixed_cap():
             def gac_cost_curves(eqn, x):
-                cost_df = pd.read_csv('data/gac_cost_eqns.csv', index_col='eqn')
-                cost_df.drop(columns=['pct_deviation', 'date_modified', 'r_squared', 'max_size', 'min_size'], inplace=True)
-                coeffs = dict(cost_df.loc[eqn].items())
-                cost = coeffs['C1'] * x ** coeffs['C2'] + coeffs['C3'] * log(x) + coeffs['C4'] + coeffs['C5'] * exp(coeffs['C6'] * x) + coeffs['C7'] * x ** 3 + coeffs['C8'] * x ** 2 + coeffs[
-                    'C9'] * x + coeffs['C10']
-                return cost
+                return epa_cost('gac_cost_eqns', eqn, x)
 
             pv_material_list = ['stainless', 'carbon with stainless', 'carbon with plastic', 'fiberglass']
 
             if system_type == 'pressure':
                 #         comm_vol = comm_vol * 7.48  # gal - converting from ft3 to gal
-                pv_ss_cost = gac_cost_curves('ss_pv_eq', comm_vol * 7.48)  # cost of stainless steel pressure vessel
-                pv_cs_cost = gac_cost_curves('cs_pv_eq', comm_vol * 7.48)  # cost of carbon steel pressure vessels with stainless internals
-                pv_csp_cost = gac_cost_curves('csp_pv_eq', comm_vol * 7.48)  # cost of carbon steel pressure vessels with plastic internals
-                pv_fg_cost = gac_cost_curves('fg_pv_eq', comm_vol * 7.48)  # cost of fiberglass pressure vessels
                 if pv_material == 'stainless':
-                    pv_cost = pv_ss_cost * self.tot_num_tanks
+                    pv_cost = gac_cost_curves('ss_pv_eq', comm_vol * 7.48) * self.tot_num_tanks  # cost of stainless steel pressure vessel
                 if pv_material == 'carbon with stainless':
-                    pv_cost = pv_cs_cost * self.tot_num_tanks
+                    pv_cost = gac_cost_curves('cs_pv_eq', comm_vol * 7.48) * self.tot_num_tanks  # cost of carbon steel pressure vessels with stainless internals
                 if pv_material == 'carbon with plastic':
-                    pv_cost = pv_csp_cost * self.tot_num_tanks
+                    pv_cost = gac_cost_curves('csp_pv_eq', comm_vol * 7.48) * self.tot_num_tanks  # cost of carbon steel pressure vessels with plastic internals
                 if pv_material == 'fiberglass':
-                    pv_cost = pv_fg_cost * self.tot_num_tanks
+                    pv_cost = gac_cost_curves('fg_pv_eq', comm_vol * 7.48) * self.tot_num_tanks  # cost of fiberglass pressure vessels
 
             ## GAC CONTACT BASINS
             if system_type == 'gravity':
@@ -932,19 +924,15 @@ class UnitProcess(WT3UnitProcess):
             #     bw_tank_type_list = ['concrete', 'stainless', 'fiberglass', 'hdpe']
             #     bw_tank_type = 'stainless'
 
-            concrete_back_cost = num_back_basins * (back_conc_vol * 582.09 + back_excavation_vol * 30.08 + back_backfill_vol * 13.95 + back_railing * 36)
-            bw_ss_cost = gac_cost_curves('st_bwt_eq', back_tank_vol)
-            bw_fg_cost = gac_cost_curves('fg_bwt_eq', back_tank_vol)
-            bw_hdpe_cost = gac_cost_curves('hdpe_bwt_eq', back_tank_vol)
-
             if bw_tank_type == 'concrete':
+                concrete_back_cost = num_back_basins * (back_conc_vol * 582.09 + back_excavation_vol * 30.08 + back_backfill_vol * 13.95 + back_railing * 36)
                 bw_tank_cost = concrete_back_cost * num_back_basins
             if bw_tank_type == 'stainless':
-                bw_tank_cost = bw_ss_cost * num_back_tanks
+                bw_tank_cost = gac_cost_curves('st_bwt_eq', back_tank_vol) * num_back_tanks
             if bw_tank_type == 'fiberglass':
-                bw_tank_cost = bw_fg_cost * num_back_tanks
+                bw_tank_cost = gac_cost_curves('fg_bwt_eq', back_tank_vol) * num_back_tanks
             if bw_tank_type == 'hdpe':
-                bw_tank_cost = bw_hdpe_cost * num_back_tanks
+                bw_tank_cost = gac_cost_curves('hdpe_bwt_eq', back_tank_vol) * num_back_tanks
 
             ## HOLDING TANKS
             # ht_ss_cost = gac_cost_curves('st_bwt_eq', back_tank_vol)
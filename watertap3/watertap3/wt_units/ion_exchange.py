@@ -1,9 +1,10 @@
-import pandas as pd
 from pyomo.environ import *
 from pyomo.environ import units as pyunits
 from pyomo.repn.plugins.baron_writer import NonNegativeReals
 
+from watertap3.data import get_table
 from watertap3.utils import financials
+from watertap3.utils.initialization import seed_value
 from watertap3.wt_units.wt_unit import WT3UnitProcess
 
 ## REFERENCE: ADD REFERENCE HERE
@@ -357,7 +358,7 @@ class UnitProcess(WT3UnitProcess):
 
         ### RESIN AND FLOW VARIABLES
 
-        ix_df = self.ix_df = pd.read_csv('data/ix_sba.csv', index_col='constituent')
+        ix_df = self.ix_df = get_table('ix_sba', index_col='constituent')
         self.cons = [c for c in self.config.property_package.component_list if c in ix_df.index]
         ix_df = self.ix_df = ix_df.loc[self.cons].copy()
         self.sep_factor_dict = ix_df.to_dict()['sep_factor']
@@ -916,7 +917,7 @@ class UnitProcess(WT3UnitProcess):
 
         ### RESIN AND FLOW VARIABLES
 
-        ix_df = self.ix_df = pd.read_csv('data/ix_sac.csv', index_col='constituent')
+        ix_df = self.ix_df = get_table('ix_sac', index_col='constituent')
         self.cons = [c for c in self.config.property_package.component_list if c in ix_df.index]
         ix_df = self.ix_df = ix_df.loc[self.cons].copy()
         self.sep_factor_dict = ix_df.to_dict()['sep_factor']
@@ -1309,4 +1310,32 @@ class UnitProcess(WT3UnitProcess):
                                       doc='Electricity intensity [kwh/m3]')
 
         self.costing.other_var_cost = (self.resin_unit_cap[self.t] * self.resin_loss_annual[self.t]) * 1E-6
-        financials.get_complete_costing(self.costing)
\ No newline at end of file
+        financials.get_complete_costing(self.costing)
+
+    def estimate_state(self, t):
+        '''
+        Seed the resin equilibrium variables before the full solve from the inlet concentrations: influent
+        mg/L and meq/L, resin phase concentrations from the separation factors, the volume treated before
+        breakthrough of the target ion and the resin volume from the service flow rate.
+
+        :param t: Indexing variable for Pyomo Var()
+        :type t: int
+        '''
+        meq_L = {}
+        for c in self.cons:
+            mg_L = value(self.conc_mass_in[t, c]) * 1E3
+            meq_L[c] = mg_L / value(self.meq_conv[c])
+            seed_value(self.mg_L[t, c], mg_L)
+            seed_value(self.meq_L[t, c], meq_L[c])
+        denom_resin = sum(meq_L[c] * value(self.sep_factor[c]) for c in self.cons)
+        if not denom_resin:
+            return
+        seed_value(self.denom_resin[t], denom_resin)
+        resin_capacity = value(self.resin_capacity[t])
+        resin_conc = {c: resin_capacity * value(self.sep_factor[c]) * meq_L[c] / denom_resin for c in self.cons}
+        for c in self.cons:
+            seed_value(self.resin_conc[t, c], resin_conc[c])
+        seed_value(self.denom_aq[t], sum(resin_conc[c] / value(self.sep_factor[c]) for c in self.cons))
+        if meq_L.get(self.target):
+            seed_value(self.max_vol_treated[t], resin_conc[self.target] * 1E3 / (meq_L[self.target] * value(self.target_removal[t])))
+        seed_value(self.resin_vol[t], value(self.flow_vol_out[t]) * 3600 / value(self.sfr[t]))
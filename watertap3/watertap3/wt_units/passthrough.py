@@ -14,6 +14,8 @@ tpec_or_tic = 'TPEC'
 
 
 class UnitProcess(WT3UnitProcess):
+    # outlet and waste pressures are fixed or constrained by the unit
+    lean_pressure = False
 
     def fixed_cap(self):
         '''
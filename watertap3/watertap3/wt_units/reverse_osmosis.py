@@ -1,5 +1,6 @@
-from pyomo.environ import Block, Constraint, Expression, NonNegativeReals, Var, units as pyunits
+from pyomo.environ import Block, Constraint, Expression, NonNegativeReals, Var, units as pyunits, value
 from watertap3.utils import financials
+from watertap3.utils.initialization import seed_value
 from watertap3.wt_units.wt_unit import WT3UnitProcess
 
 module_name = 'reverse_osmosis'
@@ -7,6 +8,8 @@ basis_year = 2007
 tpec_or_tic = 'TIC'
 
 class UnitProcess(WT3UnitProcess):
+    # outlet and waste pressures are fixed or constrained by the unit
+    lean_pressure = False
 
     def fixed_cap(self, t, b_cost):
         '''
@@ -347,4 +350,74 @@ class UnitProcess(WT3UnitProcess):
 
         self.chem_dict = {'unit_cost': 0.01}
 
-        financials.get_complete_costing(self.costing)
\ No newline at end of file
+        financials.get_complete_costing(self.costing)
+
+    def _seed_stream(self, b, t, tds, flow_vol):
+        conc_mass_total = 0.6312 * tds + 997.86
+        mass_frac_tds = tds / conc_mass_total
+        osm_coeff = 4.92 * mass_frac_tds ** 2 + mass_frac_tds * 0.0889 + 0.918
+        seed_value(b.conc_mass_total[t], conc_mass_total)
+        seed_value(b.conc_mass_H2O[t], conc_mass_total - tds)
+        seed_value(b.mass_flow_H2O[t], (conc_mass_total - tds) * flow_vol)
+        seed_value(b.mass_flow_tds[t], tds * flow_vol)
+        seed_value(b.mass_frac_tds[t], mass_frac_tds)
+        seed_value(b.mass_frac_H2O[t], 1 - mass_frac_tds)
+        seed_value(b.osm_coeff[t], osm_coeff)
+        pressure_osm = 8.45E7 * osm_coeff * mass_frac_tds / (1E5 * (1 - mass_frac_tds))
+        seed_value(b.pressure_osm[t], pressure_osm)
+        return pressure_osm
+
+    def estimate_state(self, t):
+        '''
+        Seed the membrane variables before the full solve from an analytic estimate: recovery limited so the
+        brine stays below ~70 kg/m3 TDS, a pure water flux of 5E-3 kg/m2/s, the salt passage that follows
+        from the salt permeability and the feed pressure that drives the flux against the average osmotic
+        pressure. Units with no feed flow (e.g. a splitter branch seeded at zero) are left as they are.
+
+        :param t: Indexing variable for Pyomo Var()
+        :type t: int
+        '''
+        flow_in = value(self.flow_vol_in[t])
+        if not flow_in or flow_in < 0:
+            return
+        tds_in = value(self.conc_mass_in[t, 'tds'])
+        # some brine is always left, so the brine flow and concentrations stay finite
+        recovery = min(value(self.water_recovery[t]), max(1 - tds_in / 70, 0.1), 0.99)
+        flow_out = recovery * flow_in
+        flow_waste = flow_in - flow_out
+        flux = 5E-3
+        membrane_area = flow_out * 995 / flux
+        b = value(self.b[t])
+        tds_out = 0
+        for _ in range(5):
+            tds_waste = (tds_in * flow_in - tds_out * flow_out) / flow_waste
+            tds_out = 0.5 * membrane_area * b * 1E-7 * (tds_in + tds_waste) / flow_out
+
+        seed_value(self.water_recovery[t], recovery)
+        seed_value(self.flow_vol_out[t], flow_out)
+        seed_value(self.flow_vol_waste[t], flow_waste)
+        seed_value(self.conc_mass_out[t, 'tds'], tds_out)
+        seed_value(self.conc_mass_waste[t, 'tds'], tds_waste)
+        for j in self.const_list2:
+            conc_in = value(self.conc_mass_in[t, j])
+            removal = value(self.removal_fraction[t, j])
+            seed_value(self.conc_mass_out[t, j], conc_in * (1 - removal) / recovery)
+            seed_value(self.conc_mass_waste[t, j], conc_in * removal * flow_in / flow_waste)
+
+        feed_osm = self._seed_stream(self.feed, t, tds_in, flow_in)
+        retentate_osm = self._seed_stream(self.retentate, t, tds_waste, flow_waste)
+        permeate_frac_tds = tds_out * 1E6 / 995
+        permeate_total = 756 * permeate_frac_tds * 1E-6 + 995
+        seed_value(self.permeate.conc_mass_total[t], permeate_total)
+        seed_value(self.permeate.mass_frac_tds[t], permeate_frac_tds)
+        seed_value(self.permeate.mass_flow_tds[t], tds_out * flow_out)
+        seed_value(self.permeate.mass_flow_H2O[t], flow_out * permeate_total - tds_out * flow_out)
+        seed_value(self.pure_water_flux[t], flux)
+        seed_value(self.membrane_area[t], (flow_out * permeate_total - tds_out * flow_out) / flux)
+
+        pressure_drop = value(self.pressure_drop)
+        feed_pressure = flux / (self.pw * value(self.a[t]) * 1E-7) + self.p_atm + pressure_drop * 0.5 + (feed_osm + retentate_osm) * 0.5
+        seed_value(self.feed.pressure[t], feed_pressure)
+        seed_value(self.retentate.pressure[t], feed_pressure - pressure_drop)
+        seed_value(self.pressure_waste[t], feed_pressure - pressure_drop)
+        seed_value(self.pressure_out[t], 1)
@@ -1,7 +1,8 @@
-import pandas as pd
+import numpy as np
 from pyomo.environ import Block, Expression, units as pyunits
-from scipy.optimize import curve_fit
+from watertap3.data import get_table, table_hash
 from watertap3.utils import financials
+from watertap3.utils.coefficient_store import fit_power_law_batch, get_coefficients
 from watertap3.wt_units.wt_unit import WT3UnitProcess
 
 ## REFERENCE:
@@ -14,6 +15,71 @@ module_name = 'uv_aop'
 basis_year = 2014
 tpec_or_tic = 'TPEC'
 
+flow_list = [1E-8, 1, 3, 5, 10, 25]  # flow in mgd
+_uv_grid = {}
+
+
+def uv_coefficient_grid():
+    '''
+    Cost curve coefficients a, b (cost = a * flow ** b, flow in MGD) for every UV dose and UVT in
+    uv_cost_interp.csv. The grid is fit once per version of the table and kept in the coefficient store.
+
+    :return: doses, uvts, a, b (a and b have shape len(doses) x len(uvts))
+    '''
+    source_hash = table_hash('uv_cost_interp')
+    if _uv_grid.get('hash') == source_hash:
+        return _uv_grid['grid']
+    df = get_table('uv_cost_interp').sort_values(['dose', 'uvt', 'flow'])
+    doses = np.unique(df.dose.values).astype(float)
+    uvts = np.unique(df.uvt.values).astype(float)
+    flows = np.unique(df.flow.values).astype(float)
+    if len(df) != len(doses) * len(uvts) * len(flows) or list(flows) != flow_list[1:]:
+        raise ValueError('uv_cost_interp.csv must have one cost for every dose, UVT and flow in %s' % flow_list[1:])
+
+    def fit():
+        cost = df.cost.values.reshape(len(doses), len(uvts), len(flows))
+        cost = np.concatenate([np.full(cost.shape[:2] + (1,), flow_list[0]), cost], axis=2)
+        a, b = fit_power_law_batch(flow_list, cost)
+        return np.concatenate([a.ravel(), b.ravel()])
+
+    coeffs = get_coefficients(module_name, 'grid', source_hash, fit).reshape(2, len(doses), len(uvts))
+    grid = doses, uvts, coeffs[0], coeffs[1]
+    _uv_grid.update(hash=source_hash, grid=grid)
+    return grid
+
+
+def uv_cost_coeffs(uv_dose, uvt_in):
+    '''
+    Bilinear interpolation of the UV cost curve coefficients between the doses and UVTs in the grid.
+    Works on scalars or arrays of dose and UVT.
+
+    :param uv_dose: UV dose [mJ/cm2]
+    :type uv_dose: float
+    :param uvt_in: UV transmission (UVT) into unit
+    :type uvt_in: float
+    :return: a, b
+    '''
+    doses, uvts, a_grid, b_grid = uv_coefficient_grid()
+    uv_dose = np.asarray(uv_dose, dtype=float)
+    uvt_in = np.asarray(uvt_in, dtype=float)
+    if np.any((uv_dose < doses[0]) | (uv_dose > doses[-1])):
+        raise ValueError(f'UV dose must be between {doses[0]} and {doses[-1]} mJ/cm2')
+    if np.any((uvt_in < uvts[0]) | (uvt_in > uvts[-1])):
+        raise ValueError(f'UVT must be between {uvts[0]} and {uvts[-1]}')
+    i = np.clip(np.searchsorted(doses, uv_dose, side='right') - 1, 0, len(doses) - 2)
+    j = np.clip(np.searchsorted(uvts, uvt_in, side='right') - 1, 0, len(uvts) - 2)
+    t = (uv_dose - doses[i]) / (doses[i + 1] - doses[i])
+    u = (uvt_in - uvts[j]) / (uvts[j + 1] - uvts[j])
+
+    def interp(grid):
+        return (grid[i, j] * (1 - t) * (1 - u) + grid[i + 1, j] * t * (1 - u) +
+                grid[i, j + 1] * (1 - t) * u + grid[i + 1, j + 1] * t * u)
+
+    a, b = interp(a_grid), interp(b_grid)
+    if a.ndim == 0:
+        return float(a), float(b)
+    return a, b
+
 
 class UnitProcess(WT3UnitProcess):
 
@@ -71,10 +137,9 @@ class UnitProcess(WT3UnitProcess):
 
     def uv_regress(self):
         '''
-        Determine a, b costing parameters as a function of flow, UVT, and UV dose for unit.
+        Determine a, b costing parameters as a function of UVT and UV dose for unit. Doses and UVTs between
+        the points in uv_cost_interp.csv are interpolated.
 
-        :param flow_in: Volumetric flow into unit [MGD]
-        :type flow_in: float
         :param uvt_in: UV transmission (UVT) into unit
         :type uvt_in: float
         :param uv_dose: UV dose used by the unit [mg/L]
@@ -82,22 +147,7 @@ class UnitProcess(WT3UnitProcess):
         :return: a, b
         '''
 
-        def power_curve(x, a, b):
-            '''
-            Return power curve. Used for fitting cost data to determine a, b.
-            '''
-            return a * x ** b
-
-        self.df = pd.read_csv('data/uv_cost_interp.csv', index_col='flow')
-        self.flow_points = [1E-8]
-        self.flow_list = [1E-8, 1, 3, 5, 10, 25]  # flow in mgd
-        for flow in self.flow_list[1:]:
-            temp = self.df.loc[flow]
-            cost = temp[((temp.dose == self.uv_dose) & (temp.uvt == self.uvt_in))]
-            cost = cost.iloc[0]['cost']
-            self.flow_points.append(cost)
-        coeffs, cov = curve_fit(power_curve, self.flow_list, self.flow_points)
-        self.a, self.b = coeffs[0], coeffs[1]
+        self.a, self.b = uv_cost_coeffs(self.uv_dose, self.uvt_in)
         return self.a, self.b
 
     def solution_vol_flow(self):  # m3/hr
@@ -7,11 +7,26 @@ import idaes.logger as idaeslog
 from idaes.core import (UnitModelBlockData, declare_process_block_class, useDefault)
 from idaes.core.util.config import is_physical_parameter_block
 from pyomo.common.config import ConfigBlock, ConfigValue, In
-from pyomo.environ import NonNegativeReals, SolverFactory, Var, units as pyunits
+from pyomo.environ import Expression, NonNegativeReals, Reference, SolverFactory, Var, units as pyunits, value
 from pyomo.network import Port
 
 __all__ = ['WT3UnitProcess']
 
+_mass_flow_factors = {}
+
+
+def _mass_flow_factor(flow_units, conc_units):
+    '''
+    Factor to scale flow [flow_units] * concentration [conc_units] to (m3/hr) * (mg/L), the basis the
+    component mass balances have always been written in. Computed once per set of model units.
+    '''
+    key = (str(flow_units), str(conc_units))
+    factor = _mass_flow_factors.get(key)
+    if factor is None:
+        factor = _mass_flow_factors[key] = value(pyunits.convert(1 * flow_units * conc_units,
+                                                                 to_units=pyunits.m ** 3 / pyunits.hr * pyunits.mg / pyunits.L))
+    return factor
+
 
 @declare_process_block_class('WT3UnitProcess')
 class WT3UnitProcessData(UnitModelBlockData):
@@ -25,6 +40,11 @@ class WT3UnitProcessData(UnitModelBlockData):
     The dynamic and has_holdup options are expected arguments which must exist
     The property package arguments let us define different sets of contaminants
     without needing to write a new model.
+
+    Zeroth-order units do not use temperature, so the outlet and waste temperatures are references to
+    the inlet temperature instead of separate variables. Unless a unit sets ``lean_pressure = False``
+    (for units that fix or constrain their outlet pressures), the outlet and waste pressures are
+    expressions of the inlet pressure and the fixed pressure changes. The ports are the same either way.
     '''
 
     CONFIG = ConfigBlock()
@@ -64,6 +84,8 @@ class WT3UnitProcessData(UnitModelBlockData):
         super(WT3UnitProcessData, self).build()
         units_meta = self.config.property_package.get_metadata().get_derived_units
         time = self.flowsheet().config.time
+        lean_pressure = getattr(self, 'lean_pressure', True)
+        mass_flow_factor = _mass_flow_factor(units_meta('volume') / units_meta('time'), units_meta('mass') / units_meta('volume'))
 
         ## INLET
         self.flow_vol_in = Var(time,
@@ -98,15 +120,7 @@ class WT3UnitProcessData(UnitModelBlockData):
                                  initialize=0,
                                  units=units_meta('mass') / units_meta('volume'),
                                  doc='Mass concentration of species at outlet')
-        self.temperature_out = Var(time,
-                                   initialize=300,
-                                   units=units_meta('temperature'),
-                                   doc='Temperature at outlet')
-        self.pressure_out = Var(time,
-                                initialize=1,
-                                domain=NonNegativeReals,
-                                units=units_meta('pressure'),
-                                doc='Pressure at outlet')
+        self.temperature_out = Reference(self.temperature_in)
         self.deltaP_outlet = Var(time,
                                  initialize=1E-6,
                                  # domain=NonNegativeReals,
@@ -114,6 +128,16 @@ class WT3UnitProcessData(UnitModelBlockData):
                                  doc='Pressure change between inlet and outlet')
 
         self.deltaP_outlet.fix(1E-4)
+        if lean_pressure:
+            self.pressure_out = Expression(time,
+                                           rule=lambda b, t: b.pressure_in[t] + b.deltaP_outlet[t],
+                                           doc='Pressure at outlet')
+        else:
+            self.pressure_out = Var(time,
+                                    initialize=1,
+                                    domain=NonNegativeReals,
+                                    units=units_meta('pressure'),
+                                    doc='Pressure at outlet')
 
         ## WASTE
         self.flow_vol_waste = Var(time,
@@ -126,17 +150,7 @@ class WT3UnitProcessData(UnitModelBlockData):
                                    initialize=0,
                                    units=units_meta('mass') / units_meta('volume'),
                                    doc='Mass concentration of species in waste')
-        self.temperature_waste = Var(time,
-                                     initialize=300,
-                                     domain=NonNegativeReals,
-                                     units=units_meta('temperature'),
-                                     doc='Temperature of waste')
-        self.pressure_waste = Var(time,
-                                  initialize=1,
-                                  domain=NonNegativeReals,
-                                  units=units_meta('pressure'),
-                                  doc='Pressure of waste')
-
+        self.temperature_waste = Reference(self.temperature_in)
         self.deltaP_waste = Var(time,
                                 initialize=1E-6,
                                 # domain=NonNegativeReals,
@@ -144,6 +158,16 @@ class WT3UnitProcessData(UnitModelBlockData):
                                 doc='Pressure change between inlet and waste')
 
         self.deltaP_waste.fix(1E-4)
+        if lean_pressure:
+            self.pressure_waste = Expression(time,
+                                             rule=lambda b, t: b.pressure_in[t] + b.deltaP_waste[t],
+                                             doc='Pressure of waste')
+        else:
+            self.pressure_waste = Var(time,
+                                      initialize=1,
+                                      domain=NonNegativeReals,
+                                      units=units_meta('pressure'),
+                                      doc='Pressure of waste')
 
         ## WATER RECOVERY & REMOVAL FRACTION
         self.water_recovery = Var(time,
@@ -159,15 +183,16 @@ class WT3UnitProcessData(UnitModelBlockData):
                                     units=pyunits.dimensionless,
                                     doc='Component removal fraction')
 
-        @self.Constraint(time, doc='Outlet pressure equation')
-        def outlet_pressure_constraint(b, t):
-            return (b.pressure_in[t] + b.deltaP_outlet[t] ==
-                    b.pressure_out[t])
+        if not lean_pressure:
+            @self.Constraint(time, doc='Outlet pressure equation')
+            def outlet_pressure_constraint(b, t):
+                return (b.pressure_in[t] + b.deltaP_outlet[t] ==
+                        b.pressure_out[t])
 
-        @self.Constraint(time, doc='Waste pressure equation')
-        def waste_pressure_constraint(b, t):
-            return (b.pressure_in[t] + b.deltaP_waste[t] ==
-                    b.pressure_waste[t])
+            @self.Constraint(time, doc='Waste pressure equation')
+            def waste_pressure_constraint(b, t):
+                return (b.pressure_in[t] + b.deltaP_waste[t] ==
+                        b.pressure_waste[t])
 
         @self.Constraint(time, doc='Water recovery equation')
         def recovery_equation(b, t):
@@ -191,19 +216,11 @@ class WT3UnitProcessData(UnitModelBlockData):
                          self.config.property_package.component_list,
                          doc='Component mass balances')
         def component_mass_balance(b, t, j):
-            return (pyunits.convert(b.flow_vol_in[t], to_units=pyunits.m ** 3 / pyunits.hr) * pyunits.convert(b.conc_mass_in[t, j], to_units=pyunits.mg / pyunits.L) ==
-                    pyunits.convert(b.flow_vol_out[t], to_units=pyunits.m ** 3 / pyunits.hr) * pyunits.convert(b.conc_mass_out[t, j], to_units=pyunits.mg / pyunits.L) +
-                    pyunits.convert(b.flow_vol_waste[t], to_units=pyunits.m ** 3 / pyunits.hr) * pyunits.convert(b.conc_mass_waste[t, j], to_units=pyunits.mg / pyunits.L))
+            return (mass_flow_factor * b.flow_vol_in[t] * b.conc_mass_in[t, j] ==
+                    mass_flow_factor * b.flow_vol_out[t] * b.conc_mass_out[t, j] +
+                    mass_flow_factor * b.flow_vol_waste[t] * b.conc_mass_waste[t, j])
             # return b.flow_vol_in[t] * b.conc_mass_in[t, j] == b.flow_vol_out[t] * b.conc_mass_out[t, j] + b.flow_vol_waste[t] * b.conc_mass_waste[t, j]
         #
-        @self.Constraint(time, doc='Outlet temperature equation')
-        def outlet_temperature_constraint(b, t):
-            return b.temperature_in[t] == b.temperature_out[t]
-
-        @self.Constraint(time, doc='Waste temperature equation')
-        def waste_temperature_constraint(b, t):
-            return b.temperature_in[t] == b.temperature_waste[t]
-
         # The last step is to create Ports representing the three streams
         # Add an empty Port for the inlet
         self.inlet = Port(noruleinit=True, doc='Inlet Port')